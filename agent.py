@@ -1,5 +1,7 @@
 import asyncio
 import logging
+import os
+from typing import Optional
 from dotenv import load_dotenv
 
 from livekit import agents, rtc
@@ -11,34 +13,103 @@ from livekit.agents import (
     voice_assistant,
     llm,
 )
-from livekit.plugins import (
-    openai,
-    deepgram,
-    silero,
+
+from barge_in import BargeInController
+from call_control import CallControl
+from call_recorder import recorded_tts, recorder_from_env
+from call_start import CallStart
+from callback_scheduler import callback_due, schedule_callback
+from context_window import ContextWindow
+from prompt_template import PromptTemplate, lead_defaults, parse_metadata
+from qualification import QualificationFunctions, QualificationRecord, RecordSink
+from response_cache import Intent, ScriptedLLMStream
+from script_lines import (
+    CURRENT_AGENT,
+    FIXED_LINES,
+    GREETING,
+    HOW_DID_YOU_GET_MY_NUMBER,
+    NO_VALUATIONS,
+    RETURN_TO_SCRIPT,
+    VOICEMAIL_MESSAGE,
+    WHO_WE_ARE,
 )
+from speech_chunker import chunked_tts
+from stt_tap import TappedSTT
+from turn_metrics import TimedTTS, TurnTimer
+from voicemail_detector import watch_for_voicemail
+from worker_load import WorkerLoad, report_loop_lag
+from worker_prewarm import PluginConfig, get_plugins, make_prewarm, start_connection_warmup
 
 load_dotenv()
 logger = logging.getLogger("sip-calling-agent")
 
 
-async def entrypoint(ctx: JobContext):
-    """Main entry point for the SIP calling agent"""
-    logger.info(f"Starting SIP calling agent for room: {ctx.room.name}")
-    
-    # Connect to the room IMMEDIATELY - this is critical for SIP calls
-    logger.info("Connecting to LiveKit room...")
-    await ctx.connect(auto_subscribe=AutoSubscribe.AUDIO_ONLY)
-    logger.info("✅ Connected to LiveKit room successfully")
-    
-    # Create the voice assistant with real estate instructions
-    assistant = voice_assistant.VoiceAssistant(
-        vad=silero.VAD.load(),
-        stt=deepgram.STT(model="nova-2", language="en"),
-        llm=openai.LLM(model="gpt-4o-mini"),
-        tts=openai.TTS(voice="alloy"),
-        chat_ctx=llm.ChatContext().append(
-            role="system",
-            text="""You are a serious, professional outbound calling assistant. Your sole task is to ask property owners if they are open to selling their home right now — and if yes, ask a few quick qualification questions to help our team prepare the best follow-up.
+# the script's "Handling Common Questions" answers, played without an LLM call
+COMMON_QUESTIONS = [
+    Intent(
+        "who_are_you",
+        [
+            "who are you",
+            "who is this",
+            "who is calling",
+            "which company are you with",
+            "what company are you with",
+            "what company is this",
+            "are you an agent or investor",
+            "are you an investor",
+            "are you a realtor",
+            "where are you calling from",
+            "who do you work for",
+        ],
+        # the per-lead sentence on its own line, so only it misses the TTS cache
+        f"{WHO_WE_ARE}\n{CURRENT_AGENT}\n{RETURN_TO_SCRIPT}",
+    ),
+    Intent(
+        "how_did_you_get_my_number",
+        [
+            "how did you get my number",
+            "where did you get my number",
+            "how did you get this number",
+            "how did you get my phone number",
+            "where did you get my information",
+            "how do you have my number",
+        ],
+        HOW_DID_YOU_GET_MY_NUMBER,
+    ),
+    Intent(
+        "home_value",
+        [
+            "what is my home worth",
+            "what is my house worth",
+            "how much is my house worth",
+            "what is the offer",
+            "how much would you offer",
+            "how much would you pay",
+            "how does it work",
+            "how does this work",
+            "what do you think it is worth",
+            "what would you give me for it",
+        ],
+        NO_VALUATIONS,
+    ),
+]
+
+PLUGIN_CONFIG = PluginConfig(
+    stt_model="nova-2",
+    stt_language="en",
+    llm_model="gpt-4o-mini",
+    tts_voice="alloy",
+    cached_lines=FIXED_LINES,
+    common_questions=COMMON_QUESTIONS,
+    # narrowband audio end to end; turn off when testing from a browser
+    telephony=os.getenv("TELEPHONY_AUDIO", "true").lower() == "true",
+)
+prewarm = make_prewarm(PLUGIN_CONFIG)
+
+# leave VOICEMAIL_MESSAGE after the beep instead of hanging up straight away
+LEAVE_VOICEMAIL = os.getenv("LEAVE_VOICEMAIL", "false").lower() == "true"
+
+REAL_ESTATE_SCRIPT = """You are a serious, professional outbound calling assistant. Your sole task is to ask property owners if they are open to selling their home right now — and if yes, ask a few quick qualification questions to help our team prepare the best follow-up.
 
 Do NOT sound overly friendly.
 Stay neutral, concise, and direct.
@@ -149,8 +220,139 @@ Do NOT answer exploratory questions like:
 
 If asked, respond with:
 "I do not make offers or give our property valuations as I am not the expert. That’s something our team goes over with homeowners who are open to selling now."""
+
+# parsed once per worker; every call shares the same static prompt prefix
+SYSTEM_PROMPT = PromptTemplate(REAL_ESTATE_SCRIPT, defaults=lead_defaults())
+
+
+async def entrypoint(ctx: JobContext):
+    """Main entry point for the SIP calling agent"""
+    logger.info(f"Starting SIP calling agent for room: {ctx.room.name}")
+    
+    plugins = get_plugins(ctx.proc, PLUGIN_CONFIG)
+    start_connection_warmup(ctx.proc)
+    report_loop_lag(ctx)
+
+    # Connect to the room IMMEDIATELY - this is critical for SIP calls
+    logger.info("Connecting to LiveKit room...")
+    await ctx.connect(auto_subscribe=AutoSubscribe.AUDIO_ONLY)
+    logger.info("✅ Connected to LiveKit room successfully")
+
+    # the SIP participant joins while ringing and carries the lead from the dialer
+    participant = await ctx.wait_for_participant()
+    lead = parse_metadata(ctx.room.metadata, participant.metadata)
+    lead_id = lead.get("lead_id", participant.identity)
+    logger.info(f"Calling lead {lead_id}")
+    call_start = CallStart(ctx.room, participant)
+
+    call = CallControl(ctx, participant.identity)
+    timer = TurnTimer(ctx.room.name, lead_id, variant="agent")
+    # talking over the homeowner cuts Elliott off within a few frames
+    barge_in = BargeInController(ctx.room.name, lead_id, variant="agent", samples=timer.samples)
+    ctx.add_shutdown_callback(timer.samples.flush)
+
+    # opt-in QA recording: transcript, turn timings and the mixed call audio
+    recorder = recorder_from_env(ctx.room.name)
+
+    # answering machines are caught on interim transcripts and audio, before the LLM
+    stt = TappedSTT(plugins.stt)
+
+    async def handle_voicemail(reason: str):
+        logger.info(f"📭 Voicemail detected ({reason}), ending call")
+        if LEAVE_VOICEMAIL:
+            try:
+                await asyncio.wait_for(detector.beep.wait(), timeout=10)
+            except asyncio.TimeoutError:
+                pass
+            played = asyncio.Event()
+            assistant.once("agent_speech_committed", lambda *_: played.set())
+            await assistant.say(VOICEMAIL_MESSAGE, allow_interruptions=False)
+            try:
+                await asyncio.wait_for(played.wait(), timeout=15)
+            except asyncio.TimeoutError:
+                pass
+        await call.end_call(f"voicemail ({reason})")
+
+    detector = watch_for_voicemail(stt, call_start, lambda reason: asyncio.create_task(handle_voicemail(reason)))
+
+    # long calls keep a flat LLM input: recent turns plus a rolling summary
+    window = ContextWindow(plugins.llm)
+
+    # answers are captured by function tools and spooled to this call's file, off the audio loop
+    record = QualificationRecord(lead_id=lead_id, room=ctx.room.name)
+    sink = RecordSink.for_call(ctx.room.name)
+    ctx.add_shutdown_callback(sink.close)
+
+    # "call me later" lands in the dialer's callback queue; the log write runs off the audio loop
+    phone = lead.get("phone") or participant.attributes.get("sip.phoneNumber", "")
+    lead_fields = {k: v for k, v in lead.items() if k not in ("lead_id", "phone", "callback_for")}
+
+    bookings: set[asyncio.Task] = set()
+
+    async def book_callback(said: str, due):
+        try:
+            await asyncio.to_thread(schedule_callback, lead_id, phone, said, lead_fields, due=due)
+        except Exception:
+            logger.exception(f"failed to schedule a callback for lead {lead_id}")
+
+    def on_callback(said: str) -> Optional[str]:
+        # parsing is cheap, so the agent can tell them right away if the time had to move
+        due, moved = callback_due(said, lead_fields)
+        task = asyncio.create_task(book_callback(said, due))
+        bookings.add(task)
+        task.add_done_callback(bookings.discard)
+        if moved:
+            return f"We can only call then at {due:%A %-I:%M %p} their time; tell them that's when we'll call."
+        return None
+
+    async def finish_bookings():
+        # an EndCall right after booking must not lose the callback
+        if bookings:
+            await asyncio.gather(*bookings)
+
+    ctx.add_shutdown_callback(finish_bookings)
+
+    def before_llm(assistant, chat_ctx):
+        # returning False drops the reply; None falls through to the default LLM call
+        if detector.result is not None or call.ended:
+            return False
+        if plugins.intents is not None:
+            reply = plugins.intents.reply_for(chat_ctx, lead)
+            if reply is not None:
+                return ScriptedLLMStream(plugins.llm, chat_ctx=chat_ctx, reply=reply)
+        window.apply(chat_ctx)
+        return None
+    
+    # Create the voice assistant with real estate instructions
+    assistant = voice_assistant.VoiceAssistant(
+        vad=plugins.vad,
+        stt=stt,
+        llm=plugins.llm,
+        tts=chunked_tts(TimedTTS(recorded_tts(plugins.tts, recorder), timer), plugins.chunker),
+        chat_ctx=llm.ChatContext().append(
+            role="system",
+            text=SYSTEM_PROMPT.render(lead),
         ),
+        fnc_ctx=QualificationFunctions(
+            call,
+            record,
+            sink,
+            on_fact=window.set_fact,
+            on_callback=on_callback,
+        ),
+        before_llm_cb=before_llm,
+        before_tts_cb=timer.before_tts,
+        **barge_in.assistant_options(),
     )
+    barge_in.attach(assistant)
+    call.attach(assistant)
+    timer.attach(assistant, stt)
+    if recorder is not None:
+        recorder.attach(assistant)
+        barge_in.listeners.append(lambda event: recorder.event("barge_in", **event))
+        recorder.attach_room(ctx.room, participant)
+        timer.turn_listeners.append(lambda stages: recorder.event("turn_latency", **stages))
+        ctx.add_shutdown_callback(recorder.aclose)
     
     # Set up event handlers for participant connection
     @ctx.room.on("participant_connected")
@@ -169,18 +371,11 @@ If asked, respond with:
     
     try:
         # Start the voice assistant
-        assistant.start(ctx.room)
+        assistant.start(ctx.room, participant)
         logger.info("Voice assistant started successfully")
         
-        # Wait a moment then try to start the conversation
-        await asyncio.sleep(2)
-        logger.info("Attempting to start conversation")
-        
-        # Send initial greeting following the new script
-        await assistant.say(
-            "Hi, I'm with a local realtor. I was checking your property. Do you still own that by any chance?",
-            allow_interruptions=True
-        )
+        # Send initial greeting the moment the callee picks up
+        await call_start.greet(assistant, GREETING)
         
     except Exception as e:
         logger.error(f"Error starting voice assistant: {e}")
@@ -188,8 +383,13 @@ If asked, respond with:
 
 
 if __name__ == "__main__":
-    # Configure worker to accept any room
+    # Configure worker to accept any room while it has capacity
+    load = WorkerLoad.from_env()
     worker_options = WorkerOptions(
-        entrypoint_fnc=entrypoint
+        entrypoint_fnc=entrypoint,
+        prewarm_fnc=prewarm,
+        request_fnc=load.request_fnc,
+        load_fnc=load.load_fnc,
+        load_threshold=load.threshold,
     )
     cli.run_app(worker_options)
@@ -0,0 +1,74 @@
+"""
+Named agents for multi-agent handoffs.
+
+Agent factories are registered once per worker process and take the
+prewarmed `Plugins`, so every agent reuses the process's pooled LLM/TTS
+clients instead of opening its own. `AgentRegistry.build()` creates one
+instance of every registered agent when a session starts, before the call is
+connected; a handoff then only points the ready agent at the recent history
+and returns it, and handing back and forth between agents reuses the same
+instances.
+
+Agent instances hold per-session state (their chat context and activity), so
+they are built per session; the plugin clients they use are per process.
+"""
+
+import logging
+import time
+from typing import Callable
+
+from livekit.agents import Agent, AgentSession, ChatContext
+
+from worker_prewarm import Plugins
+
+logger = logging.getLogger("agent-registry")
+
+AgentFactory = Callable[[Plugins], Agent]
+
+
+def recent_history(history: ChatContext, max_items: int) -> ChatContext:
+    """The last user/assistant turns of `history`, sharing its message objects.
+
+    Only walks back as far as it needs, and the messages themselves aren't
+    copied: the new context is a short list of references, and edits to
+    either context replace items rather than changing them.
+    """
+    items = []
+    for item in reversed(history.items):
+        if item.type == "message" and item.role in ("user", "assistant"):
+            items.append(item)
+            if len(items) >= max_items:
+                break
+    items.reverse()
+    return ChatContext(items)
+
+
+class SessionAgents:
+    """The registered agents of one session, ready to take over the conversation"""
+
+    def __init__(self, agents: dict[str, Agent]) -> None:
+        self._agents = agents
+
+    def __getitem__(self, name: str) -> Agent:
+        return self._agents[name]
+
+    async def handoff(self, name: str, session: AgentSession, max_items: int) -> Agent:
+        """The agent to return from a function tool, primed with the recent conversation"""
+        agent = self._agents[name]
+        await agent.update_chat_ctx(recent_history(session.history, max_items))
+        return agent
+
+
+class AgentRegistry:
+    def __init__(self) -> None:
+        self._factories: dict[str, AgentFactory] = {}
+
+    def register(self, name: str, factory: AgentFactory) -> None:
+        self._factories[name] = factory
+
+    def build(self, plugins: Plugins) -> SessionAgents:
+        """One instance of every registered agent, for a session that is about to start"""
+        started = time.perf_counter()
+        agents = {name: factory(plugins) for name, factory in self._factories.items()}
+        logger.info("built %d agent(s) in %.1f ms", len(agents), (time.perf_counter() - started) * 1000)
+        return SessionAgents(agents)
@@ -0,0 +1,109 @@
+"""
+Barge-in tuning and measurement for the SIP agents.
+
+The pipeline already handles a barge-in end to end: once VAD has heard the
+caller for `interrupt_speech_duration` it interrupts the playing speech, the
+playout clears the audio source's queue, and only the text that was actually
+played is committed to the chat context. `BargeInController` lowers that
+threshold from the 0.5 s default so Elliott stops sooner, and measures how
+long it takes: from the VAD start of the caller's speech to the playout
+stopping, for every speech the caller interrupts.
+
+Latency is logged per event and added to the call's latency samples as the
+`barge_in` stage.
+"""
+
+import logging
+import time
+from typing import Callable, Optional
+
+from turn_metrics import SampleLog
+
+logger = logging.getLogger("barge-in")
+
+
+class BargeInController:
+    def __init__(
+        self,
+        room: str,
+        lead_id: str,
+        variant: str,
+        samples: SampleLog,
+        min_speech: float = 0.3,
+    ) -> None:
+        self._tags = {"room": room, "lead_id": lead_id, "variant": variant}
+        self._samples = samples
+        self._min_speech = min_speech
+        self._assistant = None
+        self._playout = None
+        self._looked_up = False
+        self._user_speaking = False
+        self._agent_speaking = False
+        # VAD start of the caller's latest speech while the agent was talking
+        self._barge_in_at: Optional[float] = None
+        # called with each barge-in's latency in ms
+        self.listeners: list[Callable[[dict], None]] = []
+
+    def assistant_options(self) -> dict:
+        """VoiceAssistant kwargs that set the interruption threshold"""
+        return {"interrupt_speech_duration": self._min_speech, "interrupt_min_words": 0}
+
+    def attach(self, assistant) -> None:
+        self._assistant = assistant
+        assistant.on("agent_started_speaking", lambda *_: self._on_agent_started())
+        assistant.on("agent_stopped_speaking", lambda *_: self._on_agent_stopped())
+        assistant.on("user_started_speaking", lambda *_: self._on_user_started())
+        assistant.on("user_stopped_speaking", lambda *_: self._on_user_stopped())
+        # fallback for a pipeline whose playout we can't reach: the interrupted
+        # message is committed just after the playout stops
+        assistant.on("agent_speech_interrupted", lambda *_: self._on_interrupted_commit())
+
+    def _on_agent_started(self) -> None:
+        # the playout only exists once the assistant has published its track
+        if not self._looked_up:
+            self._looked_up = True
+            output = getattr(self._assistant, "_agent_output", None)
+            self._playout = getattr(output, "playout", None)
+            if self._playout is not None:
+                self._playout.on("playout_stopped", self._on_playout_stopped)
+            else:
+                logger.warning("can't reach the assistant's playout, timing barge-ins from the committed message")
+        self._agent_speaking = True
+        # a caller already talking when the agent starts barges in right away
+        self._barge_in_at = time.perf_counter() if self._user_speaking else None
+
+    def _on_agent_stopped(self) -> None:
+        if self._playout is None:
+            # keep the barge-in time for the interrupted commit that follows
+            self._agent_speaking = False
+
+    def _on_user_started(self) -> None:
+        self._user_speaking = True
+        if self._agent_speaking:
+            # a cough that didn't interrupt is superseded by the speech that does
+            self._barge_in_at = time.perf_counter()
+
+    def _on_user_stopped(self) -> None:
+        self._user_speaking = False
+
+    def _on_playout_stopped(self, interrupted: bool = False) -> None:
+        self._agent_speaking = False
+        if interrupted:
+            self._record()
+        self._barge_in_at = None
+
+    def _on_interrupted_commit(self) -> None:
+        if self._playout is None:
+            self._record()
+            self._barge_in_at = None
+
+    def _record(self) -> None:
+        if self._barge_in_at is None:
+            # interrupted by something other than the caller (EndCall, a newer reply)
+            return
+        latency = time.perf_counter() - self._barge_in_at
+        event = {"barge_in_ms": round(latency * 1000)}
+        self._samples.add("barge_in", event)
+        for listener in self.listeners:
+            listener(event)
+        logger.info("barge-in", extra={**self._tags, **event})
@@ -0,0 +1,104 @@
+"""
+Call teardown for the SIP agents.
+
+`CallControl.end_call()` lets the agent finish its current utterance, hangs up
+the SIP participant, deletes the room and closes the assistant so its STT/TTS
+streams are released right away instead of when the room times out.
+`EndCallFunctions` exposes it to the LLM as the "EndCall" tool the script
+refers to.
+"""
+
+import asyncio
+import logging
+from typing import Annotated, Callable, Optional
+
+from livekit import api
+from livekit.agents import JobContext, llm
+
+logger = logging.getLogger("call-control")
+
+
+class CallControl:
+    def __init__(self, ctx: JobContext, participant_identity: str) -> None:
+        self._ctx = ctx
+        self._participant_identity = participant_identity
+        self._assistant = None
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._ended: Optional[asyncio.Task] = None
+        self._end_callbacks: list[Callable[[str], None]] = []
+
+    @property
+    def ended(self) -> bool:
+        return self._ended is not None
+
+    def attach(self, assistant) -> None:
+        """Track when the assistant is speaking so hang-up waits for playout"""
+        self._assistant = assistant
+        assistant.on("agent_started_speaking", lambda *_: self._idle.clear())
+        assistant.on("agent_stopped_speaking", lambda *_: self._idle.set())
+
+    def add_end_callback(self, callback: Callable[[str], None]) -> None:
+        """Run `callback(reason)` as soon as the call starts ending"""
+        self._end_callbacks.append(callback)
+
+    def end_call(self, reason: str = "", playout_timeout: float = 10.0) -> "asyncio.Task[None]":
+        """Tear the call down; safe to call more than once"""
+        if self._ended is None:
+            for callback in self._end_callbacks:
+                callback(reason)
+            self._ended = asyncio.create_task(self._end_call(reason, playout_timeout))
+        return self._ended
+
+    async def _end_call(self, reason: str, playout_timeout: float) -> None:
+        logger.info(f"📴 Ending call in {self._ctx.room.name}: {reason or 'no reason given'}")
+
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=playout_timeout)
+            # let the last frames drain to the phone line before hanging up
+            await asyncio.sleep(0.3)
+        except asyncio.TimeoutError:
+            logger.warning("agent still speaking after %.0fs, hanging up anyway", playout_timeout)
+
+        room_name = self._ctx.room.name
+        results = await asyncio.gather(
+            self._ctx.api.room.remove_participant(
+                api.RoomParticipantIdentity(room=room_name, identity=self._participant_identity)
+            ),
+            self._close_assistant(),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning(f"error while hanging up: {result}")
+
+        try:
+            await self._ctx.api.room.delete_room(api.DeleteRoomRequest(room=room_name))
+        except Exception as e:
+            logger.warning(f"error deleting room {room_name}: {e}")
+
+        self._ctx.shutdown(reason=f"call ended: {reason}")
+
+    async def _close_assistant(self) -> None:
+        if self._assistant is not None:
+            await self._assistant.aclose()
+
+
+class EndCallFunctions(llm.FunctionContext):
+    def __init__(self, call: CallControl) -> None:
+        super().__init__()
+        self._call = call
+
+    @llm.ai_callable(
+        name="EndCall",
+        description=(
+            "End the phone call. Use it after saying goodbye, when the homeowner is not "
+            "interested or does not own the property, or when you reached a voicemail."
+        ),
+    )
+    async def end_call(
+        self,
+        reason: Annotated[str, llm.TypeInfo(description="Short reason the call is ending")] = "",
+    ):
+        self._call.end_call(reason)
+        return "The call is ending."
@@ -0,0 +1,407 @@
+"""
+Opt-in per-call recording for QA.
+
+With RECORD_CALLS=true every call writes, under RECORDINGS_DIR/<room>/:
+  - transcript.ndjson: one JSON line per transcript, speech and timing event,
+    with `t` in seconds since the call started
+  - audio-000001.flac, ...: the caller and the agent mixed to mono, in
+    `chunk_seconds` chunks (FLAC with soundfile installed, else 8-bit µ-law WAV)
+  - manifest.json, written when the call ends
+
+Memory per call is fixed however long the call runs. Audio is mixed straight
+into a ring buffer covering `ring_seconds` (the agent's TTS arrives faster
+than real time, so it is placed by wall clock, ahead of the caller's audio;
+when a reply is interrupted, the part that never played is zeroed again).
+Finished chunks and transcript lines go through a bounded queue to one writer
+task, which encodes and writes off the event loop; when the disk falls behind,
+the queue fills and audio older than the ring is dropped and counted rather
+than buffered.
+
+`LocalStore` lays objects out like a bucket (`<call>/<name>`); anything with
+the same `put`/`append` methods (an S3-compatible client) can replace it.
+"""
+
+import asyncio
+import io
+import json
+import logging
+import os
+import struct
+import time
+from collections import deque
+from typing import Optional
+
+import numpy as np
+
+from livekit import rtc
+
+from telephony_audio import TELEPHONY_SAMPLE_RATE, Decimator
+
+try:
+    import soundfile
+except ImportError:  # fall back to µ-law WAV, half the size of PCM
+    soundfile = None
+
+logger = logging.getLogger("call-recorder")
+
+
+class LocalStore:
+    def __init__(self, root: str) -> None:
+        self._root = root
+
+    def _path(self, key: str) -> str:
+        path = os.path.join(self._root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def append(self, key: str, data: bytes) -> None:
+        with open(self._path(key), "ab") as f:
+            f.write(data)
+
+
+def _mulaw(samples: np.ndarray) -> np.ndarray:
+    """G.711 µ-law encoding of int16 samples"""
+    x = samples.astype(np.int32)
+    sign = np.where(x < 0, 0x80, 0)
+    x = np.minimum(np.abs(x), 32635) + 0x84
+    exponent = np.log2(x >> 7).astype(np.int32)
+    mantissa = (x >> (exponent + 3)) & 0x0F
+    return (~(sign | (exponent << 4) | mantissa) & 0xFF).astype(np.uint8)
+
+
+def _mulaw_wav(samples: np.ndarray, sample_rate: int) -> bytes:
+    data = _mulaw(samples).tobytes()
+    # WAVE_FORMAT_MULAW (7) needs the extended fmt chunk and a fact chunk
+    fmt = struct.pack("<HHIIHHH", 7, 1, sample_rate, sample_rate, 1, 8, 0)
+    fact = struct.pack("<I", len(samples))
+    body = (
+        b"WAVE"
+        + b"fmt " + struct.pack("<I", len(fmt)) + fmt
+        + b"fact" + struct.pack("<I", len(fact)) + fact
+        + b"data" + struct.pack("<I", len(data)) + data
+        + (b"\x00" if len(data) % 2 else b"")
+    )
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+def encode_chunk(samples: np.ndarray, sample_rate: int) -> tuple[str, bytes]:
+    """(file extension, encoded bytes) for one mono int16 chunk"""
+    if soundfile is not None:
+        buf = io.BytesIO()
+        soundfile.write(buf, samples, sample_rate, format="FLAC", subtype="PCM_16")
+        return "flac", buf.getvalue()
+    return "wav", _mulaw_wav(samples, sample_rate)
+
+
+class _MixRing:
+    """Mixes audio placed at absolute sample positions into a fixed ring"""
+
+    def __init__(self, size: int, max_frame_samples: int = 4800) -> None:
+        self._ring = np.zeros(size, dtype=np.int16)
+        self._scratch = np.zeros(max_frame_samples, dtype=np.int32)
+        self.size = size
+        # samples before this position have been taken out of the ring
+        self.start = 0
+        self.dropped = 0
+
+    def mix(self, samples: np.ndarray, pos: int) -> None:
+        # keep only what falls inside [start, start + size)
+        lo, hi = max(pos, self.start), min(pos + len(samples), self.start + self.size)
+        if hi <= lo:
+            self.dropped += len(samples)
+            return
+        self.dropped += len(samples) - (hi - lo)
+        samples = samples[lo - pos:hi - pos]
+        while len(samples):
+            i = lo % self.size
+            n = min(len(samples), self.size - i, len(self._scratch))
+            acc = self._scratch[:n]
+            np.add(self._ring[i:i + n], samples[:n], out=acc, dtype=np.int32)
+            np.clip(acc, -32768, 32767, out=acc)
+            self._ring[i:i + n] = acc
+            samples, lo = samples[n:], lo + n
+
+    def clear(self, lo: int, hi: int) -> None:
+        """Zero [lo, hi), clipped to what the ring still holds"""
+        lo, hi = max(lo, self.start), min(hi, self.start + self.size)
+        while lo < hi:
+            i = lo % self.size
+            n = min(hi - lo, self.size - i)
+            self._ring[i:i + n] = 0
+            lo += n
+
+    def take(self, n: int) -> np.ndarray:
+        """Copy out the next `n` samples (n <= size) and clear them for reuse"""
+        i = self.start % self.size
+        first = min(n, self.size - i)
+        out = np.concatenate([self._ring[i:i + first], self._ring[:n - first]])
+        self._ring[i:i + first] = 0
+        self._ring[:n - first] = 0
+        self.start += n
+        return out
+
+
+class CallRecorder:
+    def __init__(
+        self,
+        store,
+        call_id: str,
+        sample_rate: int = TELEPHONY_SAMPLE_RATE,
+        chunk_seconds: float = 5.0,
+        ring_seconds: float = 30.0,
+        max_pending: int = 4,
+        max_lines: int = 1000,
+    ) -> None:
+        self._store = store
+        self._call_id = call_id
+        self.sample_rate = sample_rate
+        self._chunk = int(chunk_seconds * sample_rate)
+        self._ring = _MixRing(max(int(ring_seconds * sample_rate), 2 * self._chunk))
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._lines: deque[str] = deque(maxlen=max_lines)
+        self._caller_pos: Optional[int] = None
+        self._agent_pos = 0
+        # per (source, rate): a decimator keeps filter history, so streams can't share one
+        self._decimators: dict[tuple[str, int], Optional[Decimator]] = {}
+        self._started_wall = time.time()
+        self._started = time.monotonic()
+        self._tasks: list[asyncio.Task] = []
+        self._closed = False
+        self.stats = {"chunks": 0, "events": 0, "dropped_events": 0, "bytes": 0}
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._tick()), asyncio.create_task(self._write())]
+        self.event("call_started", call_id=self._call_id, wall_time=self._started_wall)
+
+    def _now(self) -> float:
+        return time.monotonic() - self._started
+
+    def _now_pos(self) -> int:
+        return int(self._now() * self.sample_rate)
+
+    def event(self, kind: str, **fields) -> None:
+        """One transcript or timing line"""
+        if self._closed:
+            return
+        if len(self._lines) == self._lines.maxlen:
+            # the oldest unwritten line is dropped by the deque
+            self.stats["dropped_events"] += 1
+        self._lines.append(json.dumps({"t": round(self._now(), 3), "type": kind, **fields}))
+        self.stats["events"] += 1
+
+    def _samples(self, frame: rtc.AudioFrame, source: str) -> Optional[np.ndarray]:
+        samples = np.frombuffer(frame.data, dtype=np.int16)
+        if frame.num_channels != 1:
+            samples = samples[:: frame.num_channels]
+        if frame.sample_rate == self.sample_rate:
+            return samples
+        key = (source, frame.sample_rate)
+        if key not in self._decimators:
+            try:
+                self._decimators[key] = Decimator(
+                    frame.sample_rate, self.sample_rate, max_frame_samples=max(4800, len(samples))
+                )
+            except ValueError:
+                logger.warning(f"can't record {frame.sample_rate} Hz {source} audio at {self.sample_rate} Hz")
+                self._decimators[key] = None
+        decimator = self._decimators[key]
+        return decimator.process(samples) if decimator is not None else None
+
+    def caller_audio(self, frame: rtc.AudioFrame) -> None:
+        samples = self._samples(frame, "caller")
+        if samples is None:
+            return
+        now = self._now_pos()
+        if self._caller_pos is None or abs(self._caller_pos - now) > self.sample_rate:
+            # first frame, or the stream stalled: re-anchor on the wall clock
+            self._caller_pos = now
+        self._ring.mix(samples, self._caller_pos)
+        self._caller_pos += len(samples)
+
+    def agent_audio(self, frame: rtc.AudioFrame) -> None:
+        samples = self._samples(frame, "agent")
+        if samples is None:
+            return
+        # a reply starts playing when its first frame arrives and plays back to back from there
+        self._agent_pos = max(self._agent_pos, self._now_pos())
+        self._ring.mix(samples, self._agent_pos)
+        self._agent_pos += len(samples)
+
+    def agent_audio_interrupted(self) -> None:
+        """Remove the synthesized audio that was mixed in ahead of now but never played"""
+        now = self._now_pos()
+        # caller audio is only ever placed up to its own position, so past that the range is agent-only
+        self._ring.clear(max(now, self._caller_pos or 0), self._agent_pos)
+        self._agent_pos = now
+
+    def attach(self, assistant) -> None:
+        """Record a VoiceAssistant's transcripts and speech timings"""
+        speech = ("user_started_speaking", "user_stopped_speaking", "agent_started_speaking", "agent_stopped_speaking")
+        for kind in speech:
+            assistant.on(kind, lambda *_, kind=kind: self.event(kind))
+        assistant.on("user_speech_committed", lambda msg: self.event("user", text=msg.content))
+        assistant.on("agent_speech_committed", lambda msg: self.event("agent", text=msg.content))
+
+        @assistant.on("agent_speech_interrupted")
+        def _on_interrupted(msg) -> None:
+            self.event("agent", text=msg.content, interrupted=True)
+            self.agent_audio_interrupted()
+
+        assistant.on(
+            "function_calls_finished",
+            lambda calls: self.event("function_calls", names=[c.call_info.function_info.name for c in calls]),
+        )
+
+    def attach_session(self, session) -> None:
+        """Record an AgentSession's conversation and state changes (transcript only)"""
+        session.on(
+            "conversation_item_added",
+            lambda ev: self.event(
+                ev.item.role, text=ev.item.text_content, interrupted=getattr(ev.item, "interrupted", False)
+            ),
+        )
+        session.on("user_state_changed", lambda ev: self.event("user_state", state=ev.new_state))
+        session.on("agent_state_changed", lambda ev: self.event("agent_state", state=ev.new_state))
+        session.on(
+            "function_tools_executed",
+            lambda ev: self.event("function_calls", names=[c.name for c in ev.function_calls]),
+        )
+
+    def attach_room(self, room: rtc.Room, participant: rtc.RemoteParticipant) -> None:
+        """Record the participant's audio, whether or not it is subscribed yet"""
+
+        def record(track: rtc.Track, participant_identity: str) -> None:
+            if track.kind == rtc.TrackKind.KIND_AUDIO and participant_identity == participant.identity:
+                self._tasks.append(asyncio.create_task(self._record_track(track)))
+
+        for publication in participant.track_publications.values():
+            if publication.track is not None:
+                record(publication.track, participant.identity)
+        room.on("track_subscribed", lambda track, _, p: record(track, p.identity))
+
+    async def _record_track(self, track: rtc.Track) -> None:
+        stream = rtc.AudioStream(track, sample_rate=self.sample_rate, num_channels=1)
+        try:
+            async for ev in stream:
+                self.caller_audio(ev.frame)
+        finally:
+            await stream.aclose()
+
+    async def _tick(self) -> None:
+        while True:
+            await asyncio.sleep(1.0)
+            await self._flush(final=False)
+
+    async def _flush(self, final: bool) -> None:
+        if self._lines:
+            lines, self._lines = "".join(line + "\n" for line in self._lines), deque(maxlen=self._lines.maxlen)
+            await self._queue.put(("transcript.ndjson", lines.encode("utf-8"), True))
+        # a second of slack for caller frames that arrive late
+        ready = self._now_pos() - (0 if final else self.sample_rate)
+        while ready - self._ring.start >= self._chunk or (final and ready > self._ring.start):
+            samples = self._ring.take(min(self._chunk, ready - self._ring.start))
+            self.stats["chunks"] += 1
+            # blocks when the writer is behind; the ring keeps absorbing audio meanwhile
+            await self._queue.put((self.stats["chunks"], samples, False))
+        if final and self._agent_pos > ready:
+            # the call ended before the rest of the agent's reply played
+            self._ring.dropped += self._agent_pos - ready
+
+    async def _write(self) -> None:
+        while (item := await self._queue.get()) is not None:
+            try:
+                await asyncio.to_thread(self._write_item, *item)
+            except Exception:
+                logger.exception(f"failed to write recording of {self._call_id}")
+
+    def _write_item(self, name, payload, append: bool) -> None:
+        if append:
+            self._store.append(f"{self._call_id}/{name}", payload)
+            return
+        ext, data = encode_chunk(payload, self.sample_rate)
+        self._store.put(f"{self._call_id}/audio-{name:06d}.{ext}", data)
+        self.stats["bytes"] += len(data)
+
+    async def aclose(self) -> None:
+        if self._closed or not self._tasks:
+            return
+        self.event("call_ended", duration=round(self._now(), 3))
+        self._closed = True
+        ticker, writer, *tracks = self._tasks
+        for task in (ticker, *tracks):
+            task.cancel()
+        await self._flush(final=True)
+        await self._queue.put(None)
+        await writer
+        manifest = {
+            "call_id": self._call_id,
+            "started_at": self._started_wall,
+            "duration": round(self._now(), 3),
+            "sample_rate": self.sample_rate,
+            "dropped_audio_seconds": round(self._ring.dropped / self.sample_rate, 3),
+            **self.stats,
+        }
+        await asyncio.to_thread(self._store.put, f"{self._call_id}/manifest.json", json.dumps(manifest).encode())
+        logger.info(f"recorded call {self._call_id}: {manifest}")
+
+
+def recorder_from_env(call_id: str) -> Optional[CallRecorder]:
+    """A started recorder when RECORD_CALLS is set, else None"""
+    if os.getenv("RECORD_CALLS", "false").lower() != "true":
+        return None
+    recorder = CallRecorder(LocalStore(os.getenv("RECORDINGS_DIR", "recordings")), call_id)
+    recorder.start()
+    return recorder
+
+
+class _RecordedChunkedStream:
+    def __init__(self, wrapped, recorder: CallRecorder) -> None:
+        self._wrapped = wrapped
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def __aiter__(self) -> "_RecordedChunkedStream":
+        return self
+
+    async def __anext__(self):
+        audio = await self._wrapped.__anext__()
+        self._recorder.agent_audio(audio.frame)
+        return audio
+
+    async def __aenter__(self) -> "_RecordedChunkedStream":
+        if hasattr(self._wrapped, "__aenter__"):
+            await self._wrapped.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        if hasattr(self._wrapped, "__aexit__"):
+            await self._wrapped.__aexit__(*exc)
+
+
+class RecordedTTS:
+    """Copies every synthesized frame into the call recording"""
+
+    def __init__(self, wrapped, recorder: CallRecorder) -> None:
+        self._wrapped = wrapped
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def synthesize(self, *args, **kwargs) -> _RecordedChunkedStream:
+        return _RecordedChunkedStream(self._wrapped.synthesize(*args, **kwargs), self._recorder)
+
+
+def recorded_tts(wrapped, recorder: Optional[CallRecorder]):
+    """No-op without a recorder"""
+    return wrapped if recorder is None else RecordedTTS(wrapped, recorder)
+
@@ -0,0 +1,91 @@
+"""
+Event-driven call start.
+
+Instead of sleeping a fixed 2-3 seconds, the greeting goes out as soon as the
+callee has answered: the SIP participant's `sip.callStatus` attribute turns
+"active" and its audio track is subscribed. Participants without SIP
+attributes (e.g. a browser test client) count as answered once their audio
+track is subscribed.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Callable
+
+from livekit import rtc
+
+logger = logging.getLogger("call-start")
+
+CALL_STATUS_ATTRIBUTE = "sip.callStatus"
+
+
+class CallStart:
+    def __init__(self, room: rtc.Room, participant: rtc.RemoteParticipant) -> None:
+        self._room = room
+        self._participant = participant
+        self._answered = asyncio.Event()
+        self._hung_up = asyncio.Event()
+        self._created = time.perf_counter()
+        self._greeted = False
+        self._listeners: list[Callable[[], None]] = []
+
+        room.on("participant_attributes_changed", self._on_change)
+        room.on("track_subscribed", self._on_change)
+        room.on("participant_disconnected", self._on_disconnected)
+        self._check()
+
+    def _is_callee(self, participant) -> bool:
+        return getattr(participant, "identity", None) == self._participant.identity
+
+    def _on_change(self, *args) -> None:
+        if any(self._is_callee(arg) for arg in args):
+            self._check()
+
+    def _on_disconnected(self, participant: rtc.RemoteParticipant) -> None:
+        if self._is_callee(participant):
+            self._hung_up.set()
+
+    def _check(self) -> None:
+        if self._answered.is_set():
+            return
+        status = self._participant.attributes.get(CALL_STATUS_ATTRIBUTE)
+        has_audio = any(
+            pub.kind == rtc.TrackKind.KIND_AUDIO and pub.track is not None
+            for pub in self._participant.track_publications.values()
+        )
+        if status in (None, "", "active") and has_audio:
+            logger.info(
+                "call answered by %s after %.0f ms",
+                self._participant.identity,
+                (time.perf_counter() - self._created) * 1000,
+            )
+            self._answered.set()
+            for listener in self._listeners:
+                listener()
+            self._listeners.clear()
+
+    def on_answered(self, callback: Callable[[], None]) -> None:
+        """Call `callback` once the callee answers, right away if they already have"""
+        if self._answered.is_set():
+            callback()
+        else:
+            self._listeners.append(callback)
+
+    async def wait(self, timeout: float = 60.0) -> bool:
+        """True once answered; False if the callee hung up or never answered"""
+        answered = asyncio.ensure_future(self._answered.wait())
+        hung_up = asyncio.ensure_future(self._hung_up.wait())
+        try:
+            await asyncio.wait({answered, hung_up}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            answered.cancel()
+            hung_up.cancel()
+        return self._answered.is_set()
+
+    async def greet(self, assistant, text: str) -> None:
+        """Say the greeting once per call, as soon as the callee answers"""
+        if not await self.wait() or self._greeted:
+            return
+        self._greeted = True
+        await assistant.say(text, allow_interruptions=True)
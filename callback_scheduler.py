@@ -0,0 +1,426 @@
+"""
+Scheduled callbacks for "call me later" outcomes.
+
+When a homeowner asks to be called back, the agent's `record_callback_time`
+tool turns the time they said ("tomorrow around 3", "in two hours") into a due
+time in the lead's own timezone, moved into the calling window, and appends it
+to a shared log (`callbacks.jsonl`, or CALLBACK_LOG). The campaign dialer
+replays that log into a heap once at startup, then only reads the lines
+appended since, so due callbacks are found in O(log n) however many are
+pending. Each line is one `add` or `done` event; a later `add` for the same
+lead replaces the earlier one, and the log is compacted once most of its
+lines are dead. A callback popped by a dialer that then crashes is replayed on
+the next start, so every callback is dialed at least once.
+
+Agents and the dialer append under the same file lock, so they must share the
+file (one host, or a shared volume).
+"""
+
+import contextlib
+import heapq
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from dataclasses import asdict, dataclass, field, replace
+from datetime import datetime, timedelta
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from trunk_registry import locked, write_atomic
+
+logger = logging.getLogger("callback-scheduler")
+
+DEFAULT_LOG = "callbacks.jsonl"
+
+# primary timezone per US state, for leads without an explicit `timezone`
+_STATE_TIMEZONES = {
+    "AL": "America/Chicago", "AK": "America/Anchorage", "AZ": "America/Phoenix", "AR": "America/Chicago",
+    "CA": "America/Los_Angeles", "CO": "America/Denver", "CT": "America/New_York", "DE": "America/New_York",
+    "DC": "America/New_York", "FL": "America/New_York", "GA": "America/New_York", "HI": "Pacific/Honolulu",
+    "ID": "America/Boise", "IL": "America/Chicago", "IN": "America/Indiana/Indianapolis", "IA": "America/Chicago",
+    "KS": "America/Chicago", "KY": "America/New_York", "LA": "America/Chicago", "ME": "America/New_York",
+    "MD": "America/New_York", "MA": "America/New_York", "MI": "America/Detroit", "MN": "America/Chicago",
+    "MS": "America/Chicago", "MO": "America/Chicago", "MT": "America/Denver", "NE": "America/Chicago",
+    "NV": "America/Los_Angeles", "NH": "America/New_York", "NJ": "America/New_York", "NM": "America/Denver",
+    "NY": "America/New_York", "NC": "America/New_York", "ND": "America/Chicago", "OH": "America/New_York",
+    "OK": "America/Chicago", "OR": "America/Los_Angeles", "PA": "America/New_York", "RI": "America/New_York",
+    "SC": "America/New_York", "SD": "America/Chicago", "TN": "America/Chicago", "TX": "America/Chicago",
+    "UT": "America/Denver", "VT": "America/New_York", "VA": "America/New_York", "WA": "America/Los_Angeles",
+    "WV": "America/New_York", "WI": "America/Chicago", "WY": "America/Denver",
+}
+_STATE_IN_ADDRESS = re.compile(r"\b([A-Z]{2})\s+\d{5}(?:-\d{4})?\b")
+
+
+def lead_timezone(fields: dict) -> ZoneInfo:
+    """The lead's `timezone` column, else its state's, else CALLBACK_DEFAULT_TZ"""
+    name = fields.get("timezone") or fields.get("tz")
+    if not name:
+        state = (fields.get("state") or "").strip().upper()
+        if not state:
+            m = _STATE_IN_ADDRESS.search(fields.get("address") or "")
+            state = m.group(1) if m else ""
+        name = _STATE_TIMEZONES.get(state)
+    try:
+        return ZoneInfo(name or os.getenv("CALLBACK_DEFAULT_TZ", "America/New_York"))
+    except (ZoneInfoNotFoundError, ValueError):
+        logger.warning(f"unknown timezone {name!r}, using the default")
+        return ZoneInfo(os.getenv("CALLBACK_DEFAULT_TZ", "America/New_York"))
+
+
+@dataclass(frozen=True)
+class CallingWindow:
+    # Local hours a lead may be called in: from start:00 up to and including end:00.
+
+    start_hour: int = 9
+    end_hour: int = 20
+
+    @classmethod
+    def from_env(cls) -> "CallingWindow":
+        start, _, end = os.getenv("CALLBACK_WINDOW", "9-20").partition("-")
+        return cls(int(start), int(end))
+
+    def contains(self, local: datetime) -> bool:
+        # "8pm" with a 9-20 window is still a time they may be called
+        return self.start_hour <= local.hour < self.end_hour or (local.hour == self.end_hour and local.minute == 0)
+
+    def next_open(self, local: datetime) -> datetime:
+        """`local` itself if it's inside the window, else the window's next opening"""
+        if self.contains(local):
+            return local
+        opening = local.replace(hour=self.start_hour, minute=0, second=0, microsecond=0)
+        return opening if local.hour < self.start_hour else opening + timedelta(days=1)
+
+
+_NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "fifteen": 15, "twenty": 20,
+    "thirty": 30, "forty": 40, "forty-five": 45, "couple": 2, "few": 3,
+}
+_WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+_MONTHS = [
+    "january", "february", "march", "april", "may", "june",
+    "july", "august", "september", "october", "november", "december",
+]
+# (pattern, usual hour, hour it's over); "afternoon" has to be tried before "noon"
+_PARTS_OF_DAY = [
+    (re.compile(rf"\b{part}\b"), hour, end)
+    for part, hour, end in [
+        ("morning", 10, 12), ("afternoon", 14, 17), ("evening", 18, 21),
+        ("tonight", 18, 21), ("lunch", 12, 14), ("noon", 12, 13),
+    ]
+]
+
+# "in" is often dropped: "give me half an hour", "two hours"
+_RELATIVE = re.compile(
+    r"\b(?:in\s+)?(?:(half)\s+an?\s+hour|(?:a\s+)?(\d+|%s)\s+(?:of\s+)?(minute|min|hour|hr|day|week|month)s?)"
+    % "|".join(re.escape(w) for w in _NUMBER_WORDS)
+)
+_CLOCK = re.compile(
+    r"\b(\d{1,2}|%s)(?::(\d{2}))?\s*(a\.?m\.?|p\.?m\.?|o'?clock)?(?=\W|$)" % "|".join(
+        w for w, n in _NUMBER_WORDS.items() if 1 <= n <= 12 and len(w) > 2
+    )
+)
+
+
+def _number(word: str) -> int:
+    return int(word) if word.isdigit() else _NUMBER_WORDS[word]
+
+
+def _add_months(day: datetime, months: int) -> datetime:
+    month = day.month - 1 + months
+    # the 28th exists in every month; close enough for "in a month"
+    return day.replace(year=day.year + month // 12, month=month % 12 + 1, day=min(day.day, 28))
+
+
+def _month_day(text: str, now: datetime) -> Optional[datetime]:
+    """The day a month-level phrase points at ("next month", "end of the month", "in March")"""
+    if re.search(r"\bnext\s+month\b", text):
+        return _add_months(now, 1).replace(day=1)
+    if re.search(r"\bend\s+of\s+(?:the\s+|this\s+)?month\b", text):
+        end = _add_months(now, 1).replace(day=1) - timedelta(days=3)
+        return end if end.date() > now.date() else now + timedelta(days=1)
+    for i, name in enumerate(_MONTHS):
+        # "may" is too common a word to stand on its own
+        pattern = rf"\b(?:in|early|mid|late|of)\s+{name}\b" if name == "may" else rf"\b{name}\b"
+        if re.search(pattern, text):
+            months_ahead = (i + 1 - now.month) % 12
+            if months_ahead == 0:
+                # later this month
+                return now + timedelta(days=1)
+            return _add_months(now, months_ahead).replace(day=1)
+    return None
+
+
+def _clock_time(text: str) -> Optional[tuple[int, int, bool]]:
+    """(hour, minute, could be pm) of the first clock time in `text`, guessing am/pm the way people mean it"""
+    for m in _CLOCK.finditer(text):
+        hour, minute, suffix = _number(m.group(1)), int(m.group(2) or 0), (m.group(3) or "").replace(".", "")
+        if not 0 <= hour <= 23 or minute > 59:
+            continue
+        if not suffix and not m.group(2) and not re.search(r"\b(at|around|about|by|after|before)\s+$", text[: m.start()]):
+            # a bare number is only a time when something says so ("at 3", "3pm", "3:30")
+            continue
+        if suffix == "pm" and hour < 12:
+            hour += 12
+        elif suffix == "am" and hour == 12:
+            hour = 0
+        elif suffix in ("", "oclock", "o'clock") and 1 <= hour <= 7:
+            hour += 12  # nobody asks for a call back at 3 in the morning
+        # a bare 8 or 9 is 8am in the morning but 8pm once the morning has passed
+        return hour, minute, suffix in ("", "oclock", "o'clock") and 8 <= hour <= 9
+    return None
+
+
+def _next_quarter(now: datetime) -> datetime:
+    return now.replace(second=0, microsecond=0) + timedelta(minutes=15 - now.minute % 15)
+
+
+def parse_callback_time(said: str, now: datetime) -> Optional[datetime]:
+    """Absolute local time for a spoken callback time, relative to `now` (lead-local, tz-aware)"""
+    text = said.lower().replace("-", " ").replace("forty five", "forty-five")
+
+    m = _RELATIVE.search(text)
+    if m:
+        if m.group(1):
+            return now + timedelta(minutes=30)
+        amount, unit = _number(m.group(2)), m.group(3)
+        if unit.startswith("min"):
+            return now + timedelta(minutes=amount)
+        if unit.startswith("h"):
+            return now + timedelta(hours=amount)
+        if unit == "month":
+            day = _add_months(now, amount)
+        else:
+            day = now + timedelta(days=amount * (7 if unit == "week" else 1))
+        return day.replace(hour=10, minute=0, second=0, microsecond=0)
+
+    weekday = next((i for i, name in enumerate(_WEEKDAYS) if re.search(rf"\b{name}\b", text)), None)
+    day, explicit_day = now, True
+    if "tomorrow" in text:
+        day = now + timedelta(days=1)
+    elif "weekend" in text:
+        day = now + timedelta(days=(5 - now.weekday()) % 7 or 7)
+    elif re.search(r"\bnext\s+week\b", text) or (
+        weekday is not None and re.search(rf"\bnext\s+{_WEEKDAYS[weekday]}\b", text)
+    ):
+        # Monday of next week, or the day they named in it ("next tuesday" is never tomorrow)
+        day = now + timedelta(days=7 - now.weekday() + (weekday or 0))
+    elif weekday is not None:
+        day = now + timedelta(days=(weekday - now.weekday()) % 7 or 7)
+    else:
+        month_day = _month_day(text, now)
+        day, explicit_day = (month_day, True) if month_day else (now, False)
+
+    clock = _clock_time(text)
+    part_ends = None
+    if clock is None:
+        part = next(((h, end) for pattern, h, end in _PARTS_OF_DAY if pattern.search(text)), None)
+        if part is not None:
+            clock, part_ends = (part[0], 0, False), part[1]
+    if clock is None:
+        if explicit_day:
+            clock = (10, 0, False)
+        elif re.search(r"\b(later|few hours|couple hours)\b", text):
+            return now + timedelta(hours=2)
+        else:
+            return None
+
+    hour, minute, could_be_pm = clock
+    at = day.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if not explicit_day and at <= now:
+        if could_be_pm and at + timedelta(hours=12) > now:
+            at += timedelta(hours=12)
+        elif part_ends is not None and now.hour < part_ends:
+            # "this afternoon" said mid-afternoon: as soon as we can
+            at = _next_quarter(now)
+        else:
+            at += timedelta(days=1)
+    return at
+
+
+@dataclass
+class Callback:
+    lead_id: str
+    phone: str
+    due_at: float
+    timezone: str
+    said: str = ""
+    # the lead row, forwarded to the agent again when the callback is dialed
+    fields: dict = field(default_factory=dict)
+    attempts: int = 0
+    callback_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    created_at: float = field(default_factory=time.time)
+
+
+def _log_path(path: Optional[str]) -> str:
+    return path or os.getenv("CALLBACK_LOG", DEFAULT_LOG)
+
+
+def _append(path: str, events: list[dict]) -> None:
+    with locked(path), open(path, "a", encoding="utf-8") as f:
+        f.writelines(json.dumps(event) + "\n" for event in events)
+
+
+def callback_due(said: str, fields: Optional[dict] = None, window: Optional[CallingWindow] = None) -> tuple[datetime, bool]:
+    """Lead-local due time for what the homeowner said, and whether it differs from what they asked for"""
+    window = window or CallingWindow.from_env()
+    now = datetime.now(lead_timezone(fields or {}))
+    asked = parse_callback_time(said, now)
+    if asked is None:
+        # "not now" means not today: try when tomorrow's window opens
+        logger.warning(f"couldn't read a time from {said!r}, calling back tomorrow")
+        due = (now + timedelta(days=1)).replace(hour=window.start_hour, minute=0, second=0, microsecond=0)
+        return due, True
+    due = window.next_open(asked)
+    return due, due != asked
+
+
+def schedule_callback(
+    lead_id: str,
+    phone: str,
+    said: str,
+    fields: Optional[dict] = None,
+    path: Optional[str] = None,
+    window: Optional[CallingWindow] = None,
+    due: Optional[datetime] = None,
+) -> Callback:
+    """Turn what the homeowner said into a due time and append it to the log (blocking)"""
+    fields = fields or {}
+    tz = lead_timezone(fields)
+    if due is None:
+        due, _ = callback_due(said, fields, window)
+
+    callback = Callback(lead_id=lead_id, phone=phone, due_at=due.timestamp(), timezone=tz.key, said=said, fields=fields)
+    _append(_log_path(path), [{"op": "add", **asdict(callback)}])
+    logger.info(f"lead {lead_id}: callback at {due.isoformat()} ({said!r})")
+    return callback
+
+
+class CallbackScheduler:
+    """Due-time heap over the callback log, owned by one dialer process"""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        window: Optional[CallingWindow] = None,
+        compact_ratio: float = 2.0,
+    ) -> None:
+        self._path = _log_path(path)
+        self._window = window or CallingWindow.from_env()
+        self._compact_ratio = compact_ratio
+        self._heap: list[tuple[float, str, str]] = []
+        # latest pending callback per lead; heap entries that don't match it are stale
+        self._pending: dict[str, Callback] = {}
+        self._in_flight: dict[str, Callback] = {}
+        self._offset = 0
+        self._lines = 0
+        self.sync()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def sync(self) -> int:
+        """Apply the events appended since the last sync; returns how many were read"""
+        try:
+            with open(self._path, "rb") as f:
+                if os.fstat(f.fileno()).st_size < self._offset:
+                    # rewritten by another process's compaction; the rewrite holds every live entry
+                    self._reset()
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            return 0
+
+        # a line still being written has no newline yet; leave it for the next sync
+        end = data.rfind(b"\n") + 1
+        count = 0
+        for line in data[:end].splitlines():
+            try:
+                self._apply(json.loads(line))
+                count += 1
+            except (ValueError, KeyError, TypeError):
+                logger.warning(f"skipping bad callback log line: {line[:200]!r}")
+        self._offset += end
+        self._lines += count
+        return count
+
+    def _reset(self) -> None:
+        self._heap, self._pending, self._offset, self._lines = [], {}, 0, 0
+
+    def _apply(self, event: dict) -> None:
+        op = event.pop("op")
+        if op == "add":
+            callback = Callback(**event)
+            if callback.callback_id in self._in_flight:
+                return
+            self._pending[callback.lead_id] = callback
+            heapq.heappush(self._heap, (callback.due_at, callback.callback_id, callback.lead_id))
+        elif op == "done":
+            current = self._pending.get(event["lead_id"])
+            if current is not None and current.callback_id == event["callback_id"]:
+                del self._pending[event["lead_id"]]
+            self._in_flight.pop(event["callback_id"], None)
+
+    def _live_top(self) -> Optional[Callback]:
+        while self._heap:
+            _, callback_id, lead_id = self._heap[0]
+            current = self._pending.get(lead_id)
+            if current is not None and current.callback_id == callback_id:
+                return current
+            heapq.heappop(self._heap)
+        return None
+
+    def next_due(self) -> Optional[float]:
+        top = self._live_top()
+        return top.due_at if top else None
+
+    def pop_due(self, now: Optional[float] = None) -> Optional[Callback]:
+        """The earliest callback that is due and inside its lead's calling window, if any"""
+        now = time.time() if now is None else now
+        while (top := self._live_top()) is not None and top.due_at <= now:
+            heapq.heappop(self._heap)
+            local = datetime.fromtimestamp(now, ZoneInfo(top.timezone))
+            if not self._window.contains(local):
+                # came due while the dialer was down, or the window changed since
+                self.reschedule(top, self._window.next_open(local).timestamp())
+                continue
+            del self._pending[top.lead_id]
+            self._in_flight[top.callback_id] = top
+            return top
+        return None
+
+    def reschedule(self, callback: Callback, due_at: float) -> Callback:
+        self._in_flight.pop(callback.callback_id, None)
+        if self._pending.get(callback.lead_id, callback).callback_id != callback.callback_id:
+            # the homeowner asked for a new time during the call; that one wins
+            return self._pending[callback.lead_id]
+        moved = replace(callback, due_at=due_at, callback_id=uuid.uuid4().hex)
+        self._write([{"op": "done", "lead_id": callback.lead_id, "callback_id": callback.callback_id},
+                     {"op": "add", **asdict(moved)}])
+        return moved
+
+    def complete(self, callback: Callback, status: str) -> None:
+        self._write([{"op": "done", "lead_id": callback.lead_id, "callback_id": callback.callback_id,
+                      "status": status, "at": time.time()}])
+
+    def _write(self, events: list[dict]) -> None:
+        _append(self._path, events)
+        self.sync()
+        live = len(self._pending) + len(self._in_flight)
+        if self._lines > 1000 and self._lines > self._compact_ratio * live:
+            self.compact()
+
+    def compact(self) -> None:
+        """Rewrite the log with only the live callbacks"""
+        with locked(self._path):
+            # pick up anything appended since the last sync before dropping the old file
+            self.sync()
+            live = [*self._pending.values(), *self._in_flight.values()]
+            write_atomic(self._path, "".join(json.dumps({"op": "add", **asdict(c)}) + "\n" for c in live))
+            with contextlib.suppress(FileNotFoundError):
+                self._offset = os.path.getsize(self._path)
+            self._lines = len(live)
+        logger.info(f"compacted the callback log to {len(live)} entries")
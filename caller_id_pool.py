@@ -0,0 +1,226 @@
+"""
+Caller-ID pool for outbound calls.
+
+Spreads calls across every number the trunks carry, so no single number gets
+carrier-throttled or flagged as spam. Each number has a calls-per-minute token
+bucket and a daily cap; a number that is throttled is skipped until its bucket
+refills, one that reached its cap until local midnight. Among the numbers with
+capacity, a number in the lead's area code is preferred (local presence, NANP
+numbers only), otherwise numbers are picked by smooth weighted round-robin.
+
+Daily counts are kept per local date in a small JSON file (CALLER_ID_USAGE),
+so they survive dialer restarts and are shared by every script on the host
+that places calls. Counting a call locks and rewrites that file, so it runs in
+a worker thread; picking a number reads the counts this process last saw. The
+per-minute buckets are per process.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass
+from datetime import date
+from typing import Iterable, Optional
+
+from trunk_registry import TrunkRegistry, TrunkRoute, locked, parse_list, write_atomic
+
+logger = logging.getLogger("caller-id-pool")
+
+
+class CallerIdExhausted(Exception):
+    """Every number in the pool has used up its daily cap"""
+
+
+def area_code(number: str) -> Optional[str]:
+    """NANP area code of an E.164 number, e.g. "308" for +13082514678"""
+    digits = re.sub(r"\D", "", number)
+    if len(digits) == 11 and digits.startswith("1"):
+        return digits[1:4]
+    return None
+
+
+def parse_weighted(values: Iterable[str]) -> dict[str, int]:
+    """`+13082514678:3` style entries to {number: weight}; the weight defaults to 1"""
+    weights = {}
+    for value in values:
+        number, _, weight = value.partition(":")
+        weights[number.strip()] = int(weight) if weight else 1
+    return weights
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, period: float) -> None:
+        self.capacity = capacity
+        self._rate = capacity / period
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def available(self) -> float:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+        return self._tokens
+
+    def take(self) -> None:
+        self._tokens = self.available() - 1
+
+    def give_back(self) -> None:
+        self._tokens = min(self.capacity, self.available() + 1)
+
+    def wait_time(self) -> float:
+        """Seconds until one token is available"""
+        return max(0.0, (1 - self.available()) / self._rate)
+
+
+class DailyUsage:
+    """Calls placed per caller ID on the current local date, persisted across runs"""
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self._path = path or os.getenv("CALLER_ID_USAGE", ".caller_id_usage.json")
+        # (date, counts) as of this process's last read or write
+        self._seen: Optional[tuple[str, dict[str, int]]] = None
+
+    def _read(self) -> dict[str, int]:
+        today = date.today().isoformat()
+        try:
+            with open(self._path, encoding="utf-8") as f:
+                usage = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            usage = {}
+        # counts from an earlier day reset at local midnight
+        calls = usage.get("calls", {}) if usage.get("date") == today else {}
+        self._seen = (today, calls)
+        return calls
+
+    def counts(self) -> dict[str, int]:
+        """Today's counts as of the last `try_take` (other processes' calls show up there)"""
+        if self._seen is None or self._seen[0] != date.today().isoformat():
+            return self._read()
+        return self._seen[1]
+
+    def try_take(self, number: str, cap: float) -> bool:
+        """Count one call from `number` unless it already reached `cap` today (blocking)"""
+        with locked(self._path):
+            calls = dict(self._read())
+            if calls.get(number, 0) >= cap:
+                return False
+            calls[number] = calls.get(number, 0) + 1
+            write_atomic(self._path, json.dumps({"date": date.today().isoformat(), "calls": calls}))
+            self._seen = (date.today().isoformat(), calls)
+        return True
+
+
+@dataclass
+class _Number:
+    route: TrunkRoute
+    weight: int
+    per_minute: TokenBucket
+    # smooth weighted round-robin state
+    current: int = 0
+    calls: int = 0
+
+
+class CallerIdPool:
+    def __init__(
+        self,
+        routes: list[TrunkRoute],
+        weights: Optional[dict[str, int]] = None,
+        calls_per_minute: float = 6,
+        daily_cap: float = 300,
+        local_presence: bool = True,
+        usage: Optional[DailyUsage] = None,
+    ) -> None:
+        weights = weights or {}
+        self._numbers = [
+            _Number(
+                route=route,
+                weight=max(1, weights.get(route.number, 1)),
+                per_minute=TokenBucket(calls_per_minute, 60),
+            )
+            for route in routes
+        ]
+        self._daily_cap = daily_cap
+        self._usage = usage or DailyUsage()
+        self._local_presence = local_presence
+        self._started = time.monotonic()
+
+    @property
+    def routes(self) -> list[TrunkRoute]:
+        return [n.route for n in self._numbers]
+
+    def _with_daily_capacity(self, trunk_id: Optional[str] = None) -> list[_Number]:
+        counts = self._usage.counts()
+        numbers = [n for n in self._numbers if counts.get(n.route.number, 0) < self._daily_cap]
+        if not numbers:
+            raise CallerIdExhausted(f"all {len(self._numbers)} caller IDs reached their daily cap")
+        if trunk_id is not None:
+            numbers = [n for n in numbers if n.route.trunk_id == trunk_id]
+            if not numbers:
+                raise CallerIdExhausted(f"the caller IDs on trunk {trunk_id} reached their daily cap")
+        return numbers
+
+    def trunks_with_capacity(self) -> set[str]:
+        """Trunks that still carry a caller ID with calls left today"""
+        try:
+            return {n.route.trunk_id for n in self._with_daily_capacity()}
+        except CallerIdExhausted:
+            return set()
+
+    def _next(self, ready: list[_Number], to_number: Optional[str]) -> _Number:
+        candidates = ready
+        if self._local_presence and to_number:
+            code = area_code(to_number)
+            local = [n for n in ready if code and area_code(n.route.number) == code]
+            candidates = local or ready
+
+        total = sum(n.weight for n in candidates)
+        for n in candidates:
+            n.current += n.weight
+        best = max(candidates, key=lambda n: n.current)
+        best.current -= total
+        return best
+
+    async def acquire(self, to_number: Optional[str] = None, trunk_id: Optional[str] = None) -> TrunkRoute:
+        """Wait for a caller ID with capacity; raises CallerIdExhausted once no number has any left today"""
+        while True:
+            ready = [n for n in self._with_daily_capacity(trunk_id) if n.per_minute.available() >= 1]
+            while ready:
+                best = self._next(ready, to_number)
+                # hold the minute token while the count is written, so other callers pick another number
+                best.per_minute.take()
+                if await asyncio.to_thread(self._usage.try_take, best.route.number, self._daily_cap):
+                    best.calls += 1
+                    return best.route
+                # another process used its last call of the day in the meantime
+                best.per_minute.give_back()
+                ready = [n for n in ready if n is not best and n.per_minute.available() >= 1]
+            await asyncio.sleep(min(n.per_minute.wait_time() for n in self._with_daily_capacity(trunk_id)))
+
+    def utilization(self) -> dict[str, dict]:
+        """Per-number calls placed and how much of each cap is in use"""
+        minutes = max(1 / 60, (time.monotonic() - self._started) / 60)
+        counts = self._usage.counts()
+        return {
+            n.route.number: {
+                "trunk_id": n.route.trunk_id,
+                "calls": n.calls,
+                "calls_per_minute": round(n.calls / minutes, 2),
+                "minute_utilization": round(1 - n.per_minute.available() / n.per_minute.capacity, 2),
+                "daily_utilization": round(counts.get(n.route.number, 0) / self._daily_cap, 3),
+            }
+            for n in self._numbers
+        }
+
+
+async def load_pool(lkapi, numbers: list[str], **kwargs) -> CallerIdPool:
+    """Pool for `NUMBER[:WEIGHT]` entries, each routed through the trunk that carries it"""
+    weights = parse_weighted(numbers)
+    routes = await TrunkRegistry(lkapi).routes(weights)
+    if not routes:
+        # no trunk lists these numbers; trust the configured trunk ids to carry them
+        trunk_ids = parse_list(os.getenv("SIP_OUTBOUND_TRUNK_ID"))
+        routes = [TrunkRoute(trunk_id=t, number=n) for t in trunk_ids for n in weights]
+    return CallerIdPool(routes, weights=weights, **kwargs)
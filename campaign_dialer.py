@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Campaign Dialer
+Dial a whole lead file (CSV or JSONL) through one shared LiveKit API client,
+with a calls-per-second limit, a cap on live calls per trunk and a checkpoint
+file so a restarted campaign resumes where it stopped. Callbacks the agents
+booked are dialed as they come due, ahead of fresh leads.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import csv
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field, replace
+from typing import AsyncIterator, Iterator, Optional
+
+from dotenv import load_dotenv
+from livekit import api
+
+from callback_scheduler import Callback, CallbackScheduler
+from caller_id_pool import CallerIdExhausted, CallerIdPool, load_pool
+from livekit_client import SharedLiveKitAPI, close_api, get_api
+from make_call import DEFAULT_FROM_NUMBER, build_call_request
+from room_allocator import RoomAllocator
+from trunk_registry import TrunkRoute, parse_list
+
+load_dotenv()
+
+logger = logging.getLogger("campaign-dialer")
+
+
+@dataclass
+class Lead:
+    lead_id: str
+    phone: str
+    # Every other column of the lead row (first_name, city, address, ...),
+    # forwarded to the agent as participant metadata.
+    fields: dict = field(default_factory=dict)
+
+
+def read_leads(path: str) -> Iterator[Lead]:
+    """Stream leads from a CSV or JSONL file without loading it into memory"""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith((".jsonl", ".ndjson")):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+
+        for row in rows:
+            phone = (row.get("phone") or row.get("to_number") or "").strip()
+            if not phone:
+                logger.warning("skipping lead without a phone number: %s", row)
+                continue
+            lead_id = str(row.get("lead_id") or row.get("id") or phone)
+            extra = {
+                k: v for k, v in row.items()
+                if k not in ("lead_id", "id", "phone", "to_number") and v not in (None, "")
+            }
+            yield Lead(lead_id=lead_id, phone=phone, fields=extra)
+
+
+class RateLimiter:
+    """Token bucket limiting how many calls are started per second"""
+
+    def __init__(self, rate: float, burst: Optional[int] = None) -> None:
+        self._rate = rate
+        self._capacity = float(burst or max(1, int(rate)))
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self._capacity, self._tokens + (now - self._updated) * self._rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+
+
+class Checkpoint:
+    """Append-only log of dial attempts, replayed on restart.
+
+    A lead is done once it was dialed. A failed dial (API error, 5xx) is tried
+    again on the next run, until the lead has failed `max_failures` times.
+    """
+
+    def __init__(self, path: str, max_failures: int = 3) -> None:
+        self._path = path
+        self._max_failures = max_failures
+        self.done: set[str] = set()
+        self.failures: dict[str, int] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self._count(entry["lead_id"], entry.get("status"))
+                    except (ValueError, KeyError):
+                        # a torn last line from a crash; the lead is simply retried
+                        continue
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _count(self, lead_id: str, status: Optional[str]) -> None:
+        if status == "failed":
+            self.failures[lead_id] = self.failures.get(lead_id, 0) + 1
+            if self.failures[lead_id] < self._max_failures:
+                return
+        self.done.add(lead_id)
+
+    def record(self, lead: Lead, status: str, **extra) -> None:
+        self._count(lead.lead_id, status)
+        entry = {"lead_id": lead.lead_id, "status": status, "at": time.time(), **extra}
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+_CALLBACK, _FRESH, _STOP = 0, 1, 2
+
+
+class CampaignDialer:
+    def __init__(
+        self,
+        lkapi: SharedLiveKitAPI,
+        caller_ids: CallerIdPool,
+        checkpoint: Checkpoint,
+        concurrency: int = 20,
+        calls_per_second: float = 2.0,
+        max_live_calls_per_trunk: int = 10,
+        poll_interval: float = 5.0,
+        report_interval: float = 60.0,
+        callbacks: Optional[CallbackScheduler] = None,
+        serve_callbacks: bool = False,
+        callback_retry_delay: float = 900.0,
+        callback_max_attempts: int = 3,
+    ) -> None:
+        self._lkapi = lkapi
+        self._rooms = RoomAllocator(lkapi)
+        self._caller_ids = caller_ids
+        self._max_live_calls_per_trunk = max_live_calls_per_trunk
+        self._live = {route.trunk_id: 0 for route in caller_ids.routes}
+        self._slot_freed = asyncio.Condition()
+        self._exhausted = False
+        self._report_interval = report_interval
+        self._checkpoint = checkpoint
+        self._concurrency = concurrency
+        self._limiter = RateLimiter(calls_per_second)
+        self._poll_interval = poll_interval
+        self._callbacks = callbacks
+        self._serve_callbacks = serve_callbacks
+        self._callback_retry_delay = callback_retry_delay
+        self._callback_max_attempts = callback_max_attempts
+        self._seq = 0
+        self.stats = {"dialed": 0, "failed": 0, "skipped": 0, "callbacks": 0}
+
+    async def run(self, leads: Iterator[Lead]) -> dict:
+        # (priority, seq, lead, callback): due callbacks overtake queued fresh leads
+        queue: asyncio.PriorityQueue = asyncio.PriorityQueue(maxsize=self._concurrency * 2)
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(self._concurrency)]
+        reporter = asyncio.create_task(self._report())
+
+        async for lead in self._pending(leads):
+            if self._exhausted:
+                break
+            await self._put_due_callbacks(queue)
+            await self._put(queue, _FRESH, lead)
+        await self._put_due_callbacks(queue)
+        while self._serve_callbacks and not self._exhausted:
+            await asyncio.sleep(self._poll_interval)
+            await self._put_due_callbacks(queue)
+        for _ in workers:
+            await self._put(queue, _STOP, None)
+
+        await asyncio.gather(*workers)
+        reporter.cancel()
+        self.stats["caller_ids"] = self._caller_ids.utilization()
+        return self.stats
+
+    async def _report(self) -> None:
+        while True:
+            await asyncio.sleep(self._report_interval)
+            logger.info("caller ID utilization: %s", json.dumps(self._caller_ids.utilization()))
+
+    async def _put(self, queue: asyncio.PriorityQueue, priority: int, lead: Optional[Lead], callback=None) -> None:
+        self._seq += 1
+        await queue.put((priority, self._seq, lead, callback))
+
+    async def _put_due_callbacks(self, queue: asyncio.PriorityQueue) -> None:
+        if self._callbacks is None:
+            return
+        # only the lines appended since the last read, however long the log is
+        self._callbacks.sync()
+        while not self._exhausted and (callback := self._callbacks.pop_due()) is not None:
+            lead = Lead(
+                lead_id=callback.lead_id,
+                phone=callback.phone,
+                fields={**callback.fields, "callback_for": callback.said},
+            )
+            await self._put(queue, _CALLBACK, lead, callback)
+
+    async def _pending(self, leads: Iterator[Lead]) -> AsyncIterator[Lead]:
+        for lead in leads:
+            if lead.lead_id in self._checkpoint.done:
+                self.stats["skipped"] += 1
+                continue
+            yield lead
+
+    async def _take_trunk_slot(self) -> Optional[str]:
+        """Wait for a live-call slot on a trunk whose caller IDs have calls left today"""
+        async with self._slot_freed:
+            while True:
+                usable = self._caller_ids.trunks_with_capacity()
+                if not usable:
+                    return None
+                free = [t for t in usable if self._live.get(t, 0) < self._max_live_calls_per_trunk]
+                if free:
+                    trunk_id = min(free, key=lambda t: self._live.get(t, 0))
+                    self._live[trunk_id] = self._live.get(trunk_id, 0) + 1
+                    return trunk_id
+                await self._slot_freed.wait()
+
+    async def _release_trunk_slot(self, trunk_id: str) -> None:
+        async with self._slot_freed:
+            self._live[trunk_id] -= 1
+            self._slot_freed.notify_all()
+
+    async def _worker(self, queue: asyncio.PriorityQueue) -> None:
+        while True:
+            priority, _, lead, callback = await queue.get()
+            if lead is None:
+                return
+            if self._exhausted:
+                # left unrecorded, so the next run dials it
+                continue
+            # the trunk slot comes first, so daily caller-ID caps are only spent on calls
+            # that can go out now; it is held for the whole live call, not just the dial request
+            trunk_id = await self._take_trunk_slot()
+            if trunk_id is None:
+                if not self._exhausted:
+                    logger.error("stopping campaign: every caller ID reached its daily cap")
+                    self._exhausted = True
+                continue
+            try:
+                try:
+                    route = await self._caller_ids.acquire(lead.phone, trunk_id)
+                except CallerIdExhausted as e:
+                    if not self._caller_ids.trunks_with_capacity():
+                        logger.error("stopping campaign: %s", e)
+                        self._exhausted = True
+                    else:
+                        # this trunk's numbers ran out while waiting; another trunk can take it.
+                        # Never block on a full queue here, a lead that doesn't fit is dialed next run
+                        self._seq += 1
+                        with contextlib.suppress(asyncio.QueueFull):
+                            queue.put_nowait((priority, self._seq, lead, callback))
+                    continue
+                await self._limiter.acquire()
+                await self._dial(lead, route, callback)
+            finally:
+                await self._release_trunk_slot(trunk_id)
+
+    async def _dial(self, lead: Lead, route: TrunkRoute, callback: Optional[Callback] = None) -> None:
+        try:
+            # a fresh room per attempt, so a redial of the same lead never joins a stale room
+            room_name = await self._rooms.allocate(lead.lead_id, lead.fields)
+            request = build_call_request(
+                route.trunk_id,
+                lead.phone,
+                route.number,
+                room_name=room_name,
+                participant_identity=f"lead-{lead.lead_id}",
+                metadata={"lead_id": lead.lead_id, **lead.fields},
+            )
+            participant = await self._lkapi.sip.create_sip_participant(request)
+        except Exception as e:
+            logger.error("call to lead %s failed: %s", lead.lead_id, e)
+            self.stats["failed"] += 1
+            self._checkpoint.record(lead, "failed", error=str(e))
+            if callback is not None:
+                self._retry_callback(callback)
+            return
+
+        self.stats["dialed"] += 1
+        if callback is not None:
+            self.stats["callbacks"] += 1
+            self._callbacks.complete(callback, "dialed")
+        self._checkpoint.record(
+            lead,
+            "dialed",
+            room=participant.room_name,
+            sip_call_id=participant.sip_call_id,
+            from_number=route.number,
+        )
+        logger.info("dialed lead %s into room %s", lead.lead_id, participant.room_name)
+        await self._wait_for_hangup(participant.room_name, participant.participant_identity)
+
+    def _retry_callback(self, callback: Callback) -> None:
+        attempts = callback.attempts + 1
+        if attempts >= self._callback_max_attempts:
+            logger.warning(f"giving up on the callback to lead {callback.lead_id} after {attempts} attempts")
+            self._callbacks.complete(callback, "failed")
+            return
+        self._callbacks.reschedule(replace(callback, attempts=attempts), time.time() + self._callback_retry_delay)
+
+    async def collect_garbage(self) -> None:
+        """Clear rooms orphaned by a previous run before dialing into fresh ones"""
+        try:
+            await self._rooms.collect_garbage()
+        except Exception as e:
+            logger.warning(f"room cleanup failed: {e}")
+
+    async def _wait_for_hangup(self, room_name: str, identity: str) -> None:
+        """Block until the SIP participant has left the room"""
+        while True:
+            await asyncio.sleep(self._poll_interval)
+            try:
+                res = await self._lkapi.room.list_participants(
+                    api.ListParticipantsRequest(room=room_name)
+                )
+            except Exception:
+                # the room is gone, so the call is over
+                return
+            if not any(p.identity == identity for p in res.participants):
+                return
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Dial a lead file as an outbound campaign")
+    parser.add_argument("leads", help="CSV or JSONL lead file (needs a 'phone' column)")
+    parser.add_argument("--checkpoint", help="progress file (default: <leads>.checkpoint.jsonl)")
+    parser.add_argument(
+        "--max-failures", type=int, default=3, help="failed dials after which a lead is not retried on restart"
+    )
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--cps", type=float, default=2.0, help="calls started per second")
+    parser.add_argument("--max-live-per-trunk", type=int, default=10)
+    parser.add_argument(
+        "--from-number",
+        action="append",
+        help="caller ID to dial from, optionally NUMBER:WEIGHT (repeatable, default: SIP_FROM_NUMBERS)",
+    )
+    parser.add_argument("--calls-per-number-per-minute", type=float, default=6)
+    parser.add_argument("--daily-cap-per-number", type=float, default=300)
+    parser.add_argument("--no-local-presence", action="store_true", help="ignore the lead's area code")
+    parser.add_argument("--callbacks", help="callback log the agents write (default: CALLBACK_LOG or callbacks.jsonl)")
+    parser.add_argument("--no-callbacks", action="store_true", help="only dial the lead file")
+    parser.add_argument(
+        "--serve-callbacks",
+        action="store_true",
+        help="keep running after the lead file is done, dialing callbacks as they come due",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    lkapi = get_api()
+    numbers = args.from_number or parse_list(os.getenv("SIP_FROM_NUMBERS")) or [DEFAULT_FROM_NUMBER]
+    caller_ids = await load_pool(
+        lkapi,
+        numbers,
+        calls_per_minute=args.calls_per_number_per_minute,
+        daily_cap=args.daily_cap_per_number,
+        local_presence=not args.no_local_presence,
+    )
+    if not caller_ids.routes:
+        print("Error: no outbound trunk found. Please run setup_trunk.py first.")
+        await close_api()
+        return
+
+    checkpoint = Checkpoint(args.checkpoint or f"{args.leads}.checkpoint.jsonl", args.max_failures)
+
+    dialer = CampaignDialer(
+        lkapi,
+        caller_ids,
+        checkpoint,
+        concurrency=args.concurrency,
+        calls_per_second=args.cps,
+        max_live_calls_per_trunk=args.max_live_per_trunk,
+        callbacks=None if args.no_callbacks else CallbackScheduler(args.callbacks),
+        serve_callbacks=args.serve_callbacks,
+    )
+
+    try:
+        await dialer.collect_garbage()
+        print(f"📞 Starting campaign from {args.leads} ({len(checkpoint.done)} leads already done)")
+        stats = await dialer.run(read_leads(args.leads))
+        print(f"✅ Campaign finished: {stats}")
+    finally:
+        checkpoint.close()
+        await close_api()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -8,99 +8,73 @@ import asyncio
 import os
 import sys
 from dotenv import load_dotenv
-from livekit import api
-from livekit.protocol.sip import (
-    CreateSIPOutboundTrunkRequest, 
-    SIPOutboundTrunkInfo,
-    CreateSIPParticipantRequest,
-    ListSIPOutboundTrunkRequest
-)
+from livekit.protocol.sip import CreateSIPParticipantRequest
+
+from caller_id_pool import CallerIdExhausted, CallerIdPool, parse_weighted
+from livekit_client import close_api, get_api
+from room_allocator import RoomAllocator
+from trunk_registry import TrunkRegistry, parse_list, update_env_file
 
 load_dotenv()
 
 class SIPCallManager:
     def __init__(self):
-        self.lkapi = api.LiveKitAPI(
-            url=os.getenv("LIVEKIT_URL"),
-            api_key=os.getenv("LIVEKIT_API_KEY"),
-            api_secret=os.getenv("LIVEKIT_API_SECRET")
-        )
-        self.from_number = "+13082514678"
+        self.lkapi = get_api()
+        self.trunks = TrunkRegistry(self.lkapi)
+        # Caller IDs to rotate through, NUMBER[:WEIGHT]
+        self.from_numbers = parse_weighted(parse_list(os.getenv("SIP_FROM_NUMBERS")) or ["+13082514678"])
+        self.caller_ids = None
         self.to_number = "+923024491162"
     
-    async def list_existing_trunks(self):
-        """List all existing outbound trunks"""
-        try:
-            trunks = await self.lkapi.sip.list_sip_outbound_trunk(
-                ListSIPOutboundTrunkRequest()
-            )
-            print(f"Found {len(trunks.items)} existing trunk(s):")
-            for trunk in trunks.items:
-                print(f"  - ID: {trunk.sip_trunk_id}")
-                print(f"    Name: {trunk.name}")
-                print(f"    Address: {trunk.address}")
-                print(f"    Numbers: {trunk.numbers}")
-                print()
-            return trunks.items
-        except Exception as e:
-            print(f"Error listing trunks: {e}")
-            return []
-    
     async def create_outbound_trunk(self):
         """Create or use existing outbound trunk"""
-        
-        # Check for existing trunks first
-        existing_trunks = await self.list_existing_trunks()
-        
-        # Use existing trunk if available
-        if existing_trunks:
-            trunk_id = existing_trunks[0].sip_trunk_id
-            print(f"Using existing trunk: {trunk_id}")
-            return trunk_id
-        
-        # Create new trunk
-        print("Creating new outbound trunk...")
-        trunk = SIPOutboundTrunkInfo(
-            name="Real Estate Outbound Trunk",
-            address=os.getenv("SIP_PROVIDER_ADDRESS", "sip.telnyx.com"),
-            numbers=[self.from_number],
-            auth_username=os.getenv("SIP_USERNAME", "your_username"),
-            auth_password=os.getenv("SIP_PASSWORD", "your_password")
-        )
-
-        request = CreateSIPOutboundTrunkRequest(trunk=trunk)
 
+        # Reuses whichever trunk already carries our number; only creates one when none does
         try:
-            created_trunk = await self.lkapi.sip.create_sip_outbound_trunk(request)
-            trunk_id = created_trunk.sip_trunk_id
-            
-            print(f"✅ Successfully created trunk: {trunk_id}")
-            print(f"   Name: {created_trunk.name}")
-            print(f"   Address: {created_trunk.address}")
-            print(f"   Numbers: {created_trunk.numbers}")
-            
+            routes = await self.trunks.ensure_trunk(
+                list(self.from_numbers),
+                name="Real Estate Outbound Trunk",
+                address=os.getenv("SIP_PROVIDER_ADDRESS", "sip.telnyx.com"),
+                auth_username=os.getenv("SIP_USERNAME", "your_username"),
+                auth_password=os.getenv("SIP_PASSWORD", "your_password")
+            )
+            for route in routes:
+                print(f"✅ Using trunk {route.trunk_id} for {route.number}")
+            self.caller_ids = CallerIdPool(routes, weights=self.from_numbers)
+            trunk_id = ",".join(dict.fromkeys(route.trunk_id for route in routes))
+
             # Update .env file with trunk ID
             self.update_env_file("SIP_OUTBOUND_TRUNK_ID", trunk_id)
-            
+
             return trunk_id
-            
+
         except Exception as e:
             print(f"❌ Error creating trunk: {e}")
             return None
     
-    async def make_call(self, trunk_id):
+    async def make_call(self):
         """Make the outbound call"""
+
+        # pick a caller ID, preferring one in the callee's area code
+        try:
+            route = await self.caller_ids.acquire(self.to_number)
+        except CallerIdExhausted as e:
+            print(f"❌ {e}")
+            return None
+        print(f"\n📞 Initiating call from {route.number} to {self.to_number}...")
         
-        print(f"\n📞 Initiating call from {self.from_number} to {self.to_number}...")
-        
-        # Generate a unique room name for this call
-        import time
-        room_name = f"call-{int(time.time())}"
-        
+        # Create a fresh room for this call; a per-second timestamp collides between concurrent calls
+        try:
+            room_name = await RoomAllocator(self.lkapi).allocate()
+            print(f"✅ Room created: {room_name}")
+        except Exception as e:
+            print(f"❌ Error creating room: {e}")
+            return None
+
         request = CreateSIPParticipantRequest(
-            sip_trunk_id=trunk_id,
+            sip_trunk_id=route.trunk_id,
             sip_call_to=self.to_number,
-            sip_number=self.from_number,
+            sip_number=route.number,
             room_name=room_name,
             participant_identity="sip-caller",
             participant_name="SIP Caller",
@@ -109,16 +83,6 @@ class SIPCallManager:
             play_ringtone=True,
             hide_phone_number=False
         )
-        
-        # Create room first to ensure it exists
-        from livekit.api import CreateRoomRequest
-        room_request = CreateRoomRequest(name=room_name)
-        
-        try:
-            await self.livekit_api.room.create_room(room_request)
-            print(f"✅ Room created: {room_name}")
-        except Exception as e:
-            print(f"⚠️  Room creation note: {e} (may already exist)")
 
         try:
             participant = await self.lkapi.sip.create_sip_participant(request)
@@ -138,28 +102,7 @@ class SIPCallManager:
     
     def update_env_file(self, key, value):
         """Update .env file with new key-value pair"""
-        env_file = ".env"
-        
-        # Read existing content
-        with open(env_file, 'r') as f:
-            lines = f.readlines()
-        
-        # Check if key already exists
-        key_exists = False
-        for i, line in enumerate(lines):
-            if line.startswith(f"{key}="):
-                lines[i] = f"{key}={value}\n"
-                key_exists = True
-                break
-        
-        # Add new key if it doesn't exist
-        if not key_exists:
-            lines.append(f"{key}={value}\n")
-        
-        # Write back to file
-        with open(env_file, 'w') as f:
-            f.writelines(lines)
-        
+        update_env_file(key, value)
         print(f"📝 Updated .env file: {key}={value}")
     
     async def run_complete_setup(self):
@@ -174,7 +117,7 @@ class SIPCallManager:
             return False
         
         # Step 2: Make the call
-        participant = await self.make_call(trunk_id)
+        participant = await self.make_call()
         if not participant:
             print("❌ Failed to initiate call. Exiting.")
             return False
@@ -190,7 +133,7 @@ class SIPCallManager:
     
     async def close(self):
         """Close the API connection"""
-        await self.lkapi.aclose()
+        await close_api()
 
 async def main():
     """Main function"""
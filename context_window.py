@@ -0,0 +1,117 @@
+"""
+Token-budgeted chat context for long calls.
+
+`ContextWindow.apply()` runs in `before_llm_cb` and rewrites the copy of the
+chat context that is about to be sent: the system prompt, a running summary of
+older turns, a compact line of known facts and then as many recent turns as fit
+the budget. Turns that fall out of the window are summarized in a background
+LLM call, so the reply never waits on summarization; until a summary lands the
+evicted turns are simply still sent raw.
+"""
+
+import asyncio
+import logging
+from typing import Optional
+
+from livekit.agents import llm
+
+logger = logging.getLogger("context-window")
+
+SUMMARY_INSTRUCTIONS = (
+    "Summarize this phone conversation between a real estate calling assistant and a "
+    "homeowner in at most 3 short sentences. Keep every concrete answer the homeowner "
+    "gave (ownership, reason for selling, timeline, price, callback time). "
+    "Start from the previous summary if there is one."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting English speech
+    return len(text) // 4 + 4
+
+
+def _text(msg: llm.ChatMessage) -> str:
+    content = msg.content
+    if isinstance(content, list):
+        content = " ".join(c for c in content if isinstance(c, str))
+    return content or ""
+
+
+class ContextWindow:
+    def __init__(self, summary_llm: llm.LLM, max_tokens: int = 1200, keep_recent: int = 6) -> None:
+        self._llm = summary_llm
+        self._max_tokens = max_tokens
+        self._keep_recent = keep_recent
+        self._summary = ""
+        # number of conversation messages (after the system prompt) the summary covers
+        self._summarized = 0
+        self._summary_task: Optional[asyncio.Task] = None
+        self.facts: dict[str, str] = {}
+
+    def set_fact(self, key: str, value: str) -> None:
+        """Record a structured answer; it is sent as one compact line every turn"""
+        self.facts[key] = value
+
+    def apply(self, chat_ctx: llm.ChatContext) -> None:
+        messages = chat_ctx.messages
+        n_system = 0
+        while n_system < len(messages) and messages[n_system].role == "system":
+            n_system += 1
+        system, turns = messages[:n_system], messages[n_system:]
+
+        recent = turns[self._summarized:]
+        budget = self._max_tokens
+        kept = 0
+        for msg in reversed(recent):
+            budget -= estimate_tokens(_text(msg))
+            if budget < 0 and kept >= self._keep_recent:
+                break
+            kept += 1
+
+        overflow = len(recent) - kept
+        if overflow > 0:
+            self._schedule_summary(turns, self._summarized + overflow)
+
+        header = []
+        if self._summary:
+            header.append(llm.ChatMessage.create(role="system", text=f"Conversation so far: {self._summary}"))
+        if self.facts:
+            facts = "; ".join(f"{k}={v}" for k, v in self.facts.items())
+            header.append(llm.ChatMessage.create(role="system", text=f"Known answers: {facts}"))
+
+        chat_ctx.messages = system + header + recent
+
+    def _schedule_summary(self, turns: list[llm.ChatMessage], upto: int) -> None:
+        if self._summary_task is not None and not self._summary_task.done():
+            return
+        # cut on a user message so tool calls and their results stay together
+        upto = min(upto, len(turns) - 1)
+        while upto > self._summarized and turns[upto].role != "user":
+            upto -= 1
+        if upto <= self._summarized:
+            return
+        self._summary_task = asyncio.create_task(self._summarize(turns[self._summarized:upto], upto))
+
+    async def _summarize(self, evicted: list[llm.ChatMessage], upto: int) -> None:
+        transcript = "\n".join(
+            f"{m.role}: {_text(m)}" for m in evicted if m.role in ("user", "assistant") and _text(m)
+        )
+        prompt = f"Previous summary: {self._summary or '(none)'}\n\nNew turns:\n{transcript}"
+        ctx = llm.ChatContext().append(role="system", text=SUMMARY_INSTRUCTIONS).append(role="user", text=prompt)
+
+        try:
+            stream = self._llm.chat(chat_ctx=ctx)
+            parts = []
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        parts.append(chunk.choices[0].delta.content)
+            finally:
+                await stream.aclose()
+        except Exception as e:
+            logger.warning(f"failed to summarize older turns, sending them raw: {e}")
+            return
+
+        self._summary = "".join(parts).strip()
+        self._summarized = upto
+        logger.info(f"summarized {len(evicted)} older messages ({len(self._summary)} chars)")
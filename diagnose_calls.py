@@ -1,61 +1,158 @@
 #!/usr/bin/env python3
 """
 Diagnostic script to check what's happening with calls
+
+Participant details for every call room are fetched concurrently (bounded by
+--concurrency), so a snapshot of a few hundred rooms takes about as long as one
+room does. Use --json for a machine-readable snapshot during an incident.
 """
 
+import argparse
 import asyncio
-import os
+import json
+import sys
+import time
 from dotenv import load_dotenv
 from livekit import api
+from livekit.protocol.models import ParticipantInfo, TrackType
+
+from livekit_client import close_api, get_api
+from room_allocator import CALL_ROOM_PREFIXES
 
 load_dotenv()
 
-async def diagnose_system():
+
+def _participant_snapshot(p, now: float) -> dict:
+    tracks = [TrackType.Name(t.type).lower() for t in p.tracks]
+    return {
+        "identity": p.identity,
+        "kind": ParticipantInfo.Kind.Name(p.kind).lower(),
+        "state": ParticipantInfo.State.Name(p.state).lower(),
+        "age_s": round(now - p.joined_at, 1) if p.joined_at else None,
+        "sip_call_status": p.attributes.get("sip.callStatus"),
+        "tracks": {kind: tracks.count(kind) for kind in set(tracks)},
+        "muted_tracks": sum(1 for t in p.tracks if t.muted),
+    }
+
+
+def _call_state(participants: list[dict]) -> str:
+    sip = [p for p in participants if p["kind"] == "sip"]
+    if not sip:
+        return "no-caller"
+    status = sip[0]["sip_call_status"]
+    if status:
+        return status
+    return "active" if sip[0]["tracks"].get("audio") else "connecting"
+
+
+async def snapshot_rooms(
+    lkapi,
+    prefixes=CALL_ROOM_PREFIXES,
+    room_names=None,
+    concurrency: int = 50,
+) -> dict:
+    """Fetch every call room and its participants; returns a JSON-serializable dict"""
+    # exact names are filtered by the server, prefixes have to be matched here
+    rooms = await lkapi.room.list_rooms(api.ListRoomsRequest(names=room_names or []))
+    call_rooms = [r for r in rooms.rooms if room_names or r.name.startswith(tuple(prefixes))]
+
+    semaphore = asyncio.Semaphore(concurrency)
+    now = time.time()
+
+    async def describe(room) -> dict:
+        entry = {
+            "name": room.name,
+            "sid": room.sid,
+            "age_s": round(now - room.creation_time, 1),
+            "num_participants": room.num_participants,
+            "empty_timeout": room.empty_timeout,
+            "metadata": room.metadata,
+        }
+        try:
+            async with semaphore:
+                res = await lkapi.room.list_participants(api.ListParticipantsRequest(room=room.name))
+        except Exception as e:
+            # the room may have closed between the two calls
+            entry.update(call_state="unknown", error=str(e), participants=[])
+            return entry
+        participants = [_participant_snapshot(p, now) for p in res.participants]
+        entry.update(
+            call_state=_call_state(participants),
+            agent_present=any(p["kind"] == "agent" for p in participants),
+            participants=participants,
+        )
+        return entry
+
+    described = await asyncio.gather(*(describe(r) for r in call_rooms))
+    states: dict[str, int] = {}
+    for room in described:
+        states[room["call_state"]] = states.get(room["call_state"], 0) + 1
+
+    return {
+        "taken_at": now,
+        "elapsed_ms": round((time.time() - now) * 1000),
+        "total_rooms": len(rooms.rooms),
+        "call_rooms": len(described),
+        "call_states": states,
+        "rooms": sorted(described, key=lambda r: r["age_s"], reverse=True),
+    }
+
+
+def print_snapshot(snapshot: dict) -> None:
+    for room in snapshot["rooms"]:
+        print(f"   🏠 Room: {room['name']} [{room['call_state']}]")
+        print(f"      Participants: {room['num_participants']}")
+        print(f"      Age: {room['age_s']}s")
+        print(f"      Empty Timeout: {room['empty_timeout']}")
+        print(f"      Participant Details:")
+        for p in room["participants"]:
+            print(f"        - {p['identity']} ({p['state']}) - {p['kind']}")
+            print(f"          Joined: {p['age_s']}s ago")
+            print(f"          Tracks: {p['tracks']}")
+    print(f"\n📊 {snapshot['call_rooms']} call room(s): {snapshot['call_states']}")
+    print(f"⏱️  Snapshot took {snapshot['elapsed_ms']} ms")
+
+
+async def diagnose_system(args=None):
     """Diagnose the calling system"""
-    
-    lkapi = api.LiveKitAPI(
-        url=os.getenv("LIVEKIT_URL"),
-        api_key=os.getenv("LIVEKIT_API_KEY"),
-        api_secret=os.getenv("LIVEKIT_API_SECRET")
-    )
+
+    args = args or argparse.Namespace(prefix=None, room=None, concurrency=50, json=False)
+    lkapi = get_api()
 
     try:
-        print("🔍 System Diagnosis")
-        print("=" * 50)
-        
-        # Check rooms
-        print("📋 Checking Rooms...")
-        rooms = await lkapi.room.list_rooms(api.ListRoomsRequest())
-        
-        for room in rooms.rooms:
-            if "real-estate" in room.name or "outbound-call" in room.name:
-                print(f"   🏠 Room: {room.name}")
-                print(f"      Participants: {room.num_participants}")
-                print(f"      Created: {room.creation_time}")
-                print(f"      Empty Timeout: {room.empty_timeout}")
-                
-                # Get room details
-                participants = await lkapi.room.list_participants(
-                    api.ListParticipantsRequest(room=room.name)
-                )
-                
-                print(f"      Participant Details:")
-                for p in participants.participants:
-                    print(f"        - {p.identity} ({p.state}) - {p.kind}")
-                    print(f"          Joined: {p.joined_at}")
-                    print(f"          Tracks: {len(p.tracks)}")
-        
-        # Check workers
-        print(f"\n🤖 Checking Workers...")
-        # Note: Worker listing might not be available in all LiveKit versions
-        
-        print("\n" + "=" * 50)
-        print("✅ Diagnosis complete")
-        
+        if not args.json:
+            print("🔍 System Diagnosis")
+            print("=" * 50)
+            print("📋 Checking Rooms...")
+
+        snapshot = await snapshot_rooms(
+            lkapi,
+            prefixes=args.prefix or CALL_ROOM_PREFIXES,
+            room_names=args.room,
+            concurrency=args.concurrency,
+        )
+
+        if args.json:
+            json.dump(snapshot, sys.stdout, indent=2)
+            print()
+        else:
+            print_snapshot(snapshot)
+            print("\n" + "=" * 50)
+            print("✅ Diagnosis complete")
+
     except Exception as e:
-        print(f"❌ Error during diagnosis: {e}")
+        print(f"❌ Error during diagnosis: {e}", file=sys.stderr if args.json else sys.stdout)
     finally:
-        await lkapi.aclose()
+        await close_api()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Snapshot the state of every call room")
+    parser.add_argument("--prefix", action="append", help="room name prefix (repeatable)")
+    parser.add_argument("--room", action="append", help="exact room name, filtered server side (repeatable)")
+    parser.add_argument("--concurrency", type=int, default=50, help="parallel participant lookups")
+    parser.add_argument("--json", action="store_true", help="print one JSON snapshot")
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    asyncio.run(diagnose_system())
+    asyncio.run(diagnose_system(parse_args()))
@@ -0,0 +1,230 @@
+"""
+Local stand-ins for the Deepgram STT, OpenAI LLM and OpenAI TTS plugins.
+
+Used by load_test.py to drive the real agent entrypoints without any provider
+traffic. Each fake has a configurable latency distribution:
+  - FakeSTT watches the caller's audio energy and, a sampled delay after the
+    caller goes quiet, emits the next scripted transcript
+  - FakeLLM streams a canned reply token by token
+  - FakeTTS emits synthetic audio frames sized like real speech
+"""
+
+import asyncio
+import random
+import re
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from livekit import rtc
+from livekit.agents import DEFAULT_API_CONNECT_OPTIONS, APIConnectOptions, llm, stt, tts
+
+
+@dataclass
+class LatencyDist:
+    """A latency distribution parsed from `const:MS`, `uniform:LO:HI` or
+    `lognormal:MEDIAN_MS:SIGMA`"""
+
+    kind: str
+    a: float
+    b: float = 0.0
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyDist":
+        kind, *params = spec.split(":")
+        if kind not in ("const", "uniform", "lognormal"):
+            raise ValueError(f"unknown latency distribution: {spec}")
+        values = [float(p) for p in params] + [0.0]
+        return cls(kind, values[0], values[1])
+
+    def sample(self) -> float:
+        """Seconds"""
+        if self.kind == "const":
+            ms = self.a
+        elif self.kind == "uniform":
+            ms = random.uniform(self.a, self.b)
+        else:
+            ms = random.lognormvariate(np.log(self.a), self.b)
+        return max(ms, 0.0) / 1000
+
+
+DEFAULT_TRANSCRIPTS = [
+    "Hello?",
+    "Yes, I still own it.",
+    "Maybe, depends on the price.",
+    "We're moving closer to family.",
+    "Probably in the next couple of months.",
+    "Around four hundred thousand.",
+    "Sure, if the terms make sense.",
+    "Tomorrow afternoon works.",
+    "No, that's all.",
+]
+
+DEFAULT_REPLIES = [
+    "Got it, with the home prices being so high right now would you consider selling at this time?",
+    "Great — just a couple quick questions so we can match you with the right buyer.",
+    "And just so I understand — what's really prompting you to explore selling right now?",
+    "When are you ideally hoping to have it sold?",
+    "Do you have a ballpark price in mind that you'd feel good about selling at?",
+    "Would you be open to listing the property anytime soon if the price and terms made sense?",
+    "What's the best time today or tomorrow for him to give you a call?",
+    "Is there anything else you'd like to add before I let you go?",
+    "Thanks again for your time. Take care!",
+]
+
+
+class FakeSTT(stt.STT):
+    def __init__(
+        self,
+        latency: LatencyDist,
+        transcripts: Optional[list[str]] = None,
+        energy_threshold: float = 500.0,
+        end_silence: float = 0.3,
+    ) -> None:
+        super().__init__(capabilities=stt.STTCapabilities(streaming=True, interim_results=True))
+        self._latency = latency
+        self._transcripts = transcripts or DEFAULT_TRANSCRIPTS
+        self._energy_threshold = energy_threshold
+        self._end_silence = end_silence
+        self._turn = 0
+
+    def next_transcript(self) -> str:
+        text = self._transcripts[min(self._turn, len(self._transcripts) - 1)]
+        self._turn += 1
+        return text
+
+    def peek_transcript(self) -> str:
+        return self._transcripts[min(self._turn, len(self._transcripts) - 1)]
+
+    async def _recognize_impl(self, buffer, *, language=None, conn_options=DEFAULT_API_CONNECT_OPTIONS):
+        await asyncio.sleep(self._latency.sample())
+        return _speech_event(stt.SpeechEventType.FINAL_TRANSCRIPT, self.next_transcript())
+
+    def stream(self, *, language=None, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS):
+        return FakeSpeechStream(stt=self, conn_options=conn_options)
+
+
+def _speech_event(type: stt.SpeechEventType, text: str = "") -> stt.SpeechEvent:
+    alternatives = [stt.SpeechData(language="en", text=text)] if text else []
+    return stt.SpeechEvent(type=type, alternatives=alternatives)
+
+
+class FakeSpeechStream(stt.SpeechStream):
+    async def _run(self) -> None:
+        fake: FakeSTT = self._stt
+        speaking = False
+        voiced = silence = 0.0
+        next_interim = 0.5
+
+        async for data in self._input_ch:
+            if not isinstance(data, rtc.AudioFrame):
+                continue
+
+            duration = data.samples_per_channel / data.sample_rate
+            samples = np.frombuffer(data.data, dtype=np.int16)
+            loud = samples.size and np.sqrt(np.mean(samples.astype(np.float32) ** 2)) > fake._energy_threshold
+
+            if loud:
+                if not speaking:
+                    speaking, voiced, next_interim = True, 0.0, 0.5
+                    self._event_ch.send_nowait(_speech_event(stt.SpeechEventType.START_OF_SPEECH))
+                silence = 0.0
+                voiced += duration
+                if voiced >= next_interim:
+                    next_interim += 0.5
+                    words = fake.peek_transcript().split()
+                    partial = " ".join(words[: max(1, int(len(words) * voiced / 2))])
+                    self._event_ch.send_nowait(
+                        _speech_event(stt.SpeechEventType.INTERIM_TRANSCRIPT, partial)
+                    )
+            elif speaking:
+                silence += duration
+                if silence >= fake._end_silence:
+                    speaking = False
+                    self._event_ch.send_nowait(_speech_event(stt.SpeechEventType.END_OF_SPEECH))
+                    asyncio.create_task(self._emit_final(fake.next_transcript()))
+
+    async def _emit_final(self, text: str) -> None:
+        await asyncio.sleep(self._stt._latency.sample())
+        self._event_ch.send_nowait(_speech_event(stt.SpeechEventType.FINAL_TRANSCRIPT, text))
+
+
+class FakeLLM(llm.LLM):
+    def __init__(
+        self,
+        ttft: LatencyDist,
+        token_interval: LatencyDist,
+        replies: Optional[list[str]] = None,
+    ) -> None:
+        super().__init__()
+        self._ttft = ttft
+        self._token_interval = token_interval
+        self._replies = replies or DEFAULT_REPLIES
+        self._turn = 0
+
+    def chat(
+        self,
+        *,
+        chat_ctx: llm.ChatContext,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+        fnc_ctx: Optional[llm.FunctionContext] = None,
+        **kwargs,
+    ) -> "FakeLLMStream":
+        reply = self._replies[min(self._turn, len(self._replies) - 1)]
+        self._turn += 1
+        return FakeLLMStream(
+            self, chat_ctx=chat_ctx, fnc_ctx=fnc_ctx, conn_options=conn_options, reply=reply
+        )
+
+
+class FakeLLMStream(llm.LLMStream):
+    def __init__(self, fake_llm: FakeLLM, *, chat_ctx, fnc_ctx, conn_options, reply: str) -> None:
+        super().__init__(fake_llm, chat_ctx=chat_ctx, fnc_ctx=fnc_ctx, conn_options=conn_options)
+        self._reply = reply
+
+    async def _run(self) -> None:
+        fake: FakeLLM = self._llm
+        request_id = uuid.uuid4().hex
+        await asyncio.sleep(fake._ttft.sample())
+        for token in re.findall(r"\S+\s*", self._reply):
+            self._event_ch.send_nowait(
+                llm.ChatChunk(
+                    request_id=request_id,
+                    choices=[llm.Choice(delta=llm.ChoiceDelta(role="assistant", content=token))],
+                )
+            )
+            await asyncio.sleep(fake._token_interval.sample())
+
+
+class FakeTTS(tts.TTS):
+    def __init__(self, ttfb: LatencyDist, sample_rate: int = 24000, seconds_per_word: float = 0.35) -> None:
+        super().__init__(
+            capabilities=tts.TTSCapabilities(streaming=False), sample_rate=sample_rate, num_channels=1
+        )
+        self._ttfb = ttfb
+        self._seconds_per_word = seconds_per_word
+        # one 20 ms frame of a quiet 220 Hz tone, reused for every frame
+        n = sample_rate // 50
+        tone = (np.sin(2 * np.pi * 220 * np.arange(n) / sample_rate) * 3000).astype(np.int16)
+        self._frame_bytes = tone.tobytes()
+
+    def synthesize(self, text: str, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS):
+        return FakeChunkedStream(tts=self, input_text=text, conn_options=conn_options)
+
+
+class FakeChunkedStream(tts.ChunkedStream):
+    async def _run(self) -> None:
+        fake: FakeTTS = self._tts
+        request_id = uuid.uuid4().hex
+        await asyncio.sleep(fake._ttfb.sample())
+        n_frames = max(1, int(len(self._input_text.split()) * fake._seconds_per_word * 50))
+        for _ in range(n_frames):
+            frame = rtc.AudioFrame(
+                data=fake._frame_bytes,
+                sample_rate=fake.sample_rate,
+                num_channels=1,
+                samples_per_channel=fake.sample_rate // 50,
+            )
+            self._event_ch.send_nowait(tts.SynthesizedAudio(request_id=request_id, frame=frame))
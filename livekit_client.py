@@ -0,0 +1,136 @@
+"""
+Shared LiveKit API client for the ops scripts and the campaign dialer.
+
+`get_api()` returns one long-lived client per process with:
+  - one keep-alive aiohttp session (the client's own), so bulk operations reuse
+    connections
+  - a request timeout on every call, set through the client's `timeout` option
+  - retries with full-jitter exponential backoff; calls that are safe to repeat
+    (list/get/delete/remove/update) retry on any transient error, everything
+    else (e.g. create_sip_participant) only when the connection was never made
+  - cached auth headers, so the JWT is signed once per grant set and TTL
+    rather than on every request
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Optional
+
+import aiohttp
+from dotenv import load_dotenv
+from livekit import api
+from livekit.api.twirp_client import TwirpError
+
+load_dotenv()
+
+logger = logging.getLogger("livekit-client")
+
+IDEMPOTENT_PREFIXES = ("list_", "get_", "delete_", "remove_", "update_")
+RETRYABLE_TWIRP_CODES = {"unavailable", "resource_exhausted", "internal", "deadline_exceeded"}
+
+# tokens are signed with a 6h TTL, re-sign well before that
+TOKEN_CACHE_SECONDS = 10 * 60
+
+
+def _retryable(e: Exception, idempotent: bool) -> bool:
+    if isinstance(e, aiohttp.ClientConnectorError):
+        # the request never left this host, repeating it cannot double-apply
+        return True
+    if not idempotent:
+        return False
+    if isinstance(e, TwirpError):
+        return e.code in RETRYABLE_TWIRP_CODES
+    return isinstance(e, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+def _cache_auth_header(service) -> None:
+    sign = service._auth_header
+    cache: dict[str, tuple[float, dict]] = {}
+
+    def cached_auth_header(*args, **kwargs) -> dict:
+        key = repr((args, sorted(kwargs.items())))
+        hit = cache.get(key)
+        now = time.monotonic()
+        if hit is None or now - hit[0] > TOKEN_CACHE_SECONDS:
+            hit = cache[key] = (now, sign(*args, **kwargs))
+        return hit[1]
+
+    service._auth_header = cached_auth_header
+
+
+class _RetryingService:
+    def __init__(self, service, retries: int, base_delay: float, max_delay: float) -> None:
+        self._service = service
+        self._retries = retries
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        _cache_auth_header(service)
+
+    def __getattr__(self, name):
+        method = getattr(self._service, name)
+        if name.startswith("_") or not callable(method):
+            return method
+        idempotent = name.startswith(IDEMPOTENT_PREFIXES)
+
+        async def call(*args, **kwargs):
+            for attempt in range(self._retries + 1):
+                try:
+                    return await method(*args, **kwargs)
+                except Exception as e:
+                    if attempt == self._retries or not _retryable(e, idempotent):
+                        raise
+                    delay = random.uniform(0, min(self._max_delay, self._base_delay * 2 ** attempt))
+                    logger.warning(f"{name} failed ({e!r}), retrying in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+
+        return call
+
+
+class SharedLiveKitAPI:
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        api_secret: Optional[str] = None,
+        timeout: float = 10.0,
+        retries: int = 3,
+        base_delay: float = 0.2,
+        max_delay: float = 5.0,
+    ) -> None:
+        # livekit-api 0.8 (pinned by livekit-agents 0.12) builds its own session,
+        # which already keeps connections alive; it takes no `session` argument
+        self._api = api.LiveKitAPI(
+            url=url or os.getenv("LIVEKIT_URL"),
+            api_key=api_key or os.getenv("LIVEKIT_API_KEY"),
+            api_secret=api_secret or os.getenv("LIVEKIT_API_SECRET"),
+            timeout=aiohttp.ClientTimeout(total=timeout),
+        )
+        self.room = _RetryingService(self._api.room, retries, base_delay, max_delay)
+        self.sip = _RetryingService(self._api.sip, retries, base_delay, max_delay)
+        self.egress = _RetryingService(self._api.egress, retries, base_delay, max_delay)
+        self.ingress = _RetryingService(self._api.ingress, retries, base_delay, max_delay)
+        self.agent_dispatch = _RetryingService(self._api.agent_dispatch, retries, base_delay, max_delay)
+
+    async def aclose(self) -> None:
+        await self._api.aclose()
+
+
+_shared: Optional[SharedLiveKitAPI] = None
+
+
+def get_api() -> SharedLiveKitAPI:
+    """The process-wide client; must be called from inside a running event loop"""
+    global _shared
+    if _shared is None:
+        _shared = SharedLiveKitAPI()
+    return _shared
+
+
+async def close_api() -> None:
+    global _shared
+    if _shared is not None:
+        await _shared.aclose()
+        _shared = None
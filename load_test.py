@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Offline Load Test
+Run simulated calls against the real agent entrypoints with the fake STT, LLM
+and TTS plugins from fake_plugins.py, and find where a worker saturates.
+
+Needs only a local LiveKit server (`livekit-server --dev`) and a directory of
+recorded caller utterances (16-bit mono WAV). Each simulated caller joins its
+room, waits for the agent to finish speaking, plays the next utterance and
+measures how long the agent takes to start answering.
+
+Example:
+    python load_test.py --agent agent --caller-audio recordings/ --levels 1,2,4,8,16,32
+"""
+
+import argparse
+import asyncio
+import glob
+import importlib
+import json
+import logging
+import os
+import resource
+import statistics
+import time
+import uuid
+import wave
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+
+from livekit import api, rtc
+from livekit.plugins import silero
+
+from fake_plugins import FakeLLM, FakeSTT, FakeTTS, LatencyDist
+from speech_chunker import PhoneChunkTokenizer
+from worker_prewarm import Plugins
+
+logger = logging.getLogger("load-test")
+
+FRAME_MS = 20
+
+
+@dataclass
+class CallResult:
+    response_latencies: list[float] = field(default_factory=list)
+    error: Optional[str] = None
+
+
+class SimProcess:
+    """Stands in for the worker's JobProcess"""
+
+    def __init__(self, plugins: Plugins) -> None:
+        self.pid = os.getpid()
+        self.userdata: dict = {"plugins": plugins, "vad": plugins.vad}
+        # the fakes have no connections to warm
+        done = asyncio.get_running_loop().create_future()
+        done.set_result(None)
+        self.userdata["warmup_task"] = done
+
+
+class SimJobContext:
+    """Just enough of JobContext for the agent entrypoints, backed by a real
+    room on the local server"""
+
+    def __init__(self, proc: SimProcess, room_name: str, url: str, token: str, lkapi: api.LiveKitAPI) -> None:
+        self.proc = proc
+        self.room = rtc.Room()
+        self.api = lkapi
+        self._room_name = room_name
+        self._url = url
+        self._token = token
+        self._shutdown_callbacks = []
+        self.closed = asyncio.Event()
+
+    async def connect(self, auto_subscribe=None, **kwargs) -> None:
+        await self.room.connect(self._url, self._token)
+
+    async def wait_for_participant(self, identity: Optional[str] = None) -> rtc.RemoteParticipant:
+        joined = asyncio.Event()
+        self.room.on("participant_connected", lambda *_: joined.set())
+        while True:
+            for p in self.room.remote_participants.values():
+                if identity is None or p.identity == identity:
+                    return p
+            joined.clear()
+            await joined.wait()
+
+    def add_shutdown_callback(self, callback) -> None:
+        self._shutdown_callbacks.append(callback)
+
+    def shutdown(self, reason: str = "") -> None:
+        self.closed.set()
+
+    async def aclose(self) -> None:
+        for callback in self._shutdown_callbacks:
+            await callback()
+        await self.room.disconnect()
+
+
+class SimCaller:
+    """A callee that answers, then plays one recorded utterance per agent turn"""
+
+    def __init__(self, utterances: list[np.ndarray], sample_rate: int, quiet_after: float = 0.7) -> None:
+        self.room = rtc.Room()
+        self._utterances = utterances
+        self._sample_rate = sample_rate
+        self._quiet_after = quiet_after
+        self._source = rtc.AudioSource(sample_rate, 1)
+        self._queue: asyncio.Queue[np.ndarray] = asyncio.Queue()
+        self._agent_voice_at = 0.0
+        self._first_voice_at = 0.0
+        self._agent_spoke = asyncio.Event()
+        self._utterance_sent = asyncio.Event()
+        self._samples = sample_rate * FRAME_MS // 1000
+        self._silence = np.zeros(self._samples, dtype=np.int16)
+        self._mic_task: Optional[asyncio.Task] = None
+
+    async def join(self, url: str, token: str) -> None:
+        self.room.on("track_subscribed", self._on_track_subscribed)
+        await self.room.connect(url, token)
+        track = rtc.LocalAudioTrack.create_audio_track("microphone", self._source)
+        await self.room.local_participant.publish_track(
+            track, rtc.TrackPublishOptions(source=rtc.TrackSource.SOURCE_MICROPHONE)
+        )
+        self._mic_task = asyncio.create_task(self._mic())
+
+    def _on_track_subscribed(self, track: rtc.Track, *_) -> None:
+        if track.kind == rtc.TrackKind.KIND_AUDIO:
+            asyncio.create_task(self._listen(rtc.AudioStream(track)))
+
+    async def _listen(self, stream: rtc.AudioStream) -> None:
+        async for ev in stream:
+            samples = np.frombuffer(ev.frame.data, dtype=np.int16)
+            if samples.size and np.abs(samples).max() > 500:
+                self._agent_voice_at = time.perf_counter()
+                if not self._agent_spoke.is_set():
+                    self._first_voice_at = self._agent_voice_at
+                    self._agent_spoke.set()
+
+    async def _mic(self) -> None:
+        # a phone line never goes silent on the wire: send silence between utterances
+        frame = rtc.AudioFrame.create(self._sample_rate, 1, self._samples)
+        buf = np.frombuffer(frame.data, dtype=np.int16)
+        pending: Optional[np.ndarray] = None
+        offset = 0
+        while True:
+            if pending is None and not self._queue.empty():
+                pending, offset = self._queue.get_nowait(), 0
+            if pending is not None:
+                chunk = pending[offset:offset + self._samples]
+                buf[:] = 0
+                buf[: chunk.size] = chunk
+                offset += self._samples
+                if offset >= pending.size:
+                    pending = None
+                    self._utterance_sent.set()
+            else:
+                buf[:] = self._silence
+            await self._source.capture_frame(frame)
+
+    async def _agent_finished(self, timeout: float) -> None:
+        await asyncio.wait_for(self._agent_spoke.wait(), timeout)
+        while time.perf_counter() - self._agent_voice_at < self._quiet_after:
+            await asyncio.sleep(0.05)
+
+    async def converse(self, timeout: float = 15.0) -> list[float]:
+        latencies = []
+        await self._agent_finished(timeout)  # the greeting
+        for utterance in self._utterances:
+            self._utterance_sent.clear()
+            self._queue.put_nowait(utterance)
+            await self._utterance_sent.wait()
+            ended = time.perf_counter()
+            self._agent_spoke.clear()
+            await self._agent_finished(timeout)
+            # first agent audio after the caller stopped talking
+            latencies.append(self._first_voice_at - ended)
+        return latencies
+
+    async def aclose(self) -> None:
+        if self._mic_task is not None:
+            self._mic_task.cancel()
+        await self.room.disconnect()
+
+
+def load_utterances(directory: str) -> tuple[list[np.ndarray], int]:
+    utterances, sample_rate = [], None
+    for path in sorted(glob.glob(os.path.join(directory, "*.wav"))):
+        with wave.open(path, "rb") as w:
+            if w.getsampwidth() != 2 or w.getnchannels() != 1:
+                raise ValueError(f"{path}: caller audio must be 16-bit mono WAV")
+            if sample_rate not in (None, w.getframerate()):
+                raise ValueError(f"{path}: all recordings must share one sample rate")
+            sample_rate = w.getframerate()
+            utterances.append(np.frombuffer(w.readframes(w.getnframes()), dtype=np.int16))
+    if not utterances:
+        raise ValueError(f"no .wav recordings found in {directory}")
+    return utterances, sample_rate
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # ru_maxrss is the peak, in KiB on Linux and bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+async def measure_loop_lag(samples: list[float], interval: float = 0.05) -> None:
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - started - interval)
+
+
+class LoadTest:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self._args = args
+        self._entrypoint = importlib.import_module(args.agent).entrypoint
+        self._utterances, self._sample_rate = load_utterances(args.caller_audio)
+        self._vad = silero.VAD.load()
+        self._lkapi = api.LiveKitAPI(url=args.url, api_key=args.api_key, api_secret=args.api_secret)
+
+    def _token(self, identity: str, room_name: str, metadata: str = "") -> str:
+        return (
+            api.AccessToken(self._args.api_key, self._args.api_secret)
+            .with_identity(identity)
+            .with_metadata(metadata)
+            .with_grants(api.VideoGrants(room_join=True, room=room_name))
+            .to_jwt()
+        )
+
+    def _plugins(self) -> Plugins:
+        args = self._args
+        return Plugins(
+            vad=self._vad,
+            stt=FakeSTT(LatencyDist.parse(args.stt_latency)),
+            llm=FakeLLM(LatencyDist.parse(args.llm_ttft), LatencyDist.parse(args.llm_token_interval)),
+            tts=FakeTTS(LatencyDist.parse(args.tts_ttfb)),
+            openai_client=None,
+            chunker=PhoneChunkTokenizer(),
+        )
+
+    async def simulate_call(self, n: int) -> CallResult:
+        room_name = f"loadtest-{uuid.uuid4().hex[:12]}"
+        lead = {"lead_id": f"loadtest-{n}", "first_name": "Sam", "city": "Springfield"}
+        await self._lkapi.room.create_room(api.CreateRoomRequest(name=room_name))
+
+        ctx = SimJobContext(
+            SimProcess(self._plugins()),
+            room_name,
+            self._args.url,
+            self._token(f"agent-{n}", room_name),
+            self._lkapi,
+        )
+        caller = SimCaller(self._utterances, self._sample_rate)
+        result = CallResult()
+        agent_task = None
+        try:
+            await caller.join(self._args.url, self._token(f"lead-{n}", room_name, json.dumps(lead)))
+            agent_task = asyncio.create_task(self._entrypoint(ctx))
+            result.response_latencies = await caller.converse()
+        except Exception as e:
+            result.error = repr(e)
+        finally:
+            if agent_task is not None:
+                agent_task.cancel()
+            await caller.aclose()
+            await ctx.aclose()
+            try:
+                await self._lkapi.room.delete_room(api.DeleteRoomRequest(room=room_name))
+            except Exception:
+                pass
+        return result
+
+    async def run_level(self, concurrency: int) -> dict:
+        calls = self._args.calls_per_level or concurrency * 2
+        slots = asyncio.Semaphore(concurrency)
+        lag: list[float] = []
+        lag_task = asyncio.create_task(measure_loop_lag(lag))
+        rss_before, cpu_before, started = rss_bytes(), time.process_time(), time.perf_counter()
+        rss_peak = rss_before
+
+        async def one(n: int) -> CallResult:
+            nonlocal rss_peak
+            async with slots:
+                result = await self.simulate_call(n)
+                rss_peak = max(rss_peak, rss_bytes())
+                return result
+
+        results = await asyncio.gather(*(one(n) for n in range(calls)))
+        lag_task.cancel()
+
+        wall = time.perf_counter() - started
+        cpu = time.process_time() - cpu_before
+        latencies = sorted(l for r in results for l in r.response_latencies)
+
+        def pct(values: list[float], p: float) -> float:
+            return values[min(len(values) - 1, int(len(values) * p / 100))] if values else 0.0
+
+        return {
+            "concurrency": concurrency,
+            "calls": calls,
+            "errors": sum(1 for r in results if r.error),
+            "response_p50_ms": round(pct(latencies, 50) * 1000),
+            "response_p95_ms": round(pct(latencies, 95) * 1000),
+            "response_mean_ms": round(statistics.fmean(latencies) * 1000) if latencies else 0,
+            "loop_lag_p95_ms": round(pct(sorted(lag), 95) * 1000),
+            # CPU-seconds per second of call, i.e. cores used by one live session
+            "cpu_per_session": round(cpu / wall / concurrency, 3),
+            "rss_per_session_mb": round((rss_peak - rss_before) / concurrency / 1e6, 1),
+        }
+
+    async def run(self) -> None:
+        levels = [int(l) for l in self._args.levels.split(",")]
+        saturated_at = None
+        try:
+            for level in levels:
+                report = await self.run_level(level)
+                print(json.dumps(report))
+                if saturated_at is None and (
+                    report["response_p95_ms"] > self._args.max_p95_ms
+                    or report["loop_lag_p95_ms"] > self._args.max_loop_lag_ms
+                    or report["errors"]
+                ):
+                    saturated_at = level
+                    break
+        finally:
+            await self._lkapi.aclose()
+
+        if saturated_at is None:
+            print(f"✅ No saturation up to {levels[-1]} concurrent calls")
+        else:
+            print(f"⚠️  Worker saturates at {saturated_at} concurrent calls")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Offline load test for the calling agents")
+    parser.add_argument("--agent", default="agent", choices=["agent", "sip_agent"])
+    parser.add_argument("--caller-audio", required=True, help="directory of 16-bit mono WAV utterances")
+    parser.add_argument("--levels", default="1,2,4,8,16,32", help="concurrency levels to ramp through")
+    parser.add_argument("--calls-per-level", type=int, default=0, help="default: 2x the concurrency")
+    parser.add_argument("--stt-latency", default="lognormal:250:0.3")
+    parser.add_argument("--llm-ttft", default="lognormal:400:0.4")
+    parser.add_argument("--llm-token-interval", default="uniform:10:30")
+    parser.add_argument("--tts-ttfb", default="lognormal:300:0.3")
+    parser.add_argument("--max-p95-ms", type=int, default=2000, help="saturation: response p95 above this")
+    parser.add_argument("--max-loop-lag-ms", type=int, default=100, help="saturation: loop lag p95 above this")
+    parser.add_argument("--url", default=os.getenv("LOADTEST_LIVEKIT_URL", "ws://localhost:7880"))
+    parser.add_argument("--api-key", default=os.getenv("LOADTEST_LIVEKIT_API_KEY", "devkey"))
+    parser.add_argument("--api-secret", default=os.getenv("LOADTEST_LIVEKIT_API_SECRET", "secret"))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    await LoadTest(args).run()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -10,7 +10,6 @@ from livekit.agents import (
     AgentSession,
     ChatContext,
     JobContext,
-    JobProcess,
     RoomInputOptions,
     RoomOutputOptions,
     RunContext,
@@ -21,7 +20,10 @@ from livekit.agents import (
 from livekit.agents.job import get_job_context
 from livekit.agents.llm import function_tool
 from livekit.agents.voice import MetricsCollectedEvent
-from livekit.plugins import deepgram, openai, silero
+
+from agent_registry import AgentRegistry, SessionAgents
+from call_recorder import recorder_from_env
+from worker_prewarm import PluginConfig, get_plugins, make_prewarm, start_connection_warmup
 
 # uncomment to enable Krisp BVC noise cancellation, currently supported on Linux and MacOS
 # from livekit.plugins import noise_cancellation
@@ -60,6 +62,12 @@ class StoryData:
     characters: list[CharacterData] = field(default_factory=list)
     locations: list[str] = field(default_factory=list) 
     theme: Optional[str] = None
+    # this session's prebuilt agents, for handoffs
+    agents: Optional[SessionAgents] = field(default=None, repr=False)
+
+
+# the specialist only needs the recent conversation, the story itself is in userdata
+HANDOFF_MAX_ITEMS = 12
 
 
 class LeadEditorAgent(Agent):
@@ -146,10 +154,12 @@ class LeadEditorAgent(Agent):
         """Called when the user has provided enough information to suggest a children's book.
         """
 
-        childrens_editor = SpecialistEditorAgent("children's books", chat_ctx=context.session._chat_ctx)
-        # here we are creating a ChilrensEditorAgent with the full chat history,
-        # as if they were there in the room with the user the whole time.
-        # we could also omit it and rely on the userdata to share context.
+        # the session's prebuilt children's editor takes over with the recent chat history,
+        # as if they were there in the room with the user for the last few turns.
+        # the rest of the story is shared through the userdata.
+        childrens_editor = await context.userdata.agents.handoff(
+            "childrens_editor", context.session, HANDOFF_MAX_ITEMS
+        )
 
         logger.info(
             "switching to the children's book editor with the provided user data: %s", context.userdata
@@ -161,28 +171,25 @@ class LeadEditorAgent(Agent):
         self,
         context: RunContext[StoryData],
     ):
-        """Called when the user has provided enough information to suggest a children's book.
+        """Called when the user has provided enough information to suggest a novel.
         """
 
-        childrens_editor = SpecialistEditorAgent("novels", chat_ctx=context.session._chat_ctx)
-        # here we are creating a ChilrensEditorAgent with the full chat history,
-        # as if they were there in the room with the user the whole time.
-        # we could also omit it and rely on the userdata to share context.
+        novel_editor = await context.userdata.agents.handoff("novel_editor", context.session, HANDOFF_MAX_ITEMS)
 
         logger.info(
-            "switching to the children's book editor with the provided user data: %s", context.userdata
+            "switching to the novel editor with the provided user data: %s", context.userdata
         )
-        return childrens_editor, "Let's switch to the children's book editor."
+        return novel_editor, "Let's switch to the novel editor."
 
 
 class SpecialistEditorAgent(Agent):
-    def __init__(self, specialty: str, chat_ctx: Optional[ChatContext] = None) -> None:
+    def __init__(self, specialty: str, tts=None, chat_ctx: Optional[ChatContext] = None) -> None:
         super().__init__(
             instructions=f"{common_instructions}. You specialize in {specialty}, and have "
             "worked with some of the greats, and have even written a few books yourself.",
             # each agent could override any of the model services, including mixing
             # realtime and non-realtime models
-            tts=openai.TTS(voice="echo"),
+            tts=tts,
             chat_ctx=chat_ctx,
         )
 
@@ -266,20 +273,31 @@ class SpecialistEditorAgent(Agent):
         await job_ctx.api.room.delete_room(api.DeleteRoomRequest(room=job_ctx.room.name))
 
 
-def prewarm(proc: JobProcess):
-    proc.userdata["vad"] = silero.VAD.load()
+PLUGIN_CONFIG = PluginConfig(stt_model="nova-3", llm_model="gpt-4o-mini", tts_voice="ash", extra_voices=["echo"])
+prewarm = make_prewarm(PLUGIN_CONFIG)
+
+# the specialists speak with the prewarmed "echo" voice
+AGENTS = AgentRegistry()
+AGENTS.register(
+    "childrens_editor", lambda plugins: SpecialistEditorAgent("children's books", tts=plugins.voice("echo"))
+)
+AGENTS.register("novel_editor", lambda plugins: SpecialistEditorAgent("novels", tts=plugins.voice("echo")))
 
 
 async def entrypoint(ctx: JobContext):
+    plugins = get_plugins(ctx.proc, PLUGIN_CONFIG)
+    start_connection_warmup(ctx.proc)
+    # built before connecting, so a handoff is just a switch
+    agents = AGENTS.build(plugins)
     await ctx.connect()
 
     session = AgentSession[StoryData](
-        vad=ctx.proc.userdata["vad"],
+        vad=plugins.vad,
         # any combination of STT, LLM, TTS, or realtime API can be used
-        llm=openai.LLM(model="gpt-4o-mini"),
-        stt=deepgram.STT(model="nova-3"),
-        tts=openai.TTS(voice="ash"),
-        userdata=StoryData(),
+        llm=plugins.llm,
+        stt=plugins.stt,
+        tts=plugins.tts,
+        userdata=StoryData(agents=agents),
     )
 
     # log metrics as they are emitted, and total usage after session is over
@@ -296,6 +314,13 @@ async def entrypoint(ctx: JobContext):
 
     ctx.add_shutdown_callback(log_usage)
 
+    # opt-in transcript and timing capture for QA
+    recorder = recorder_from_env(ctx.room.name)
+    if recorder is not None:
+        recorder.attach_session(session)
+        session.on("metrics_collected", lambda ev: recorder.event("metrics", **ev.metrics.model_dump(mode="json")))
+        ctx.add_shutdown_callback(recorder.aclose)
+
     await session.start(
         agent=LeadEditorAgent(),
         room=ctx.room,
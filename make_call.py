@@ -1,38 +1,40 @@
 import asyncio
+import json
 import os
 from dotenv import load_dotenv
-from livekit import api
 from livekit.protocol.sip import CreateSIPParticipantRequest
 
+from caller_id_pool import CallerIdExhausted, load_pool
+from livekit_client import close_api, get_api
+from room_allocator import RoomAllocator, new_room_name
+from trunk_registry import parse_list
+
 load_dotenv()
 
-async def make_outbound_call():
-    """Make an outbound call using the configured trunk"""
-    
-    lkapi = api.LiveKitAPI(
-        url=os.getenv("LIVEKIT_URL"),
-        api_key=os.getenv("LIVEKIT_API_KEY"),
-        api_secret=os.getenv("LIVEKIT_API_SECRET")
-    )
+DEFAULT_FROM_NUMBER = "+13082514678"  # Your outbound number
 
-    # Call configuration
-    from_number = "+13082514678"  # Your outbound number
-    to_number = "+923024491162"   # Target number in Pakistan
-    trunk_id = os.getenv("SIP_OUTBOUND_TRUNK_ID")
-    
-    if not trunk_id:
-        print("Error: SIP_OUTBOUND_TRUNK_ID not found. Please run setup_trunk.py first.")
-        return
 
-    # Create SIP participant request
-    request = CreateSIPParticipantRequest(
+def build_call_request(
+    trunk_id,
+    to_number,
+    from_number=DEFAULT_FROM_NUMBER,
+    room_name=None,
+    participant_identity="outbound-caller",
+    metadata=None,
+):
+    """Build the CreateSIPParticipantRequest used for every outbound call"""
+    participant_metadata = {"call_type": "outbound", "purpose": "real_estate"}
+    if metadata:
+        participant_metadata.update(metadata)
+
+    return CreateSIPParticipantRequest(
         sip_trunk_id=trunk_id,
         sip_call_to=to_number,
         sip_number=from_number,
-        room_name="outbound-call-room",
-        participant_identity="outbound-caller",
+        room_name=room_name or new_room_name(),
+        participant_identity=participant_identity,
         participant_name="Real Estate Agent",
-        participant_metadata='{"call_type": "outbound", "purpose": "real_estate"}',
+        participant_metadata=json.dumps(participant_metadata),
         dtmf="",
         play_ringtone=True,
         hide_phone_number=False,
@@ -41,7 +43,36 @@ async def make_outbound_call():
         enable_krisp=True  # Enable noise cancellation
     )
 
+
+async def make_outbound_call():
+    """Make an outbound call using the configured trunk"""
+    
+    lkapi = get_api()
+
+    # Call configuration
+    to_number = "+923024491162"   # Target number in Pakistan
+
     try:
+        # caller ID from the pool, preferring one in the callee's area code
+        numbers = parse_list(os.getenv("SIP_FROM_NUMBERS")) or [DEFAULT_FROM_NUMBER]
+        caller_ids = await load_pool(lkapi, numbers)
+        if not caller_ids.routes:
+            print("Error: no outbound trunk found. Please run setup_trunk.py first.")
+            return
+        try:
+            # waits out the per-minute limit; the daily cap is shared with the dialer
+            route = await caller_ids.acquire(to_number)
+        except CallerIdExhausted as e:
+            print(f"Error: {e}. Try again tomorrow or add numbers to SIP_FROM_NUMBERS.")
+            return
+        trunk_id, from_number = route.trunk_id, route.number
+
+        # one room per call, so concurrent calls never share an agent
+        room_name = await RoomAllocator(lkapi).allocate()
+
+        # Create SIP participant request
+        request = build_call_request(trunk_id, to_number, from_number, room_name=room_name)
+
         print(f"Initiating call from {from_number} to {to_number}...")
         participant = await lkapi.sip.create_sip_participant(request)
         
@@ -57,7 +88,7 @@ async def make_outbound_call():
         print(f"Error making call: {e}")
         return None
     finally:
-        await lkapi.aclose()
+        await close_api()
 
 if __name__ == "__main__":
     asyncio.run(make_outbound_call())
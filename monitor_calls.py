@@ -2,49 +2,293 @@
 """
 Call Monitoring Script
 Monitor active SIP calls and agent status
+
+Runs until interrupted and keeps an in-memory index of live calls, fed either by
+LiveKit webhooks (--mode webhook, point the project's webhook URL at
+http://<host>:<port>/webhook) or by incremental polling (--mode poll). The
+dashboard shows concurrency, answer rate and call durations.
+
+A stand-in for LiveKit can exercise the receiver with --insecure, which skips
+signature checks:
+    curl -d '{"event": "room_started", "room": {"name": "call-1"}}' localhost:8090/webhook
 """
 
+import argparse
 import asyncio
-import os
+import statistics
+import sys
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+from aiohttp import web
 from dotenv import load_dotenv
+from google.protobuf.json_format import Parse
 from livekit import api
+from livekit.protocol.models import ParticipantInfo, TrackType
+
+from livekit_client import close_api, get_api
+from room_allocator import CALL_ROOM_PREFIXES
 
 load_dotenv()
 
-async def monitor_calls():
+
+@dataclass
+class CallRecord:
+    room: str
+    started_at: float
+    answered_at: Optional[float] = None
+    ended_at: Optional[float] = None
+    caller: Optional[str] = None
+    agent: bool = False
+
+    @property
+    def duration(self) -> Optional[float]:
+        if self.answered_at is None or self.ended_at is None:
+            return None
+        return self.ended_at - self.answered_at
+
+
+class CallIndex:
+    """Active calls by room name, plus a bounded history of finished ones"""
+
+    def __init__(self, prefixes=CALL_ROOM_PREFIXES, history: int = 1000) -> None:
+        self._prefixes = tuple(prefixes)
+        self.active: dict[str, CallRecord] = {}
+        self.finished: deque[CallRecord] = deque(maxlen=history)
+        self.events = 0
+
+    def _call(self, room: str, at: float) -> Optional[CallRecord]:
+        if not room.startswith(self._prefixes):
+            return None
+        call = self.active.get(room)
+        if call is None:
+            call = self.active[room] = CallRecord(room=room, started_at=at)
+        return call
+
+    def room_started(self, room: str, at: float) -> None:
+        self._call(room, at)
+
+    def room_finished(self, room: str, at: float) -> None:
+        call = self.active.pop(room, None)
+        if call is not None:
+            call.ended_at = at
+            self.finished.append(call)
+
+    def participant_seen(self, room: str, p: ParticipantInfo, at: float, audio_published: bool = False) -> None:
+        call = self._call(room, at)
+        if call is None:
+            return
+        if p.kind == ParticipantInfo.Kind.AGENT:
+            call.agent = True
+        elif p.kind == ParticipantInfo.Kind.SIP:
+            call.caller = p.identity
+            status = p.attributes.get("sip.callStatus")
+            has_audio = audio_published or any(t.type == TrackType.AUDIO for t in p.tracks)
+            # early media and ringback publish audio too; only trust it when there is no call status
+            if call.answered_at is None and (status == "active" or (not status and has_audio)):
+                call.answered_at = at
+
+    def participant_left(self, room: str, p: ParticipantInfo, at: float) -> None:
+        call = self.active.get(room)
+        # the call is over when the phone side hangs up, even if the room lingers
+        if call is not None and p.kind == ParticipantInfo.Kind.SIP and p.identity == call.caller:
+            self.room_finished(room, at)
+
+    def apply_webhook(self, event: api.WebhookEvent) -> None:
+        self.events += 1
+        at = event.created_at or time.time()
+        room = event.room.name
+        if event.event == "room_started":
+            self.room_started(room, at)
+        elif event.event == "room_finished":
+            self.room_finished(room, at)
+        elif event.event in ("participant_joined", "track_published"):
+            audio = event.event == "track_published" and event.track.type == TrackType.AUDIO
+            self.participant_seen(room, event.participant, at, audio_published=audio)
+        elif event.event == "participant_left":
+            self.participant_left(room, event.participant, at)
+
+    def stats(self) -> dict:
+        finished = list(self.finished)
+        answered = [c for c in finished if c.answered_at is not None]
+        durations = sorted(c.duration for c in answered)
+        now = time.time()
+        return {
+            "active": len(self.active),
+            "in_progress": sum(1 for c in self.active.values() if c.answered_at is not None),
+            "ringing": sum(1 for c in self.active.values() if c.answered_at is None),
+            "without_agent": sum(1 for c in self.active.values() if not c.agent),
+            "finished": len(finished),
+            "answer_rate": len(answered) / len(finished) if finished else None,
+            "duration_p50": statistics.median(durations) if durations else None,
+            "duration_p95": durations[int(0.95 * (len(durations) - 1))] if durations else None,
+            "longest_active": max((now - c.started_at for c in self.active.values()), default=None),
+        }
+
+
+class CallPoller:
+    """Incremental polling: one list_rooms per tick, participant lookups only where something changed"""
+
+    def __init__(self, lkapi, index: CallIndex, interval: float = 5.0, concurrency: int = 20) -> None:
+        self._lkapi = lkapi
+        self._index = index
+        self._interval = interval
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._seen_counts: dict[str, int] = {}
+        # rooms whose caller hung up but that have not been deleted yet
+        self._hung_up: set[str] = set()
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.poll_once()
+            except Exception as e:
+                print(f"❌ Error polling rooms: {e}", file=sys.stderr)
+            await asyncio.sleep(self._interval)
+
+    async def poll_once(self) -> None:
+        now = time.time()
+        res = await self._lkapi.room.list_rooms(api.ListRoomsRequest())
+        rooms = {r.name: r for r in res.rooms if r.name.startswith(CALL_ROOM_PREFIXES)}
+
+        for name in list(self._index.active):
+            if name not in rooms:
+                self._index.room_finished(name, now)
+        for name in list(self._seen_counts):
+            if name not in rooms:
+                self._seen_counts.pop(name)
+                self._hung_up.discard(name)
+
+        changed = []
+        for name, room in rooms.items():
+            if name in self._hung_up:
+                continue
+            self._index.room_started(name, room.creation_time or now)
+            call = self._index.active.get(name)
+            # ringing calls are re-checked every tick until they are answered
+            if self._seen_counts.get(name) != room.num_participants or (call and call.answered_at is None):
+                self._seen_counts[name] = room.num_participants
+                changed.append(name)
+
+        await asyncio.gather(*(self._refresh(name, now) for name in changed))
+
+    async def _refresh(self, room: str, now: float) -> None:
+        async with self._semaphore:
+            try:
+                res = await self._lkapi.room.list_participants(api.ListParticipantsRequest(room=room))
+            except Exception:
+                return
+        call = self._index.active.get(room)
+        present = {p.identity for p in res.participants}
+        for p in res.participants:
+            self._index.participant_seen(room, p, now)
+        if call is not None and call.caller and call.caller not in present:
+            self._index.room_finished(room, now)
+            self._hung_up.add(room)
+
+
+def make_webhook_app(index: CallIndex, insecure: bool = False) -> web.Application:
+    receiver = None if insecure else api.WebhookReceiver(api.TokenVerifier())
+
+    async def handle(request: web.Request) -> web.Response:
+        body = await request.text()
+        try:
+            if receiver is None:
+                event = Parse(body, api.WebhookEvent(), ignore_unknown_fields=True)
+            else:
+                event = receiver.receive(body, request.headers.get("Authorization", ""))
+        except Exception as e:
+            return web.Response(status=401, text=str(e))
+        index.apply_webhook(event)
+        return web.Response(text="ok")
+
+    app = web.Application()
+    app.router.add_post("/webhook", handle)
+    return app
+
+
+def _fmt_seconds(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.0f}s"
+
+
+def render_dashboard(index: CallIndex, source: str) -> str:
+    s = index.stats()
+    answer_rate = "-" if s["answer_rate"] is None else f"{s['answer_rate']:.0%}"
+    lines = [
+        f"🔍 Monitoring SIP Calls ({source}) — {time.strftime('%H:%M:%S')}",
+        "=" * 50,
+        f"📞 Active calls:     {s['active']}  (talking {s['in_progress']}, ringing {s['ringing']})",
+        f"🤖 Without agent:    {s['without_agent']}",
+        f"✅ Answer rate:      {answer_rate} of {s['finished']} finished",
+        f"⏱️  Duration p50/p95: {_fmt_seconds(s['duration_p50'])} / {_fmt_seconds(s['duration_p95'])}",
+        f"🕰️  Oldest live call: {_fmt_seconds(s['longest_active'])}",
+        "=" * 50,
+    ]
+    now = time.time()
+    for call in sorted(index.active.values(), key=lambda c: c.started_at)[:20]:
+        state = "talking" if call.answered_at else "ringing"
+        lines.append(f"   {call.room:<40} {state:<8} {now - call.started_at:>6.0f}s")
+    return "\n".join(lines)
+
+
+async def monitor_calls(args=None):
     """Monitor active SIP calls"""
-    
-    lkapi = api.LiveKitAPI(
-        url=os.getenv("LIVEKIT_URL"),
-        api_key=os.getenv("LIVEKIT_API_KEY"),
-        api_secret=os.getenv("LIVEKIT_API_SECRET")
-    )
+
+    args = args or argparse.Namespace(mode="poll", port=8090, insecure=False, interval=5.0, refresh=2.0, once=True)
+    index = CallIndex()
+    lkapi = get_api()
+    runner = None
 
     try:
-        print("🔍 Monitoring SIP Calls...")
-        print("=" * 50)
-        
-        # List rooms to see active calls
-        print("📞 Checking for active call rooms...")
-        
-        # List rooms
-        print(f"\n🏠 Checking Rooms...")
-        rooms = await lkapi.room.list_rooms(api.ListRoomsRequest())
-        
-        if rooms.rooms:
-            for room in rooms.rooms:
-                if "real-estate" in room.name or "outbound-call" in room.name:
-                    print(f"   Room: {room.name}")
-                    print(f"   Participants: {room.num_participants}")
-                    print(f"   Created: {room.creation_time}")
-        
-        print("\n" + "=" * 50)
-        print("✅ Monitoring complete")
-        
+        if args.once:
+            await CallPoller(lkapi, index).poll_once()
+            print(render_dashboard(index, "one-shot poll"))
+            return
+
+        if args.mode == "webhook":
+            runner = web.AppRunner(make_webhook_app(index, insecure=args.insecure))
+            await runner.setup()
+            await web.TCPSite(runner, port=args.port).start()
+            source = f"webhooks on :{args.port}"
+            # seed the index with calls that were already live before we started listening
+            await CallPoller(lkapi, index).poll_once()
+            background = None
+        else:
+            poller = CallPoller(lkapi, index, interval=args.interval)
+            source = f"polling every {args.interval:.0f}s"
+            background = asyncio.create_task(poller.run())
+
+        clear = "\033[2J\033[H" if sys.stdout.isatty() else ""
+        try:
+            while True:
+                print(clear + render_dashboard(index, source), flush=True)
+                await asyncio.sleep(args.refresh)
+        finally:
+            if background is not None:
+                background.cancel()
+
     except Exception as e:
         print(f"❌ Error monitoring calls: {e}")
     finally:
-        await lkapi.aclose()
+        if runner is not None:
+            await runner.cleanup()
+        await close_api()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Live dashboard of SIP calls")
+    parser.add_argument("--mode", choices=["webhook", "poll"], default="webhook")
+    parser.add_argument("--port", type=int, default=8090, help="webhook receiver port")
+    parser.add_argument("--insecure", action="store_true", help="accept unsigned webhooks (local stand-in)")
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds between polls in poll mode")
+    parser.add_argument("--refresh", type=float, default=2.0, help="dashboard refresh in seconds")
+    parser.add_argument("--once", action="store_true", help="poll once, print and exit")
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    asyncio.run(monitor_calls())
+    try:
+        asyncio.run(monitor_calls(parse_args()))
+    except KeyboardInterrupt:
+        pass
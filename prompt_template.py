@@ -0,0 +1,80 @@
+"""
+Compiled per-lead prompt templates.
+
+A script with `{{field}}` placeholders is parsed once at worker start. The
+script body never changes between calls: per-lead values go into a short
+"lead details" block appended after it, so the long static prefix stays
+byte-identical and the LLM provider's prompt-prefix cache keeps hitting.
+"""
+
+import json
+import logging
+import os
+import re
+from typing import Mapping, Optional
+
+logger = logging.getLogger("prompt-template")
+
+PLACEHOLDER = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+
+class PromptTemplate:
+    def __init__(self, text: str, defaults: Optional[Mapping[str, str]] = None) -> None:
+        # literal text and field names alternate: [text, field, text, field, ..., text]
+        parts = PLACEHOLDER.split(text)
+        self._literals = parts[0::2]
+        self._slots = parts[1::2]
+        self.fields = tuple(dict.fromkeys(self._slots))
+        self.defaults = dict(defaults or {})
+
+        self.static_prefix = (
+            f"{text}\n\nLead details (use these wherever the script above says {{{{field}}}}):\n"
+        )
+
+    def values(self, lead: Mapping[str, str]) -> dict:
+        return {
+            name: str(lead.get(name) or self.defaults.get(name, ""))
+            for name in self.fields
+        }
+
+    def render(self, lead: Mapping[str, str]) -> str:
+        """Static script followed by this lead's values"""
+        values = self.values(lead)
+        return self.static_prefix + "\n".join(f"{name}: {values[name]}" for name in self.fields)
+
+    def substitute(self, lead: Mapping[str, str]) -> str:
+        """Script with the placeholders filled in place, for text that is spoken
+        rather than sent as the cached system prompt"""
+        values = self.values(lead)
+        out = [self._literals[0]]
+        for slot, literal in zip(self._slots, self._literals[1:]):
+            out.append(values[slot])
+            out.append(literal)
+        return "".join(out)
+
+
+def parse_metadata(*sources: Optional[str]) -> dict:
+    """Merge JSON metadata strings (e.g. room then participant), later ones win"""
+    merged: dict = {}
+    for raw in sources:
+        if not raw:
+            continue
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            logger.warning("ignoring non-JSON metadata: %r", raw[:200])
+            continue
+        if isinstance(data, dict):
+            merged.update(data)
+    return merged
+
+
+def lead_defaults() -> dict:
+    realtor_name = os.getenv("REALTOR_NAME", "our realtor")
+    return {
+        "first_name": "there",
+        "city": "your area",
+        "address": "your property",
+        "realtor_name": realtor_name,
+        "realtor_firstname": realtor_name.split()[0] if os.getenv("REALTOR_NAME") else realtor_name,
+    }
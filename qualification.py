@@ -0,0 +1,268 @@
+"""
+Structured lead qualification.
+
+The LLM fills a per-call `QualificationRecord` through typed function tools as
+the homeowner answers the script's questions. Every change is handed to the
+call's `RecordSink`, which coalesces updates in memory and appends them from a
+background thread, so no synchronous write lands on the audio loop.
+
+Each call runs in its own job process, so the sink is per call and writes to
+its own spool file: concurrent calls never contend for a lock. The spool is
+merged into the database by a single writer, `python qualification.py merge`
+(add `--watch` to keep merging), which takes the latest snapshot per call.
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+from dataclasses import asdict, dataclass, field, fields
+from typing import Annotated, Callable, Optional
+
+from livekit.agents import llm
+
+from call_control import CallControl, EndCallFunctions
+
+logger = logging.getLogger("qualification")
+
+DEFAULT_DB = "qualification.db"
+DEFAULT_SPOOL = "qualification_spool"
+
+
+@dataclass
+class QualificationRecord:
+    # Filled in by the function tools below as the call goes on.
+
+    lead_id: str
+    room: str
+    owns_property: Optional[bool] = None
+    open_to_selling: Optional[bool] = None
+    address_confirmed: Optional[bool] = None
+    motivation: Optional[str] = None
+    timeline: Optional[str] = None
+    price: Optional[str] = None
+    open_to_listing: Optional[bool] = None
+    callback_time: Optional[str] = None
+    outcome: Optional[str] = None
+    updated_at: float = field(default_factory=time.time)
+
+
+_COLUMNS = [f.name for f in fields(QualificationRecord)]
+
+
+class RecordSink:
+    """One call's record, appended in batches to its own spool file.
+
+    The file is `<room>.jsonl.part` while the call runs and is renamed to
+    `<room>.jsonl` by `close()`, which marks it ready to merge.
+    """
+
+    def __init__(self, spool_dir: str, call_id: str, flush_interval: float = 1.0) -> None:
+        os.makedirs(spool_dir, exist_ok=True)
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", call_id)
+        self._path = os.path.join(spool_dir, f"{name}.jsonl")
+        self._flush_interval = flush_interval
+        # latest snapshot; repeated updates within an interval coalesce into one line
+        self._pending: Optional[dict] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def for_call(cls, call_id: str) -> "RecordSink":
+        return cls(os.getenv("QUALIFICATION_SPOOL", DEFAULT_SPOOL), call_id)
+
+    def submit(self, record: QualificationRecord) -> None:
+        record.updated_at = time.time()
+        self._pending = asdict(record)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            await self.flush()
+
+    async def flush(self) -> None:
+        if self._pending is None:
+            return
+        row, self._pending = self._pending, None
+        try:
+            await asyncio.to_thread(self._append, row)
+        except Exception:
+            logger.exception(f"failed to spool the qualification record of {row['room']}")
+
+    def _append(self, row: dict) -> None:
+        with open(f"{self._path}.part", "a", encoding="utf-8") as f:
+            f.write(json.dumps(row) + "\n")
+
+    async def close(self) -> None:
+        """Write what's left and hand the file to the merger (job shutdown)"""
+        if self._task is not None:
+            self._task.cancel()
+        await self.flush()
+        if os.path.exists(f"{self._path}.part"):
+            await asyncio.to_thread(os.replace, f"{self._path}.part", self._path)
+
+
+def _latest_rows(path: str) -> list[dict]:
+    latest: dict[tuple[str, str], dict] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                # a job killed mid-write leaves a torn last line
+                continue
+            latest[(row["lead_id"], row["room"])] = row
+    return list(latest.values())
+
+
+def merge_spool(spool_dir: str, db_path: str, include_live: bool = False) -> int:
+    """Fold finished spool files into the database and delete them (blocking).
+
+    Run one merger per database. With `include_live`, calls still in progress
+    are upserted too (SQLite only; a JSONL target would repeat them), and
+    their files are left for a later merge.
+    """
+    finished = sorted(glob.glob(os.path.join(spool_dir, "*.jsonl")))
+    live = []
+    if include_live and not db_path.endswith(".jsonl"):
+        live = sorted(glob.glob(os.path.join(spool_dir, "*.jsonl.part")))
+    rows = [row for path in [*finished, *live] for row in _latest_rows(path)]
+    if not rows:
+        return 0
+
+    if db_path.endswith(".jsonl"):
+        with open(db_path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(row) + "\n" for row in rows)
+    else:
+        db = sqlite3.connect(db_path)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                f"CREATE TABLE IF NOT EXISTS qualification ({', '.join(_COLUMNS)}, "
+                "PRIMARY KEY (lead_id, room))"
+            )
+            with db:
+                db.executemany(
+                    f"INSERT OR REPLACE INTO qualification ({', '.join(_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' for _ in _COLUMNS)})",
+                    [[row.get(c) for c in _COLUMNS] for row in rows],
+                )
+        finally:
+            db.close()
+    for path in finished:
+        os.unlink(path)
+    return len(rows)
+
+
+class QualificationFunctions(EndCallFunctions):
+    """EndCall plus the qualification tools, as one function context"""
+
+    def __init__(
+        self,
+        call: CallControl,
+        record: QualificationRecord,
+        sink: RecordSink,
+        on_fact: Optional[Callable[[str, str], None]] = None,
+        on_callback: Optional[Callable[[str], Optional[str]]] = None,
+    ) -> None:
+        super().__init__(call)
+        self._record = record
+        self._sink = sink
+        self._on_fact = on_fact
+        self._on_callback = on_callback
+        call.add_end_callback(self._on_call_end)
+
+    def _on_call_end(self, reason: str) -> None:
+        self._record.outcome = reason or "ended"
+        self._sink.submit(self._record)
+
+    def _set(self, name: str, value) -> str:
+        setattr(self._record, name, value)
+        self._sink.submit(self._record)
+        if self._on_fact is not None:
+            self._on_fact(name, str(value))
+        logger.info(f"lead {self._record.lead_id}: {name}={value}")
+        return "Noted."
+
+    @llm.ai_callable(description="Called when the homeowner says whether they still own the property.")
+    async def record_ownership(
+        self, owns_property: Annotated[bool, llm.TypeInfo(description="True if they still own it")]
+    ):
+        return self._set("owns_property", owns_property)
+
+    @llm.ai_callable(description="Called when the homeowner says whether they would consider selling now.")
+    async def record_selling_interest(
+        self, open_to_selling: Annotated[bool, llm.TypeInfo(description="True if open to selling")]
+    ):
+        return self._set("open_to_selling", open_to_selling)
+
+    @llm.ai_callable(description="Called when the homeowner confirms or corrects the property address.")
+    async def record_address_confirmed(
+        self, confirmed: Annotated[bool, llm.TypeInfo(description="True if the address on file is right")]
+    ):
+        return self._set("address_confirmed", confirmed)
+
+    @llm.ai_callable(description="Called when the homeowner explains why they want to sell.")
+    async def record_motivation(
+        self, motivation: Annotated[str, llm.TypeInfo(description="Their reason for selling, in a few words")]
+    ):
+        return self._set("motivation", motivation)
+
+    @llm.ai_callable(description="Called when the homeowner says when they hope to have it sold.")
+    async def record_timeline(
+        self, timeline: Annotated[str, llm.TypeInfo(description="e.g. 'next few weeks', 'by summer'")]
+    ):
+        return self._set("timeline", timeline)
+
+    @llm.ai_callable(description="Called when the homeowner gives a ballpark asking price.")
+    async def record_price(
+        self, price: Annotated[str, llm.TypeInfo(description="The dollar amount they mentioned")]
+    ):
+        return self._set("price", price)
+
+    @llm.ai_callable(description="Called when the homeowner says whether they'd list with our realtor.")
+    async def record_listing_openness(
+        self, open_to_listing: Annotated[bool, llm.TypeInfo(description="True if open to listing")]
+    ):
+        return self._set("open_to_listing", open_to_listing)
+
+    @llm.ai_callable(description="Called when the homeowner gives a time for the realtor or us to call back.")
+    async def record_callback_time(
+        self,
+        callback_time: Annotated[str, llm.TypeInfo(description="The time exactly as they said it")],
+        for_realtor: Annotated[
+            bool, llm.TypeInfo(description="True if it's the realtor's call, false if we call them back")
+        ] = False,
+    ):
+        # `on_callback` may return a note for the agent, e.g. that the time moved into calling hours
+        note = self._on_callback(callback_time) if not for_realtor and self._on_callback is not None else None
+        noted = self._set("callback_time", callback_time)
+        return f"{noted} {note}" if note else noted
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Merge the agents' qualification spool into the database")
+    parser.add_argument("command", choices=["merge"])
+    parser.add_argument("--spool", default=os.getenv("QUALIFICATION_SPOOL", DEFAULT_SPOOL))
+    parser.add_argument("--db", default=os.getenv("QUALIFICATION_DB", DEFAULT_DB))
+    parser.add_argument("--watch", type=float, metavar="SECONDS", help="keep merging at this interval")
+    parser.add_argument("--include-live", action="store_true", help="also upsert calls still in progress")
+    args = parser.parse_args()
+
+    while True:
+        merged = merge_spool(args.spool, args.db, args.include_live)
+        if merged or not args.watch:
+            print(f"✅ Merged {merged} call record(s) into {args.db}")
+        if not args.watch:
+            return
+        time.sleep(args.watch)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Scripted answers to the questions callers ask on almost every call.
+
+`IntentMatcher` is built once per worker at prewarm: an inverted index of
+TF-IDF weighted words and word pairs over a few example phrasings per intent.
+Matching a final transcript only touches the index entries of its own words,
+so it costs microseconds. When the caller's turn clearly is one of those
+questions, `before_llm_cb` returns a `ScriptedLLMStream` with the script's
+answer instead of calling the LLM: the pipeline commits the caller's turn and
+the answer to the chat context as usual, and the answer is chunked exactly
+like the warmed lines, so its chunks play from the TTS cache. A reply with
+per-lead `{{field}}` placeholders is warmed with the default values, so put
+those sentences on a line of their own: a line break always ends a chunk,
+and only that line goes to live TTS for a lead with its own values.
+
+Anything long, ambiguous or only loosely similar falls through to the LLM.
+"""
+
+import logging
+import re
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass
+from math import log, sqrt
+from typing import Mapping, Optional
+
+from livekit.agents import DEFAULT_API_CONNECT_OPTIONS, llm
+
+from prompt_template import PromptTemplate
+
+logger = logging.getLogger("response-cache")
+
+_CONTRACTIONS = {
+    "what's": "what is", "who's": "who is", "where's": "where is", "how's": "how is", "it's": "it is",
+    "you're": "you are", "i'm": "i am", "how'd": "how did", "where'd": "where did", "what're": "what are",
+    "that's": "that is",
+}
+_FILLERS = {"um", "uh", "umm", "hmm", "oh", "well", "so", "like", "hey", "okay", "ok", "sorry", "wait", "just", "and"}
+
+
+def _words(text: str) -> list[str]:
+    text = text.lower().replace("’", "'")
+    words = []
+    for word in re.findall(r"[a-z0-9']+", text):
+        words.extend(_CONTRACTIONS.get(word, word).split())
+    return [w for w in words if w not in _FILLERS]
+
+
+def _features(words: list[str]) -> dict[str, float]:
+    counts: dict[str, float] = defaultdict(float)
+    for word in words:
+        counts[word] += 1
+    for pair in zip(words, words[1:]):
+        counts[" ".join(pair)] += 1
+    return counts
+
+
+@dataclass
+class Intent:
+    name: str
+    # a few ways callers phrase the question
+    examples: list[str]
+    # what the script says to it; may use the prompt's {{field}} placeholders
+    reply: str
+
+
+class IntentMatcher:
+    def __init__(
+        self,
+        intents: list[Intent],
+        defaults: Optional[Mapping[str, str]] = None,
+        threshold: float = 0.7,
+        margin: float = 0.15,
+        max_runner_up: float = 0.3,
+        max_words: int = 14,
+    ) -> None:
+        self.intents = intents
+        self._replies = [PromptTemplate(i.reply, defaults=defaults) for i in intents]
+        self._threshold = threshold
+        self._margin = margin
+        self._max_runner_up = max_runner_up
+        self._max_words = max_words
+
+        examples = [(n, _features(_words(text))) for n, intent in enumerate(intents) for text in intent.examples]
+        doc_freq: dict[str, int] = defaultdict(int)
+        for _, feats in examples:
+            for feature in feats:
+                doc_freq[feature] += 1
+        self._idf = {f: log(1 + len(examples) / df) for f, df in doc_freq.items()}
+
+        # feature -> [(example, weight)], every example vector L2-normalized
+        self._index: dict[str, list[tuple[int, float]]] = defaultdict(list)
+        self._example_intent = []
+        for e, (n, feats) in enumerate(examples):
+            weights = {f: c * self._idf[f] for f, c in feats.items()}
+            norm = sqrt(sum(w * w for w in weights.values())) or 1.0
+            for feature, w in weights.items():
+                self._index[feature].append((e, w / norm))
+            self._example_intent.append(n)
+        self.hits = 0
+
+    def warm_lines(self) -> list[str]:
+        """Every reply with the default lead values, for the TTS cache"""
+        return [reply.substitute({}) for reply in self._replies]
+
+    def match(self, text: str) -> Optional[Intent]:
+        words = _words(text)
+        if not words or len(words) > self._max_words:
+            return None
+
+        # words no example uses still count against the match, at the rarest weight
+        unseen = max(self._idf.values(), default=1.0)
+        query = {f: c * self._idf.get(f, unseen) for f, c in _features(words).items()}
+        norm = sqrt(sum(w * w for w in query.values())) or 1.0
+
+        scores: dict[int, float] = defaultdict(float)
+        for feature, w in query.items():
+            for e, ew in self._index.get(feature, ()):
+                scores[e] += w / norm * ew
+
+        best: dict[int, float] = {}
+        for e, score in scores.items():
+            n = self._example_intent[e]
+            best[n] = max(best.get(n, 0.0), score)
+        ranked = sorted(best.items(), key=lambda kv: kv[1], reverse=True)
+        if not ranked or ranked[0][1] < self._threshold:
+            return None
+        if len(ranked) > 1 and (
+            ranked[0][1] - ranked[1][1] < self._margin or ranked[1][1] >= self._max_runner_up
+        ):
+            # close call, or two questions in one turn; the LLM can answer both
+            return None
+        return self.intents[ranked[0][0]]
+
+    def reply_for(self, chat_ctx: llm.ChatContext, lead: Mapping[str, str]) -> Optional[str]:
+        """The scripted reply to the caller's last turn, or None to let the LLM answer"""
+        if not chat_ctx.messages or chat_ctx.messages[-1].role != "user":
+            return None
+        text = chat_ctx.messages[-1].content
+        if not isinstance(text, str):
+            return None
+        intent = self.match(text)
+        if intent is None:
+            return None
+        self.hits += 1
+        logger.info(f"scripted answer for {intent.name!r}: {text!r}")
+        return self._replies[self.intents.index(intent)].substitute(lead)
+
+
+class ScriptedLLMStream(llm.LLMStream):
+    """An LLM stream that yields a fixed reply without calling the provider"""
+
+    def __init__(self, owner: llm.LLM, *, chat_ctx: llm.ChatContext, reply: str) -> None:
+        super().__init__(owner, chat_ctx=chat_ctx, fnc_ctx=None, conn_options=DEFAULT_API_CONNECT_OPTIONS)
+        self._reply = reply
+
+    async def _run(self) -> None:
+        self._event_ch.send_nowait(
+            llm.ChatChunk(
+                request_id=uuid.uuid4().hex,
+                choices=[llm.Choice(delta=llm.ChoiceDelta(role="assistant", content=self._reply))],
+            )
+        )
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Room-per-call allocation.
+
+Every outbound call gets its own room, named from the lead id plus a time,
+counter and random suffix so two calls never share a room (and an agent), even
+when they start in the same millisecond from different dialer processes. Rooms
+are created up front with the lead as room metadata and with empty/departure
+timeouts, so the server closes them soon after the call ends.
+`RoomAllocator.collect_garbage()` deletes call rooms left behind by crashed
+dialers or agents in one concurrent sweep:
+
+    python room_allocator.py gc --dry-run
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import re
+import secrets
+import time
+from typing import Optional
+
+from dotenv import load_dotenv
+from livekit import api
+from livekit.protocol.models import ParticipantInfo
+
+from livekit_client import close_api, get_api
+
+load_dotenv()
+
+logger = logging.getLogger("room-allocator")
+
+ROOM_PREFIX = "call"
+
+# rooms created by make_call.py, the campaign dialer and SIPCallManager, new and old naming
+CALL_ROOM_PREFIXES = ("call-", "outbound-", "real-estate")
+
+_counter = itertools.count()
+
+
+def new_room_name(lead_id: Optional[str] = None, prefix: str = ROOM_PREFIX) -> str:
+    """`call-<lead>-<ms><counter>-<random>`, unique across processes"""
+    slug = re.sub(r"[^A-Za-z0-9_]+", "-", str(lead_id)).strip("-")[:32] if lead_id else "adhoc"
+    stamp = f"{int(time.time() * 1000):x}{next(_counter) % 4096:03x}"
+    return f"{prefix}-{slug}-{stamp}-{secrets.token_hex(3)}"
+
+
+class RoomAllocator:
+    def __init__(
+        self,
+        lkapi,
+        prefix: str = ROOM_PREFIX,
+        empty_timeout: int = 60,
+        departure_timeout: int = 20,
+        max_participants: int = 4,
+    ) -> None:
+        self._lkapi = lkapi
+        self._prefix = prefix
+        self._empty_timeout = empty_timeout
+        self._departure_timeout = departure_timeout
+        self._max_participants = max_participants
+
+    async def allocate(self, lead_id: Optional[str] = None, metadata: Optional[dict] = None) -> str:
+        """Create a fresh room for one call and return its name"""
+        name = new_room_name(lead_id, self._prefix)
+        room_metadata = {"lead_id": lead_id, **(metadata or {})} if lead_id else (metadata or {})
+        await self._lkapi.room.create_room(
+            api.CreateRoomRequest(
+                name=name,
+                # close the room shortly after the call, not after the server default of minutes
+                empty_timeout=self._empty_timeout,
+                departure_timeout=self._departure_timeout,
+                max_participants=self._max_participants,
+                metadata=json.dumps(room_metadata),
+            )
+        )
+        return name
+
+    async def collect_garbage(
+        self,
+        grace: float = 120.0,
+        max_age: float = 900.0,
+        concurrency: int = 20,
+        dry_run: bool = False,
+    ) -> list[str]:
+        """Delete call rooms without a phone participant, and any call room older than `max_age`"""
+        now = time.time()
+        res = await self._lkapi.room.list_rooms(api.ListRoomsRequest())
+        candidates = [
+            r for r in res.rooms
+            if r.name.startswith(CALL_ROOM_PREFIXES) and now - r.creation_time > grace
+        ]
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def is_orphan(room) -> bool:
+            if room.num_participants == 0 or now - room.creation_time > max_age:
+                return True
+            async with semaphore:
+                try:
+                    participants = await self._lkapi.room.list_participants(
+                        api.ListParticipantsRequest(room=room.name)
+                    )
+                except Exception:
+                    return False
+            # an agent alone in a room is waiting for a caller that is never coming
+            return not any(p.kind == ParticipantInfo.Kind.SIP for p in participants.participants)
+
+        flags = await asyncio.gather(*(is_orphan(r) for r in candidates))
+        orphans = [r.name for r, orphan in zip(candidates, flags) if orphan]
+
+        if not dry_run:
+            async def delete(name: str) -> None:
+                async with semaphore:
+                    try:
+                        await self._lkapi.room.delete_room(api.DeleteRoomRequest(room=name))
+                    except Exception as e:
+                        logger.warning(f"failed to delete room {name}: {e}")
+
+            await asyncio.gather(*(delete(name) for name in orphans))
+
+        logger.info(f"{'found' if dry_run else 'deleted'} {len(orphans)} orphaned call room(s)")
+        return orphans
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Manage per-call rooms")
+    sub = parser.add_subparsers(dest="command", required=True)
+    gc = sub.add_parser("gc", help="delete orphaned call rooms")
+    gc.add_argument("--grace", type=float, default=120.0, help="ignore rooms younger than this (s)")
+    gc.add_argument("--max-age", type=float, default=900.0, help="delete any call room older than this (s)")
+    gc.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        orphans = await RoomAllocator(get_api()).collect_garbage(
+            grace=args.grace, max_age=args.max_age, dry_run=args.dry_run
+        )
+        for name in orphans:
+            print(f"🧹 {name}")
+        print(f"✅ {len(orphans)} orphaned room(s){' (dry run)' if args.dry_run else ' deleted'}")
+    finally:
+        await close_api()
+
+if __name__ == "__main__":
+    asyncio.run(main())
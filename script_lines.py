@@ -0,0 +1,62 @@
+"""
+Fixed lines of the real estate calling script.
+
+These are spoken word-for-word on every call, so they can be synthesized once
+and replayed from the TTS cache instead of going through TTS each time.
+"""
+
+GREETING = (
+    "Hi, this is Elliott — I'm with a local realtor. I was checking your property. "
+    "Do you still own that by any chance?"
+)
+
+QUALIFICATION_INTRO = "Great — just a couple quick questions so we can match you with the right buyer."
+
+WHO_WE_ARE = (
+    "I'm an individual — not with a specific company — but I work directly with a few trusted agents "
+    "from firms like Compass and Keller Williams."
+)
+
+# {{realtor_name}} is filled in per call, like in the prompt, so this one is synthesized live
+CURRENT_AGENT = "The current agent I’m working with is {{realtor_name}}."
+
+RETURN_TO_SCRIPT = "So just confirming — are you open to selling your property right now?"
+
+HOW_DID_YOU_GET_MY_NUMBER = (
+    "We use public property records and real estate databases to reach out to homeowners."
+)
+
+NO_VALUATIONS = (
+    "I do not make offers or give our property valuations as I am not the expert. "
+    "That’s something our team goes over with homeowners who are open to selling now."
+)
+
+ASK_CALLBACK_TIME = "Totally understood — What's the best time to call you back?"
+
+CALLBACK_CONFIRMED = "sounds good, I will call you then. Take care"
+
+ALREADY_LISTED = "Totally understood — good luck with selling it. Thanks for your time!"
+
+REMOVE_FROM_LIST = "Understood — we'll remove you from our list."
+
+CLOSING = "Thanks again for your time. Take care!"
+
+VOICEMAIL_MESSAGE = (
+    "Hi, this is Elliott — I'm with a local realtor, calling about your property. "
+    "I'll try you again another time."
+)
+
+# every line above, in the order they usually come up on a call
+FIXED_LINES = [
+    GREETING,
+    QUALIFICATION_INTRO,
+    RETURN_TO_SCRIPT,
+    HOW_DID_YOU_GET_MY_NUMBER,
+    NO_VALUATIONS,
+    ASK_CALLBACK_TIME,
+    CALLBACK_CONFIRMED,
+    ALREADY_LISTED,
+    REMOVE_FROM_LIST,
+    CLOSING,
+    VOICEMAIL_MESSAGE,
+]
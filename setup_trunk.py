@@ -1,49 +1,44 @@
 import asyncio
 import os
 from dotenv import load_dotenv
-from livekit import api
-from livekit.protocol.sip import CreateSIPOutboundTrunkRequest, SIPOutboundTrunkInfo
+
+from caller_id_pool import parse_weighted
+from livekit_client import close_api, get_api
+from trunk_registry import TrunkRegistry, parse_list, update_env_file
 
 load_dotenv()
 
 async def create_outbound_trunk():
     """Create SIP outbound trunk for making calls"""
     
-    lkapi = api.LiveKitAPI(
-        url=os.getenv("LIVEKIT_URL"),
-        api_key=os.getenv("LIVEKIT_API_KEY"),
-        api_secret=os.getenv("LIVEKIT_API_SECRET")
-    )
-
-    # Create trunk configuration
-    trunk = SIPOutboundTrunkInfo(
-        name="Outbound Calling Trunk",
-        address="sip.telnyx.com",  # You'll need to update this with your SIP provider
-        numbers=["+13082514678"],  # Your outbound calling number
-        auth_username=os.getenv("SIP_USERNAME", "your_sip_username"),
-        auth_password=os.getenv("SIP_PASSWORD", "your_sip_password")
-    )
-
-    request = CreateSIPOutboundTrunkRequest(trunk=trunk)
+    lkapi = get_api()
+    registry = TrunkRegistry(lkapi)
+
+    # Every caller ID the campaign dials from; numbers already on a trunk are reused
+    numbers = list(parse_weighted(parse_list(os.getenv("SIP_FROM_NUMBERS")) or ["+13082514678"]))
 
     try:
-        created_trunk = await lkapi.sip.create_sip_outbound_trunk(request)
-        print(f"Successfully created trunk: {created_trunk.sip_trunk_id}")
-        print(f"Trunk name: {created_trunk.name}")
-        print(f"Trunk address: {created_trunk.address}")
-        print(f"Trunk numbers: {created_trunk.numbers}")
-        
-        # Save trunk ID to environment file
-        with open('.env', 'a') as f:
-            f.write(f"\nSIP_OUTBOUND_TRUNK_ID={created_trunk.sip_trunk_id}\n")
-        
-        return created_trunk.sip_trunk_id
-        
+        routes = await registry.ensure_trunk(
+            numbers,
+            name="Outbound Calling Trunk",
+            address=os.getenv("SIP_PROVIDER_ADDRESS", "sip.telnyx.com"),  # You'll need to update this with your SIP provider
+            auth_username=os.getenv("SIP_USERNAME", "your_sip_username"),
+            auth_password=os.getenv("SIP_PASSWORD", "your_sip_password")
+        )
+        for route in routes:
+            print(f"Number {route.number} -> trunk {route.trunk_id}")
+
+        # Save trunk IDs to environment file, replacing any previous entry
+        trunk_ids = ",".join(dict.fromkeys(route.trunk_id for route in routes))
+        update_env_file("SIP_OUTBOUND_TRUNK_ID", trunk_ids)
+
+        return trunk_ids
+
     except Exception as e:
         print(f"Error creating trunk: {e}")
         return None
     finally:
-        await lkapi.aclose()
+        await close_api()
 
 if __name__ == "__main__":
     asyncio.run(create_outbound_trunk())
@@ -3,8 +3,8 @@
 SIP-specific agent for real estate calls
 """
 
-import asyncio
 import logging
+import os
 from livekit import rtc
 from livekit.agents import (
     AutoSubscribe,
@@ -14,37 +14,65 @@ from livekit.agents import (
     llm,
 )
 from livekit.agents.voice_assistant import VoiceAssistant
-from livekit.plugins import deepgram, openai, silero
 from dotenv import load_dotenv
 
+from barge_in import BargeInController
+from call_control import CallControl, EndCallFunctions
+from call_start import CallStart
+from prompt_template import parse_metadata
+from script_lines import FIXED_LINES, GREETING
+from speech_chunker import chunked_tts
+from stt_tap import TappedSTT
+from turn_metrics import TimedTTS, TurnTimer
+from worker_load import WorkerLoad, report_loop_lag
+from worker_prewarm import PluginConfig, get_plugins, make_prewarm, start_connection_warmup
+
 load_dotenv()
 
 logger = logging.getLogger("sip-agent")
 logger.setLevel(logging.INFO)
 
-def prewarm(proc: JobContext):
-    """Prewarm the agent"""
-    proc.shutdown()
+PLUGIN_CONFIG = PluginConfig(
+    stt_model="nova-2",
+    llm_model="gpt-4o-mini",
+    tts_voice="alloy",
+    cached_lines=FIXED_LINES,
+    # narrowband audio end to end; turn off when testing from a browser
+    telephony=os.getenv("TELEPHONY_AUDIO", "true").lower() == "true",
+)
+prewarm = make_prewarm(PLUGIN_CONFIG)
+
 
-@cli.job_process
 async def entrypoint(ctx: JobContext):
     """Main entrypoint for SIP calls"""
     
     logger.info(f"🎯 SIP Agent starting for room: {ctx.room.name}")
     
+    plugins = get_plugins(ctx.proc, PLUGIN_CONFIG)
+    start_connection_warmup(ctx.proc)
+    report_loop_lag(ctx)
+
     # Connect to room first
     await ctx.connect(auto_subscribe=AutoSubscribe.AUDIO_ONLY)
     logger.info("✅ Connected to room")
     
     # Wait for participants
     logger.info("⏳ Waiting for participants...")
-    
+    participant = await ctx.wait_for_participant()
+    call_start = CallStart(ctx.room, participant)
+    call = CallControl(ctx, participant.identity)
+    lead_id = parse_metadata(participant.metadata).get("lead_id", participant.identity)
+    timer = TurnTimer(ctx.room.name, lead_id, variant="sip_agent")
+    barge_in = BargeInController(ctx.room.name, lead_id, variant="sip_agent", samples=timer.samples)
+    ctx.add_shutdown_callback(timer.samples.flush)
+    stt = TappedSTT(plugins.stt)
+
     # Create the voice assistant
     assistant = VoiceAssistant(
-        vad=silero.VAD.load(),
-        stt=deepgram.STT(model="nova-2"),
-        llm=openai.LLM(model="gpt-4o-mini"),
-        tts=openai.TTS(voice="alloy"),
+        vad=plugins.vad,
+        stt=stt,
+        llm=plugins.llm,
+        tts=chunked_tts(TimedTTS(plugins.tts, timer), plugins.chunker),
         chat_ctx=llm.ChatContext().append(
             role="system",
             text=(
@@ -53,30 +81,26 @@ async def entrypoint(ctx: JobContext):
                 "Do NOT sound overly friendly. Stay neutral, concise, and direct. "
                 "Start with: 'Hi, this is Elliott — I'm with a local realtor. I was checking your property. Do you still own that by any chance?' "
                 "If they say YES to owning: 'Got it, with the home prices being so high right now would you consider selling at this time?' "
-                "If they say NO to selling: End the call politely. "
+                "If they say NO to selling: End the call politely, then use the EndCall tool. "
                 "If they say YES to selling: Ask qualification questions about timeline, price, and motivation. "
-                "Handle common objections professionally and end calls when appropriate."
+                "Handle common objections professionally and end calls with the EndCall tool when appropriate."
             ),
         ),
+        fnc_ctx=EndCallFunctions(call),
+        before_tts_cb=timer.before_tts,
+        **barge_in.assistant_options(),
     )
+    barge_in.attach(assistant)
+    call.attach(assistant)
+    timer.attach(assistant, stt)
 
     # Start the assistant
-    assistant.start(ctx.room)
+    assistant.start(ctx.room, participant)
     
     # Monitor for participants
     @ctx.room.on("participant_connected")
     def on_participant_connected(participant: rtc.RemoteParticipant):
         logger.info(f"📞 Participant joined: {participant.identity}")
-        
-        # Start conversation immediately when SIP participant joins
-        if not participant.identity.startswith("agent-"):
-            logger.info("🗣️  Starting conversation with SIP participant")
-            asyncio.create_task(
-                assistant.say(
-                    "Hi, this is Elliott — I'm with a local realtor. I was checking your property. Do you still own that by any chance?",
-                    allow_interruptions=True
-                )
-            )
 
     @ctx.room.on("participant_disconnected")
     def on_participant_disconnected(participant: rtc.RemoteParticipant):
@@ -85,18 +109,18 @@ async def entrypoint(ctx: JobContext):
     # Keep the agent running
     logger.info("🎯 SIP Agent ready and waiting for calls...")
     
-    # Initial greeting after a short delay
-    await asyncio.sleep(3)
-    logger.info("🗣️  Sending initial greeting")
-    await assistant.say(
-        "Hi, this is Elliott — I'm with a local realtor. I was checking your property. Do you still own that by any chance?",
-        allow_interruptions=True
-    )
+    # Initial greeting as soon as the callee answers
+    await call_start.greet(assistant, GREETING)
+    logger.info("🗣️  Sent initial greeting")
 
 if __name__ == "__main__":
+    load = WorkerLoad.from_env()
     cli.run_app(
         WorkerOptions(
             entrypoint_fnc=entrypoint,
             prewarm_fnc=prewarm,
+            request_fnc=load.request_fnc,
+            load_fnc=load.load_fnc,
+            load_threshold=load.threshold,
         ),
     )
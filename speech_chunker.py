@@ -0,0 +1,229 @@
+"""
+LLM-to-TTS text chunking tuned for phone calls.
+
+`PhoneChunkTokenizer` is the sentence tokenizer the TTS stream adapter uses to
+decide when streamed LLM text is sent to TTS. The first chunk of a reply goes
+out at the first clause boundary after a few words ("Oh, I see, ..."), so the
+caller hears audio while the LLM is still generating; later chunks wait for at
+least `min_chunk_chars`, so a reply costs fewer TTS requests. Chunks only end
+at clause or sentence boundaries: when the first one has none within
+`first_chunk_max_chars`, it waits for the next boundary, and text is cut at a
+word only past `first_chunk_hard_max_chars` (or `max_chunk_chars` later on).
+A line break always ends a chunk. Numbers, prices
+and street addresses are rewritten for speech once per chunk.
+
+Chunking only depends on the text, not on how it was streamed, so
+`tokenize()` of a full line yields exactly the chunks a streamed reply with the
+same text produces; the TTS cache is warmed with those.
+"""
+
+import re
+from typing import Optional
+
+from livekit.agents import tokenize, tts, utils
+
+# punctuation followed by whitespace, so "$450,000" or "3.5" never split
+_BOUNDARY = re.compile(r"[,;:—](?=\s)|[.!?]+[\"')\]]*(?=\s)")
+_ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "st", "ave", "blvd", "rd", "ln", "ct", "apt", "jr", "sr", "no", "vs", "etc",
+}
+
+
+class _Chunker:
+    def __init__(
+        self,
+        first_chunk_words: int,
+        first_chunk_max_chars: int,
+        first_chunk_hard_max_chars: int,
+        min_chunk_chars: int,
+        max_chunk_chars: int,
+    ) -> None:
+        self._first_chunk_words = first_chunk_words
+        self._first_chunk_max_chars = first_chunk_max_chars
+        self._first_chunk_hard_max_chars = first_chunk_hard_max_chars
+        self._min_chunk_chars = min_chunk_chars
+        self._max_chunk_chars = max_chunk_chars
+        self._buf = ""
+        self._emitted = 0
+
+    def push(self, text: str) -> list[str]:
+        self._buf += text
+        chunks = []
+        while (chunk := self._next()) is not None:
+            chunks.append(chunk)
+        return chunks
+
+    def flush(self) -> Optional[str]:
+        """Whatever is left of the reply; the next push starts a new reply"""
+        chunk = self._buf.strip()
+        self._buf = ""
+        self._emitted = 0
+        return chunk or None
+
+    def _next(self) -> Optional[str]:
+        self._buf = self._buf.lstrip()
+        first = self._emitted == 0
+        max_chars = self._first_chunk_hard_max_chars if first else self._max_chunk_chars
+        newline = self._buf.find("\n")
+        limit = min(max_chars, newline) if newline >= 0 else max_chars
+
+        for m in _BOUNDARY.finditer(self._buf):
+            end = m.end()
+            if end > limit:
+                break
+            if m.group().startswith("."):
+                word = re.search(r"(\w+)$", self._buf[: m.start()])
+                if word and word.group(1).lower() in _ABBREVIATIONS:
+                    continue
+            head = self._buf[:end]
+            if first:
+                # a clause of a few words goes out right away; past first_chunk_max_chars
+                # any boundary will do, it's still better than cutting mid-clause
+                long_enough = len(head.split()) >= self._first_chunk_words or end > self._first_chunk_max_chars
+            else:
+                long_enough = len(head) >= self._min_chunk_chars
+            if long_enough:
+                return self._take(end)
+
+        if 0 <= newline <= max_chars:
+            # a line break in the text ends a chunk however short it is
+            return self._take(newline)
+        if len(self._buf) > max_chars:
+            # no usable punctuation, cut at the last word that fits
+            cut = self._buf.rfind(" ", 0, max_chars)
+            if cut > 0:
+                return self._take(cut)
+        return None
+
+    def _take(self, end: int) -> str:
+        chunk, self._buf = self._buf[:end].strip(), self._buf[end:].lstrip()
+        self._emitted += 1
+        return chunk
+
+
+_PRICE = re.compile(r"\$\s?(\d[\d,]*(?:\.\d+)?)(?:\s*(k|m|thousand|million)\b)?", re.IGNORECASE)
+_MAGNITUDES = {"k": 1_000, "thousand": 1_000, "m": 1_000_000, "million": 1_000_000}
+
+_STREET_SUFFIXES = {
+    "St": "Street", "Ave": "Avenue", "Blvd": "Boulevard", "Rd": "Road", "Dr": "Drive", "Ln": "Lane",
+    "Ct": "Court", "Pl": "Place", "Pkwy": "Parkway", "Hwy": "Highway", "Cir": "Circle", "Ter": "Terrace",
+}
+_DIRECTIONS = {"N": "North", "S": "South", "E": "East", "W": "West"}
+_STREET = re.compile(
+    r"\b(\d{1,5})\s+((?:[NSEW]\.?\s+)?(?:[A-Z][\w']*\s+){1,3}?)(%s)\b\.?" % "|".join(_STREET_SUFFIXES)
+)
+_ZIP = re.compile(r"\b([A-Z]{2})\s+(\d{5})(?:-\d{4})?\b")
+_UNIT = re.compile(r"(?:\bApt\.?|#)\s*(\w+)")
+
+
+def _say_amount(value: float) -> str:
+    if value >= 1_000_000:
+        return f"{round(value / 1_000_000, 2):g} million"
+    if value >= 1_000:
+        thousands, rest = divmod(int(value), 1_000)
+        return f"{thousands} thousand" + (f" {rest}" if rest else "")
+    return f"{value:g}"
+
+
+def _say_price(m: re.Match) -> str:
+    value = float(m.group(1).replace(",", ""))
+    value *= _MAGNITUDES.get((m.group(2) or "").lower(), 1)
+    return f"{_say_amount(value)} dollars"
+
+
+def _say_pair(digits: str) -> str:
+    # "05" -> "oh 5", "00" -> "hundred", "34" -> "34"
+    if digits == "00":
+        return "hundred"
+    if digits.startswith("0"):
+        return f"oh {digits[1]}"
+    return digits
+
+
+def _say_house_number(number: str) -> str:
+    """House numbers the way people say them: 1234 -> "12 34", 512 -> "5 12" """
+    if len(number) == 4:
+        return f"{number[:2]} {_say_pair(number[2:])}"
+    if len(number) == 3 and number[1:] != "00":
+        return f"{number[0]} {_say_pair(number[1:])}"
+    return number
+
+
+def _say_street(m: re.Match) -> str:
+    name = m.group(2)
+    direction = re.match(r"([NSEW])\.?\s+", name)
+    if direction:
+        name = _DIRECTIONS[direction.group(1)] + " " + name[direction.end():]
+    return f"{_say_house_number(m.group(1))} {name}{_STREET_SUFFIXES[m.group(3)]}"
+
+
+def normalize_for_speech(text: str) -> str:
+    """Rewrite prices, street addresses, units and ZIP codes so TTS reads them naturally"""
+    text = _PRICE.sub(_say_price, text)
+    text = _STREET.sub(_say_street, text)
+    text = _UNIT.sub(lambda m: f"unit {m.group(1)}", text)
+    text = _ZIP.sub(lambda m: f"{m.group(1)} {' '.join(m.group(2))}", text)
+    return text
+
+
+class PhoneChunkTokenizer(tokenize.SentenceTokenizer):
+    def __init__(
+        self,
+        *,
+        first_chunk_words: int = 4,
+        first_chunk_max_chars: int = 60,
+        first_chunk_hard_max_chars: int = 140,
+        min_chunk_chars: int = 60,
+        max_chunk_chars: int = 220,
+        normalize: bool = True,
+    ) -> None:
+        self._opts = (
+            first_chunk_words, first_chunk_max_chars, first_chunk_hard_max_chars, min_chunk_chars, max_chunk_chars
+        )
+        self._normalize = normalize_for_speech if normalize else (lambda text: text)
+
+    def tokenize(self, text: str, *, language: Optional[str] = None) -> list[str]:
+        chunker = _Chunker(*self._opts)
+        chunks = chunker.push(text)
+        tail = chunker.flush()
+        if tail:
+            chunks.append(tail)
+        return [self._normalize(chunk) for chunk in chunks]
+
+    def stream(self, *, language: Optional[str] = None) -> "_ChunkStream":
+        return _ChunkStream(_Chunker(*self._opts), self._normalize)
+
+
+class _ChunkStream(tokenize.SentenceStream):
+    def __init__(self, chunker: _Chunker, normalize) -> None:
+        super().__init__()
+        self._chunker = chunker
+        self._normalize = normalize
+        self._segment_id = utils.shortuuid()
+
+    def push_text(self, text: str) -> None:
+        for chunk in self._chunker.push(text):
+            self._send(chunk)
+
+    def flush(self) -> None:
+        tail = self._chunker.flush()
+        if tail:
+            self._send(tail)
+        self._segment_id = utils.shortuuid()
+
+    def end_input(self) -> None:
+        self.flush()
+        self._event_ch.close()
+
+    async def aclose(self) -> None:
+        self._event_ch.close()
+
+    def _send(self, chunk: str) -> None:
+        self._event_ch.send_nowait(tokenize.TokenData(segment_id=self._segment_id, token=self._normalize(chunk)))
+
+
+def chunked_tts(wrapped, tokenizer: Optional[PhoneChunkTokenizer]):
+    """Feed streamed LLM text to a non-streaming TTS chunk by chunk; no-op without a tokenizer"""
+    if tokenizer is None:
+        return wrapped
+    return tts.StreamAdapter(tts=wrapped, sentence_tokenizer=tokenizer)
@@ -0,0 +1,68 @@
+"""
+Read-only tap on a streaming STT plugin.
+
+`TappedSTT` wraps an STT plugin and hands every audio frame pushed into its
+streams, and every speech event coming out of them (interim transcripts
+included), to registered listeners. Everything else is delegated, so the voice
+pipeline uses it exactly like the plugin it wraps.
+"""
+
+import logging
+from typing import Callable
+
+from livekit import rtc
+from livekit.agents import stt
+
+logger = logging.getLogger("stt-tap")
+
+FrameListener = Callable[[rtc.AudioFrame], None]
+EventListener = Callable[[stt.SpeechEvent], None]
+
+
+class _TappedSpeechStream:
+    def __init__(self, wrapped, tap: "TappedSTT") -> None:
+        self._wrapped = wrapped
+        self._tap = tap
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def push_frame(self, frame: rtc.AudioFrame) -> None:
+        for listener in self._tap.frame_listeners:
+            try:
+                listener(frame)
+            except Exception:
+                logger.exception("stt frame listener failed")
+        self._wrapped.push_frame(frame)
+
+    def __aiter__(self) -> "_TappedSpeechStream":
+        return self
+
+    async def __anext__(self) -> stt.SpeechEvent:
+        ev = await self._wrapped.__anext__()
+        for listener in self._tap.event_listeners:
+            try:
+                listener(ev)
+            except Exception:
+                logger.exception("stt event listener failed")
+        return ev
+
+    async def __aenter__(self) -> "_TappedSpeechStream":
+        await self._wrapped.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self._wrapped.__aexit__(*exc)
+
+
+class TappedSTT:
+    def __init__(self, wrapped: stt.STT) -> None:
+        self._wrapped = wrapped
+        self.frame_listeners: list[FrameListener] = []
+        self.event_listeners: list[EventListener] = []
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def stream(self, *args, **kwargs) -> _TappedSpeechStream:
+        return _TappedSpeechStream(self._wrapped.stream(*args, **kwargs), self)
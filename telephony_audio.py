@@ -0,0 +1,230 @@
+"""
+Narrowband (8 kHz) audio path for phone calls.
+
+SIP calls carry G.711 audio, so anything above 4 kHz is thrown away at the
+gateway anyway. In telephony mode the STT receives 8 kHz audio (Deepgram is
+told the native rate, so it doesn't resample again) and TTS output is reduced
+to 8 kHz before it is published, which cuts the per-frame work of every call.
+
+OpenAI TTS only produces 24 kHz audio and the pipeline's input stream is
+wideband, so the remaining conversions are integer-ratio decimations
+(24k -> 8k, 48k -> 8k) done by `Decimator`: a fixed low-pass FIR whose working
+buffers are allocated once per stream (TTS reuses decimators across
+syntheses). One allocation per output frame remains, and is deliberate:
+`rtc.AudioFrame` copies the samples into its own buffer when it is created,
+and frames sit in the playout and STT queues for an unknown time, so they
+can't be drawn from a recycled pool. The decimator hands its reused buffer
+straight to that copy instead of making another one first.
+"""
+
+import dataclasses
+import logging
+from typing import Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+from livekit import rtc
+from livekit.agents import stt
+
+logger = logging.getLogger("telephony-audio")
+
+TELEPHONY_SAMPLE_RATE = 8000
+
+
+class Decimator:
+    """Streaming low-pass + downsample by an integer factor, mono int16 in and out"""
+
+    def __init__(self, in_rate: int, out_rate: int = TELEPHONY_SAMPLE_RATE, max_frame_samples: int = 4800) -> None:
+        if in_rate % out_rate:
+            raise ValueError(f"can't decimate {in_rate} Hz to {out_rate} Hz by an integer factor")
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.factor = in_rate // out_rate
+
+        n_taps = 8 * self.factor + 1
+        t = np.arange(n_taps) - (n_taps - 1) / 2
+        cutoff = 0.45 / self.factor  # 90% of the output Nyquist, relative to the input rate
+        taps = 2 * cutoff * np.sinc(2 * cutoff * t) * np.hamming(n_taps)
+        self._taps = (taps / taps.sum()).astype(np.float32)
+        self._n_taps = n_taps
+
+        # [filter history | samples carried over | new frame]
+        capacity = n_taps + self.factor + max_frame_samples
+        self._work = np.zeros(capacity, dtype=np.float32)
+        self._scratch = np.zeros(n_taps + self.factor, dtype=np.float32)
+        self._out = np.zeros(capacity // self.factor + 1, dtype=np.float32)
+        self._out_i16 = np.zeros(capacity // self.factor + 1, dtype=np.int16)
+        self.reset()
+
+    def reset(self) -> None:
+        """Start over on silence, for a new stream"""
+        self._work[: self._n_taps - 1] = 0
+        self._filled = self._n_taps - 1
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """Decimate one frame; the returned view is overwritten by the next call"""
+        n = len(samples)
+        if self._filled + n > len(self._work):
+            raise ValueError(f"frame of {n} samples exceeds the preallocated buffer")
+        np.copyto(self._work[self._filled:self._filled + n], samples, casting="unsafe")
+        self._filled += n
+
+        n_out = (self._filled - self._n_taps) // self.factor + 1
+        if n_out <= 0:
+            return self._out_i16[:0]
+
+        itemsize = self._work.itemsize
+        windows = as_strided(self._work, shape=(n_out, self._n_taps), strides=(self.factor * itemsize, itemsize))
+        out = self._out[:n_out]
+        np.dot(windows, self._taps, out=out)
+        np.clip(out, -32768, 32767, out=out)
+        np.copyto(self._out_i16[:n_out], out, casting="unsafe")
+
+        # keep what the next output sample still needs
+        consumed = n_out * self.factor
+        keep = self._filled - consumed
+        np.copyto(self._scratch[:keep], self._work[consumed:self._filled])
+        np.copyto(self._work[:keep], self._scratch[:keep])
+        self._filled = keep
+        return self._out_i16[:n_out]
+
+    def frame(self, frame: rtc.AudioFrame) -> rtc.AudioFrame:
+        samples = np.frombuffer(frame.data, dtype=np.int16)
+        out = self.process(samples)
+        return rtc.AudioFrame(
+            # AudioFrame copies `data` into its own buffer, so passing the reused one is safe
+            data=memoryview(out).cast("B"),
+            sample_rate=self.out_rate,
+            num_channels=1,
+            samples_per_channel=len(out),
+        )
+
+
+def _decimator_for(frame: rtc.AudioFrame, out_rate: int) -> Optional[Decimator]:
+    if frame.num_channels != 1 or frame.sample_rate == out_rate or frame.sample_rate % out_rate:
+        # leave it to the plugin's own resampler
+        return None
+    return Decimator(frame.sample_rate, out_rate, max_frame_samples=max(4800, frame.samples_per_channel))
+
+
+class _NarrowbandSpeechStream:
+    def __init__(self, wrapped, out_rate: int) -> None:
+        self._wrapped = wrapped
+        self._out_rate = out_rate
+        self._decimator: Optional[Decimator] = None
+        self._in_rate: Optional[int] = None
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def push_frame(self, frame: rtc.AudioFrame) -> None:
+        if frame.sample_rate != self._in_rate:
+            self._in_rate = frame.sample_rate
+            self._decimator = _decimator_for(frame, self._out_rate)
+        if self._decimator is not None:
+            frame = self._decimator.frame(frame)
+        self._wrapped.push_frame(frame)
+
+    def __aiter__(self) -> "_NarrowbandSpeechStream":
+        return self
+
+    async def __anext__(self) -> stt.SpeechEvent:
+        return await self._wrapped.__anext__()
+
+    async def __aenter__(self) -> "_NarrowbandSpeechStream":
+        await self._wrapped.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self._wrapped.__aexit__(*exc)
+
+
+class NarrowbandSTT:
+    """Feeds a streaming STT plugin 8 kHz audio; configure the plugin for the same rate"""
+
+    def __init__(self, wrapped: stt.STT, sample_rate: int = TELEPHONY_SAMPLE_RATE) -> None:
+        self._wrapped = wrapped
+        self._sample_rate = sample_rate
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def stream(self, *args, **kwargs) -> _NarrowbandSpeechStream:
+        return _NarrowbandSpeechStream(self._wrapped.stream(*args, **kwargs), self._sample_rate)
+
+
+class _NarrowbandChunkedStream:
+    def __init__(self, wrapped, tts: "NarrowbandTTS") -> None:
+        self._wrapped = wrapped
+        self._tts = tts
+        self._decimator = tts._acquire_decimator()
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def _release(self) -> None:
+        if self._decimator is not None:
+            self._tts._release_decimator(self._decimator)
+            self._decimator = None
+
+    def __aiter__(self) -> "_NarrowbandChunkedStream":
+        return self
+
+    async def __anext__(self):
+        try:
+            audio = await self._wrapped.__anext__()
+        except StopAsyncIteration:
+            self._release()
+            raise
+        if self._decimator is None:
+            return audio
+        return dataclasses.replace(audio, frame=self._decimator.frame(audio.frame))
+
+    async def aclose(self) -> None:
+        self._release()
+        await self._wrapped.aclose()
+
+    async def __aenter__(self) -> "_NarrowbandChunkedStream":
+        if hasattr(self._wrapped, "__aenter__"):
+            await self._wrapped.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._release()
+        if hasattr(self._wrapped, "__aexit__"):
+            await self._wrapped.__aexit__(*exc)
+
+
+class NarrowbandTTS:
+    """Reports and yields 8 kHz audio for a TTS plugin with a higher, integer-multiple rate"""
+
+    def __init__(self, wrapped, sample_rate: int = TELEPHONY_SAMPLE_RATE) -> None:
+        self._wrapped = wrapped
+        self._enabled = wrapped.num_channels == 1 and wrapped.sample_rate % sample_rate == 0
+        self._sample_rate = sample_rate if self._enabled else wrapped.sample_rate
+        # decimators of finished syntheses, reused so a reply doesn't allocate filter buffers
+        self._idle: list[Decimator] = []
+        if not self._enabled:
+            logger.warning(f"TTS at {wrapped.sample_rate} Hz can't be decimated to {sample_rate} Hz, leaving it")
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    @property
+    def sample_rate(self) -> int:
+        return self._sample_rate
+
+    def _acquire_decimator(self) -> Optional[Decimator]:
+        if not self._enabled:
+            return None
+        if self._idle:
+            return self._idle.pop()
+        return Decimator(self._wrapped.sample_rate, self._sample_rate)
+
+    def _release_decimator(self, decimator: Decimator) -> None:
+        decimator.reset()
+        self._idle.append(decimator)
+
+    def synthesize(self, *args, **kwargs) -> _NarrowbandChunkedStream:
+        return _NarrowbandChunkedStream(self._wrapped.synthesize(*args, **kwargs), self)
@@ -4,20 +4,17 @@ Test script to create a room and see if agent connects
 """
 
 import asyncio
-import os
 from dotenv import load_dotenv
 from livekit import api
 
+from livekit_client import close_api, get_api
+
 load_dotenv()
 
 async def test_agent_connection():
     """Test if agent connects to a room"""
     
-    lkapi = api.LiveKitAPI(
-        url=os.getenv("LIVEKIT_URL"),
-        api_key=os.getenv("LIVEKIT_API_KEY"),
-        api_secret=os.getenv("LIVEKIT_API_SECRET")
-    )
+    lkapi = get_api()
 
     try:
         print("🧪 Testing Agent Connection")
@@ -56,7 +53,7 @@ async def test_agent_connection():
     except Exception as e:
         print(f"❌ Error during test: {e}")
     finally:
-        await lkapi.aclose()
+        await close_api()
 
 if __name__ == "__main__":
     asyncio.run(test_agent_connection())
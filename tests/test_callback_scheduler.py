@@ -0,0 +1,58 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from callback_scheduler import CallingWindow, parse_callback_time
+
+CHICAGO = ZoneInfo("America/Chicago")
+# Monday, 2:05pm
+NOW = datetime(2026, 10, 19, 14, 5, tzinfo=CHICAGO)
+
+
+def at(day: int, hour: int, minute: int = 0) -> datetime:
+    return datetime(2026, 10, day, hour, minute, tzinfo=CHICAGO)
+
+
+@pytest.mark.parametrize(
+    "said, expected",
+    [
+        # the afternoon isn't over yet, so the next free slot today
+        ("this afternoon", at(19, 14, 15)),
+        ("call me this afternoon", at(19, 14, 15)),
+        ("this morning", at(20, 10)),
+        ("this evening", at(19, 18)),
+        # "next <day>" is that day of next week, never tomorrow
+        ("next tuesday", at(27, 10)),
+        ("next friday at 3", at(30, 15)),
+        ("tuesday", at(20, 10)),
+        ("next week", at(26, 10)),
+        # a bare 8 in the afternoon means 8pm
+        ("at 8", at(19, 20)),
+        ("around 9", at(19, 21)),
+        ("tomorrow at 8", at(20, 8)),
+        ("at 8am", at(20, 8)),
+        ("at 3", at(19, 15)),
+        # "in" is optional
+        ("half an hour", at(19, 14, 35)),
+        ("in half an hour", at(19, 14, 35)),
+        ("two hours", at(19, 16, 5)),
+        ("in 20 minutes", at(19, 14, 25)),
+        ("8pm", at(19, 20)),
+    ],
+)
+def test_parse_callback_time(said, expected):
+    assert parse_callback_time(said, NOW) == expected
+
+
+def test_unreadable_time():
+    assert parse_callback_time("not a good time", NOW) is None
+
+
+def test_calling_window_includes_its_closing_hour():
+    window = CallingWindow(9, 20)
+    assert window.contains(at(19, 20))
+    assert window.next_open(at(19, 20)) == at(19, 20)
+    assert not window.contains(at(19, 20, 1))
+    assert window.next_open(at(19, 20, 30)) == at(20, 9)
+    assert window.next_open(at(19, 21)) == at(20, 9)
@@ -0,0 +1,189 @@
+"""
+Outbound trunk registry.
+
+Maps caller-ID numbers to SIP outbound trunk ids. The mapping is listed from
+LiveKit once and cached in a small state file (`.trunks.json`, or
+TRUNK_STATE_FILE) for `ttl` seconds, so scripts and dialers don't list trunks
+before every call. `ensure_trunk()` only creates a trunk for numbers no
+existing trunk carries, so provisioning can be re-run safely. All state and
+`.env` writes take a file lock and go through a temp file + rename, so
+concurrent processes never see or produce a half-written file.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from livekit.protocol.sip import (
+    CreateSIPOutboundTrunkRequest,
+    ListSIPOutboundTrunkRequest,
+    SIPOutboundTrunkInfo,
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to unlocked (still atomic) writes
+    fcntl = None
+
+logger = logging.getLogger("trunk-registry")
+
+DEFAULT_STATE_FILE = ".trunks.json"
+
+
+@dataclass(frozen=True)
+class TrunkRoute:
+    # One caller ID and the trunk that can place calls from it.
+
+    trunk_id: str
+    number: str
+
+
+@contextlib.contextmanager
+def locked(path: str):
+    """Exclusive advisory lock on `<path>.lock` for read-modify-write cycles"""
+    with open(f"{path}.lock", "w") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def write_atomic(path: str, text: str) -> None:
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp)
+        raise
+
+
+def update_env_file(key: str, value: str, path: str = ".env") -> None:
+    """Set `key=value` in a dotenv file, replacing any existing (or duplicated) entry"""
+    with locked(path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            lines = []
+
+        kept, written = [], False
+        for line in lines:
+            if not line.startswith(f"{key}="):
+                kept.append(line)
+            elif not written:
+                kept.append(f"{key}={value}\n")
+                written = True
+        if not written:
+            if kept and not kept[-1].endswith("\n"):
+                kept[-1] += "\n"
+            kept.append(f"{key}={value}\n")
+        write_atomic(path, "".join(kept))
+
+
+def parse_list(value: Optional[str]) -> list[str]:
+    return [n.strip() for n in (value or "").split(",") if n.strip()]
+
+
+class TrunkRegistry:
+    def __init__(self, lkapi, state_path: Optional[str] = None, ttl: float = 3600.0) -> None:
+        self._lkapi = lkapi
+        self._state_path = state_path or os.getenv("TRUNK_STATE_FILE", DEFAULT_STATE_FILE)
+        self._ttl = ttl
+        self._state: Optional[dict] = None
+
+    def _load(self) -> dict:
+        if self._state is None:
+            try:
+                with open(self._state_path, encoding="utf-8") as f:
+                    self._state = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._state = {"updated_at": 0, "numbers": {}}
+        return self._state
+
+    def _fresh(self) -> bool:
+        return time.time() - self._load().get("updated_at", 0) < self._ttl
+
+    def _save(self, numbers: dict[str, str]) -> None:
+        self._state = {"updated_at": time.time(), "numbers": numbers}
+        with locked(self._state_path):
+            write_atomic(self._state_path, json.dumps(self._state, indent=2, sort_keys=True))
+
+    async def refresh(self) -> dict[str, str]:
+        """List trunks from LiveKit and rewrite the cached number -> trunk mapping"""
+        res = await self._lkapi.sip.list_sip_outbound_trunk(ListSIPOutboundTrunkRequest())
+        numbers = {}
+        for trunk in res.items:
+            for number in trunk.numbers:
+                numbers.setdefault(number, trunk.sip_trunk_id)
+        self._save(numbers)
+        logger.info(f"cached {len(numbers)} number(s) across {len(res.items)} trunk(s)")
+        return numbers
+
+    async def resolve(self, number: str) -> Optional[str]:
+        """Trunk id for a caller-ID number, listing trunks only when the cache is stale or misses"""
+        if self._fresh():
+            trunk_id = self._load()["numbers"].get(number)
+            if trunk_id:
+                return trunk_id
+        return (await self.refresh()).get(number)
+
+    async def routes(self, numbers: Iterable[str]) -> list[TrunkRoute]:
+        """Routes for every number that has a trunk; unknown numbers are logged and skipped"""
+        numbers = list(numbers)
+        known = self._load()["numbers"] if self._fresh() else {}
+        if any(n not in known for n in numbers):
+            known = await self.refresh()
+
+        routes = []
+        for number in numbers:
+            trunk_id = known.get(number)
+            if trunk_id is None:
+                logger.warning(f"no outbound trunk carries {number}, skipping it")
+                continue
+            routes.append(TrunkRoute(trunk_id=trunk_id, number=number))
+        return routes
+
+    async def ensure_trunk(
+        self,
+        numbers: list[str],
+        name: str,
+        address: str,
+        auth_username: str,
+        auth_password: str,
+    ) -> list[TrunkRoute]:
+        """Create one trunk for the numbers no trunk carries yet; existing ones are reused"""
+        known = dict(self._load()["numbers"]) if self._fresh() else {}
+        if any(n not in known for n in numbers):
+            # confirm against LiveKit before creating anything
+            known = await self.refresh()
+        missing = [n for n in numbers if n not in known]
+        if missing:
+            created = await self._lkapi.sip.create_sip_outbound_trunk(
+                CreateSIPOutboundTrunkRequest(
+                    trunk=SIPOutboundTrunkInfo(
+                        name=name,
+                        address=address,
+                        numbers=missing,
+                        auth_username=auth_username,
+                        auth_password=auth_password,
+                    )
+                )
+            )
+            logger.info(f"created trunk {created.sip_trunk_id} for {missing}")
+            known.update({n: created.sip_trunk_id for n in missing})
+            self._save(known)
+        return [TrunkRoute(trunk_id=known[n], number=n) for n in numbers]
@@ -0,0 +1,227 @@
+"""
+Content-addressed cache of pre-synthesized TTS audio.
+
+Fixed script lines are synthesized once (in the background from prewarm), kept on disk as raw
+16-bit PCM and held in an in-memory LRU. `CachedTTS` wraps a TTS plugin so a
+cached line is played from memory with no TTS round-trip, while any other text
+goes to the wrapped plugin as usual.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from livekit import rtc
+from livekit.agents import tokenize, tts
+
+logger = logging.getLogger("tts-cache")
+
+DEFAULT_CACHE_DIR = os.getenv("TTS_CACHE_DIR", ".tts_cache")
+FRAME_MS = 20
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace and typographic quotes so equivalent lines share a key"""
+    text = text.replace("’", "'").replace("‘", "'").replace("“", '"').replace("”", '"')
+    return " ".join(text.split())
+
+
+def cache_key(text: str, voice: str, model: str, sample_rate: int) -> str:
+    raw = "\x00".join([normalize_text(text), voice, model, str(sample_rate)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """Disk-backed PCM store with an in-memory LRU bounded by total bytes"""
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_memory_bytes: int = 32 * 1024 * 1024) -> None:
+        self._dir = directory
+        self._max_bytes = max_memory_bytes
+        self._lru: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._dir, f"{key}.pcm")
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            pcm = self._lru.get(key)
+            if pcm is not None:
+                self._lru.move_to_end(key)
+                return pcm
+
+        try:
+            with open(self._path(key), "rb") as f:
+                pcm = f.read()
+        except FileNotFoundError:
+            return None
+
+        self._remember(key, pcm)
+        return pcm
+
+    def put(self, key: str, pcm: bytes) -> None:
+        # write to a temp file first so concurrent workers never read a partial clip
+        tmp = f"{self._path(key)}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(pcm)
+        os.replace(tmp, self._path(key))
+        self._remember(key, pcm)
+
+    def _remember(self, key: str, pcm: bytes) -> None:
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                return
+            self._lru[key] = pcm
+            self._size += len(pcm)
+            while self._size > self._max_bytes and len(self._lru) > 1:
+                _, evicted = self._lru.popitem(last=False)
+                self._size -= len(evicted)
+
+
+class _CachedChunkedStream:
+    """Replays cached PCM as 20 ms frames, shaped like a plugin's ChunkedStream"""
+
+    def __init__(self, pcm: bytes, sample_rate: int, num_channels: int) -> None:
+        self._pcm = pcm
+        self._sample_rate = sample_rate
+        self._num_channels = num_channels
+        self._request_id = uuid.uuid4().hex
+        self._offset = 0
+        self._frame_bytes = sample_rate * FRAME_MS // 1000 * num_channels * 2
+
+    def __aiter__(self) -> "_CachedChunkedStream":
+        return self
+
+    async def __anext__(self) -> tts.SynthesizedAudio:
+        if self._offset >= len(self._pcm):
+            raise StopAsyncIteration
+
+        data = self._pcm[self._offset:self._offset + self._frame_bytes]
+        self._offset += len(data)
+        frame = rtc.AudioFrame(
+            data=data,
+            sample_rate=self._sample_rate,
+            num_channels=self._num_channels,
+            samples_per_channel=len(data) // (2 * self._num_channels),
+        )
+        return tts.SynthesizedAudio(request_id=self._request_id, frame=frame)
+
+    async def collect(self) -> rtc.AudioFrame:
+        return rtc.AudioFrame(
+            data=self._pcm,
+            sample_rate=self._sample_rate,
+            num_channels=self._num_channels,
+            samples_per_channel=len(self._pcm) // (2 * self._num_channels),
+        )
+
+    async def aclose(self) -> None:
+        self._offset = len(self._pcm)
+
+    async def __aenter__(self) -> "_CachedChunkedStream":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+
+class CachedTTS:
+    """Wraps a TTS plugin and serves cached lines without calling the provider.
+
+    Everything except `synthesize` is delegated, so the voice pipeline wraps
+    this exactly like the plugin it replaces.
+    """
+
+    def __init__(self, wrapped: tts.TTS, cache: AudioCache) -> None:
+        self._wrapped = wrapped
+        self._cache = cache
+        self._opts = getattr(wrapped, "_opts", None)
+        self.hits = 0
+        self.misses = 0
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def key_for(self, text: str) -> str:
+        return cache_key(
+            text,
+            str(getattr(self._opts, "voice", "")),
+            str(getattr(self._opts, "model", "")),
+            self._wrapped.sample_rate,
+        )
+
+    def synthesize(self, text: str, *args, **kwargs):
+        pcm = self._cache.get(self.key_for(text))
+        if pcm is None:
+            self.misses += 1
+            return self._wrapped.synthesize(text, *args, **kwargs)
+
+        self.hits += 1
+        return _CachedChunkedStream(pcm, self._wrapped.sample_rate, self._wrapped.num_channels)
+
+    async def warm(self, lines: Iterable[str], sentence_tokenizer: Optional[tokenize.SentenceTokenizer] = None) -> int:
+        """Synthesize every line (and the chunks the pipeline splits it into)
+        that isn't cached yet. Returns the number of clips synthesized."""
+        texts: list[str] = []
+        sentence_tokenizer = sentence_tokenizer or tokenize.basic.SentenceTokenizer()
+        for line in lines:
+            texts.append(line)
+            texts.extend(sentence_tokenizer.tokenize(line))
+
+        missing = {self.key_for(t): t for t in texts if self._cache.get(self.key_for(t)) is None}
+        for key, text in missing.items():
+            frames = []
+            async for audio in self._wrapped.synthesize(text):
+                frames.append(bytes(audio.frame.data))
+            self._cache.put(key, b"".join(frames))
+
+        return len(missing)
+
+
+def warm_cache_in_background(
+    make_tts,
+    cache: AudioCache,
+    lines: Iterable[str],
+    sentence_tokenizer: Optional[tokenize.SentenceTokenizer] = None,
+) -> threading.Thread:
+    """Fill the cache from a sync prewarm function without holding it up.
+
+    On a cold cache this is a few dozen TTS requests, longer than the worker
+    gives a process to initialize; until a line is cached it simply goes to
+    live TTS. Runs on its own thread and event loop with a throwaway plugin
+    instance, so no HTTP client gets bound to a loop other than the job's.
+    """
+
+    async def _warm():
+        started = time.perf_counter()
+        tts_instance = make_tts()
+        try:
+            synthesized = await CachedTTS(tts_instance, cache).warm(lines, sentence_tokenizer)
+        finally:
+            aclose = getattr(tts_instance, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        logger.info(
+            "tts cache warm: %d clips synthesized in %.0f ms",
+            synthesized,
+            (time.perf_counter() - started) * 1000,
+        )
+
+    def _run():
+        try:
+            asyncio.run(_warm())
+        except Exception:
+            # a cold cache only costs latency, never fail the worker over it
+            logger.exception("failed to warm the tts cache")
+
+    thread = threading.Thread(target=_run, name="tts-cache-warm", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,250 @@
+"""
+Per-turn latency instrumentation for the SIP agents.
+
+Every user turn is broken into four stages:
+  - stt:     end of user speech -> final transcript
+  - llm:     final transcript -> first LLM token
+  - tts:     first LLM token -> first TTS audio
+  - publish: first TTS audio -> agent audio playing into the room
+
+Each turn is logged with room, lead id and agent variant. The worker runs
+every call in its own process, so histograms kept in the job would only ever
+cover one call: instead each call's raw samples are appended to a shared
+JSONL log (TURN_METRICS_LOG) when the job shuts down, and
+`python turn_metrics.py` folds the log of every call into p50/p95/p99 per
+variant and stage. Barge-in latency (see barge_in.py) goes into the same log.
+"""
+
+import argparse
+import asyncio
+import bisect
+import json
+import logging
+import math
+import os
+import time
+from collections import defaultdict
+from typing import AsyncIterable, Callable, Optional, Union
+
+from livekit.agents import stt
+
+from stt_tap import TappedSTT
+from trunk_registry import locked
+
+logger = logging.getLogger("turn-metrics")
+
+STAGES = ("stt", "llm", "tts", "publish")
+
+DEFAULT_LOG = "turn_metrics.jsonl"
+
+
+class LatencyHistogram:
+    """Fixed log-spaced buckets (1 ms .. ~30 s, ~5% wide), constant memory"""
+
+    _BOUNDS = [math.exp(math.log(0.001) + i * 0.05) for i in range(int(math.log(30 / 0.001) / 0.05) + 1)]
+
+    def __init__(self) -> None:
+        self._counts = [0] * (len(self._BOUNDS) + 1)
+        self.count = 0
+
+    def record(self, seconds: float) -> None:
+        self._counts[bisect.bisect_left(self._BOUNDS, seconds)] += 1
+        self.count += 1
+
+    def percentile(self, p: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * p / 100)
+        seen = 0
+        for i, n in enumerate(self._counts):
+            seen += n
+            if seen >= rank:
+                return self._BOUNDS[min(i, len(self._BOUNDS) - 1)]
+        return self._BOUNDS[-1]
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "p50_ms": round(self.percentile(50) * 1000),
+            "p95_ms": round(self.percentile(95) * 1000),
+            "p99_ms": round(self.percentile(99) * 1000),
+        }
+
+
+class SampleLog:
+    """One call's latency samples, appended to the shared log when the job ends"""
+
+    def __init__(self, room: str, lead_id: str, variant: str, path: Optional[str] = None) -> None:
+        self._tags = {"room": room, "lead_id": lead_id, "variant": variant}
+        self._path = path or os.getenv("TURN_METRICS_LOG", DEFAULT_LOG)
+        self._samples: list[dict] = []
+
+    def add(self, kind: str, stage_ms: dict) -> None:
+        self._samples.append({"ts": round(time.time(), 3), **self._tags, "kind": kind, **stage_ms})
+
+    async def flush(self) -> None:
+        samples, self._samples = self._samples, []
+        if not samples:
+            return
+        try:
+            await asyncio.to_thread(self._append, samples)
+        except OSError:
+            logger.exception(f"failed to write {len(samples)} latency samples to {self._path}")
+
+    def _append(self, samples: list[dict]) -> None:
+        with locked(self._path), open(self._path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(sample) + "\n" for sample in samples)
+
+
+def aggregate(path: str, since: float = 0.0) -> "dict[tuple[str, str], LatencyHistogram]":
+    """Histograms keyed by (variant, stage) over every call in the log"""
+    histograms: "defaultdict[tuple[str, str], LatencyHistogram]" = defaultdict(LatencyHistogram)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                sample = json.loads(line)
+            except json.JSONDecodeError:
+                # a job killed mid-write leaves a torn last line
+                continue
+            if sample.get("ts", 0) < since:
+                continue
+            for key, ms in sample.items():
+                if key.endswith("_ms") and key != "total_ms":
+                    histograms[(sample["variant"], key[:-3])].record(ms / 1000)
+    return histograms
+
+
+class _TimedChunkedStream:
+    def __init__(self, wrapped, timer: "TurnTimer") -> None:
+        self._wrapped = wrapped
+        self._timer = timer
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def __aiter__(self) -> "_TimedChunkedStream":
+        return self
+
+    async def __anext__(self):
+        audio = await self._wrapped.__anext__()
+        self._timer.mark_tts_audio()
+        return audio
+
+    async def __aenter__(self) -> "_TimedChunkedStream":
+        if hasattr(self._wrapped, "__aenter__"):
+            await self._wrapped.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        if hasattr(self._wrapped, "__aexit__"):
+            await self._wrapped.__aexit__(*exc)
+
+
+class TimedTTS:
+    """Wraps a TTS plugin and reports when each synthesis yields audio"""
+
+    def __init__(self, wrapped, timer: "TurnTimer") -> None:
+        self._wrapped = wrapped
+        self._timer = timer
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def synthesize(self, *args, **kwargs) -> _TimedChunkedStream:
+        return _TimedChunkedStream(self._wrapped.synthesize(*args, **kwargs), self._timer)
+
+
+class TurnTimer:
+    """Collects the timestamps of one call's turns and records finished turns"""
+
+    def __init__(self, room: str, lead_id: str, variant: str) -> None:
+        self._tags = {"room": room, "lead_id": lead_id, "variant": variant}
+        self.samples = SampleLog(room, lead_id, variant)
+        self._turn: Optional[dict] = None
+        # called with each finished turn's stage latencies in ms
+        self.turn_listeners: list[Callable[[dict], None]] = []
+
+    def attach(self, assistant, stt_tap: TappedSTT) -> None:
+        assistant.on("user_stopped_speaking", lambda *_: self._start_turn())
+        assistant.on("agent_started_speaking", lambda *_: self._finish_turn())
+        stt_tap.event_listeners.append(self._on_speech_event)
+
+    def _start_turn(self) -> None:
+        self._turn = {"eos": time.perf_counter()}
+
+    def _on_speech_event(self, ev: stt.SpeechEvent) -> None:
+        if self._turn is not None and ev.type == stt.SpeechEventType.FINAL_TRANSCRIPT:
+            # keep the last final: that is the one the reply is built from
+            self._turn["final"] = time.perf_counter()
+
+    def before_tts(self, assistant, source: Union[str, AsyncIterable[str]]):
+        """`before_tts_cb` that notes when the first LLM token reaches TTS"""
+        if isinstance(source, str) or self._turn is None:
+            return source
+        return self._time_first_token(source)
+
+    async def _time_first_token(self, source: AsyncIterable[str]):
+        async for chunk in source:
+            if self._turn is not None:
+                self._turn.setdefault("token", time.perf_counter())
+            yield chunk
+
+    def mark_tts_audio(self) -> None:
+        if self._turn is not None and "token" in self._turn:
+            self._turn.setdefault("audio", time.perf_counter())
+
+    def _finish_turn(self) -> None:
+        turn, self._turn = self._turn, None
+        if turn is None or "audio" not in turn:
+            # scripted speech (greeting, cached lines) has no user turn to time
+            return
+
+        now = time.perf_counter()
+        final = turn.get("final", turn["eos"])
+        stages = {
+            "stt": final - turn["eos"],
+            "llm": turn["token"] - final,
+            "tts": turn["audio"] - turn["token"],
+            "publish": now - turn["audio"],
+        }
+        stage_ms = {f"{stage}_ms": round(max(seconds, 0.0) * 1000) for stage, seconds in stages.items()}
+        self.samples.add("turn", stage_ms)
+        for listener in self.turn_listeners:
+            listener(stage_ms)
+
+        logger.info(
+            "turn latency",
+            extra={
+                **self._tags,
+                **stage_ms,
+                "total_ms": round((now - turn["eos"]) * 1000),
+            },
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Turn latency percentiles over every logged call")
+    parser.add_argument("log", nargs="?", default=os.getenv("TURN_METRICS_LOG", DEFAULT_LOG))
+    parser.add_argument("--hours", type=float, help="only calls from the last N hours")
+    args = parser.parse_args()
+
+    since = time.time() - args.hours * 3600 if args.hours else 0.0
+    try:
+        histograms = aggregate(args.log, since)
+    except FileNotFoundError:
+        print(f"❌ No latency log at {args.log}")
+        return
+    if not histograms:
+        print("📭 No samples yet")
+        return
+    print(f"{'stage':<22}{'count':>8}{'p50':>8}{'p95':>8}{'p99':>8}")
+    for (variant, stage), h in sorted(histograms.items()):
+        summary = h.summary()
+        print(
+            f"{variant + '.' + stage:<22}{summary['count']:>8}"
+            f"{summary['p50_ms']:>6}ms{summary['p95_ms']:>6}ms{summary['p99_ms']:>6}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+"""
+Local voicemail / auto-attendant detection ahead of the LLM.
+
+Runs on the callee's audio and STT transcripts for the first seconds after
+the call is answered (before that the track carries ringback) and flags an
+answering machine from any of:
+  - a machine greeting, matched with an Aho-Corasick automaton built once per
+    process ("leave a message after the tone", "the person you are calling", ...),
+    already on interim transcripts
+  - a beep tone (one pure tone held for a couple hundred ms, not ringback)
+  - a long uninterrupted monologue, which people answering a phone never do
+
+A live person can say "he's not available, can I take a message?", so looser
+cues like that never end the call on their own, and only count on final
+transcripts: they shorten the monologue needed to confirm a machine.
+"""
+
+import asyncio
+import logging
+import re
+import time
+from collections import deque
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+
+from livekit import rtc
+from livekit.agents import stt
+
+from call_start import CallStart
+from stt_tap import TappedSTT
+
+logger = logging.getLogger("voicemail-detector")
+
+# said by answering machines and call screeners, not by people picking up
+GREETING_PHRASES = [
+    "leave a message after the tone",
+    "leave a message after the beep",
+    "leave your message after the tone",
+    "leave your message after the beep",
+    "leave your name and number after the",
+    "please leave your name and number",
+    "please leave a message",
+    "please record your message",
+    "at the tone please record",
+    "you have reached the voicemail of",
+    "you've reached the voicemail of",
+    "has been forwarded to an automated voice messaging system",
+    "is not available to take your call",
+    "isn't available to take your call",
+    "can't take your call right now",
+    "cannot take your call right now",
+    "the person you are calling",
+    "the number you have dialed",
+    "the mailbox is full",
+    "mailbox is full and cannot accept",
+    "this call is being screened",
+    "i'm a virtual assistant",
+    "google assistant",
+    "state your name and why you're calling",
+    "say your name and why you're calling",
+]
+
+# common in greetings, but a person can say them too
+CUE_PHRASES = [
+    "voicemail",
+    "voice mail",
+    "take a message",
+    "leave a message",
+    "is not available",
+    "isn't available",
+    "can't take your call",
+    "after the tone",
+    "after the beep",
+    "i'm their assistant",
+    "i am their assistant",
+]
+
+_NON_WORD = re.compile(r"[^a-z0-9' ]+")
+
+
+def normalize(text: str) -> str:
+    text = text.lower().replace("’", "'")
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+
+class PhraseMatcher:
+    """Aho-Corasick automaton over normalized text: one pass finds every phrase"""
+
+    def __init__(self, phrases: Iterable[str]) -> None:
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[Optional[str]] = [None]
+
+        for phrase in phrases:
+            state = 0
+            for ch in normalize(phrase):
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(None)
+                state = nxt
+            self._out[state] = normalize(phrase)
+
+        # depth-1 states fail back to the root, deeper ones are filled breadth-first
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                if self._out[nxt] is None:
+                    self._out[nxt] = self._out[self._fail[nxt]]
+
+    def search(self, text: str) -> Optional[str]:
+        """Return the first phrase found in `text`, if any"""
+        state = 0
+        for ch in normalize(text):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            if self._out[state] is not None:
+                return self._out[state]
+        return None
+
+
+# compiled once per worker process
+GREETING_MATCHER = PhraseMatcher(GREETING_PHRASES)
+CUE_MATCHER = PhraseMatcher(CUE_PHRASES)
+
+
+class BeepDetector:
+    """Flags a voicemail beep: one pure tone in the 500-2000 Hz band, held briefly, once.
+
+    Ringback played as early media is not a beep. North American and UK ringback
+    is two tones (440+480 Hz, 400+450 Hz), the single-tone ringback used
+    elsewhere sits at 425 Hz, and every ringback repeats on a cadence, so dual
+    tones, tones below 500 Hz, tones held longer than `max_duration` and tones
+    that come back within `repeat_within` are ignored. A beep is reported once it
+    ends, which is also when the machine starts recording.
+    """
+
+    def __init__(
+        self,
+        min_duration: float = 0.2,
+        max_duration: float = 1.5,
+        tone_ratio: float = 0.6,
+        second_tone_ratio: float = 0.15,
+        repeat_within: float = 8.0,
+        window: float = 0.1,
+        hop: float = 0.05,
+    ) -> None:
+        self._min_duration = min_duration
+        self._max_duration = max_duration
+        self._tone_ratio = tone_ratio
+        self._second_tone_ratio = second_tone_ratio
+        self._repeat_within = repeat_within
+        # 100 ms windows resolve 10 Hz, enough to split 440 from 480 Hz
+        self._window = window
+        self._hop = hop
+        self._rate = 0
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._consumed = 0
+        # the tone being heard: frequency, first and last window seen
+        self._run_freq: Optional[float] = None
+        self._run_start = 0.0
+        self._run_end = 0.0
+        # (frequency, end) of tones heard so far, to spot a cadence
+        self._heard: list[tuple[float, float]] = []
+
+    def push_frame(self, frame: rtc.AudioFrame) -> bool:
+        if frame.sample_rate != self._rate:
+            self._rate = frame.sample_rate
+            self._window_len = int(self._window * self._rate)
+            self._hop_len = int(self._hop * self._rate)
+            self._taper = np.hanning(self._window_len).astype(np.float32)
+            self._bin_hz = self._rate / self._window_len
+            self._pending = np.zeros(0, dtype=np.float32)
+
+        samples = np.frombuffer(frame.data, dtype=np.int16)
+        if frame.num_channels > 1:
+            samples = samples[::frame.num_channels]
+        self._pending = np.concatenate((self._pending, samples.astype(np.float32)))
+
+        beep = False
+        while len(self._pending) >= self._window_len:
+            block = self._pending[:self._window_len]
+            self._pending = self._pending[self._hop_len:]
+            self._consumed += self._hop_len
+            now = (self._consumed - self._hop_len + self._window_len) / self._rate
+            beep = self._track(self._tone(block), now) or beep
+        return beep
+
+    def _energy_around(self, spectrum: np.ndarray, peak: int) -> float:
+        width = max(1, round(25 / self._bin_hz))
+        return float(spectrum[max(peak - width, 0):peak + width + 1].sum())
+
+    def _tone(self, block: np.ndarray) -> Optional[float]:
+        """Frequency of the single tone in `block`, if it holds one"""
+        spectrum = np.abs(np.fft.rfft(block * self._taper)) ** 2
+        total = spectrum.sum()
+        if total <= 0:
+            return None
+        peak = int(spectrum.argmax())
+        freq = peak * self._bin_hz
+        if not 500 <= freq <= 2000 or self._energy_around(spectrum, peak) / total < self._tone_ratio:
+            return None
+
+        # a second strong tone next to the first is ringback, not a beep
+        width = max(1, round(25 / self._bin_hz))
+        rest = spectrum.copy()
+        rest[max(peak - width, 0):peak + width + 1] = 0
+        second = int(rest.argmax())
+        if 300 <= second * self._bin_hz <= 2000 and self._energy_around(rest, second) / total >= self._second_tone_ratio:
+            return None
+        return freq
+
+    def _track(self, freq: Optional[float], now: float) -> bool:
+        if freq is not None and self._run_freq is not None and abs(freq - self._run_freq) <= 30:
+            self._run_end = now
+            return False
+
+        beep = False
+        if self._run_freq is not None:
+            duration = self._run_end - self._run_start + self._window
+            repeated = any(
+                abs(self._run_freq - heard) <= 30 and self._run_start - end <= self._repeat_within
+                for heard, end in self._heard
+            )
+            beep = self._min_duration <= duration <= self._max_duration and not repeated
+            if duration >= self._min_duration:
+                self._heard.append((self._run_freq, self._run_end))
+
+        self._run_freq = freq
+        self._run_start = self._run_end = now
+        return beep
+
+
+class VoicemailDetector:
+    """Watches the start of a call and calls `on_detected(reason)` at most once.
+
+    Feed it from a `TappedSTT` with `push_frame` and `on_speech_event`.
+    """
+
+    def __init__(
+        self,
+        on_detected: Callable[[str], None],
+        greetings: PhraseMatcher = GREETING_MATCHER,
+        cues: PhraseMatcher = CUE_MATCHER,
+        window: float = 20.0,
+        monologue_words: int = 25,
+        monologue_seconds: float = 8.0,
+    ) -> None:
+        self._on_detected = on_detected
+        self._greetings = greetings
+        self._cues = cues
+        # a cue phrase heard so far, waiting for a monologue to confirm it
+        self._cue: Optional[str] = None
+        self._beep = BeepDetector()
+        # armed once the callee answers: until then the track carries ringback
+        self._started: Optional[float] = None
+        self._window = window
+        self._monologue_words = monologue_words
+        self._monologue_seconds = monologue_seconds
+        self._speech_started: Optional[float] = None
+        self.result: Optional[str] = None
+        # set once the machine's beep has played, i.e. it is recording
+        self.beep = asyncio.Event()
+
+    def arm(self) -> None:
+        """Start listening, once the call is answered"""
+        if self._started is None:
+            self._started = time.monotonic()
+
+    def _elapsed(self) -> float:
+        return time.monotonic() - self._started if self._started is not None else 0.0
+
+    @property
+    def active(self) -> bool:
+        return self._started is not None and self.result is None and self._elapsed() < self._window
+
+    def _detect(self, reason: str) -> None:
+        self.result = reason
+        logger.info(
+            "voicemail detected after %.0f ms: %s",
+            self._elapsed() * 1000,
+            reason,
+        )
+        self._on_detected(reason)
+
+    def push_frame(self, frame: rtc.AudioFrame) -> None:
+        if self._started is None or self.beep.is_set() or self._elapsed() >= self._window:
+            return
+        if self._beep.push_frame(frame):
+            self.beep.set()
+            if self.result is None:
+                self._detect("beep")
+
+    def on_speech_event(self, ev: stt.SpeechEvent) -> None:
+        if not self.active:
+            return
+
+        if ev.type == stt.SpeechEventType.START_OF_SPEECH:
+            self._speech_started = time.monotonic()
+        elif ev.type == stt.SpeechEventType.END_OF_SPEECH:
+            self._speech_started = None
+        elif ev.type in (stt.SpeechEventType.INTERIM_TRANSCRIPT, stt.SpeechEventType.FINAL_TRANSCRIPT):
+            text = ev.alternatives[0].text if ev.alternatives else ""
+            # a greeting is unambiguous even on an interim; loose cues wait for the final
+            phrase = self._greetings.search(text)
+            if phrase:
+                self._detect(f"phrase: {phrase}")
+                return
+            if ev.type == stt.SpeechEventType.FINAL_TRANSCRIPT:
+                self._cue = self._cue or self._cues.search(text)
+
+            # after a cue phrase, half the monologue is enough to call it a machine
+            scale = 0.5 if self._cue else 1.0
+            speaking_for = time.monotonic() - (self._speech_started or time.monotonic())
+            if (
+                len(text.split()) >= self._monologue_words * scale
+                or speaking_for >= self._monologue_seconds * scale
+            ):
+                self._detect(f"monologue after {self._cue!r}" if self._cue else "monologue")
+
+
+def watch_for_voicemail(
+    tap: TappedSTT,
+    call_start: CallStart,
+    on_detected: Callable[[str], None],
+    **kwargs,
+) -> VoicemailDetector:
+    """Attach a detector to the STT tap of a call, armed once the callee answers"""
+    detector = VoicemailDetector(on_detected, **kwargs)
+    tap.frame_listeners.append(detector.push_frame)
+    tap.event_listeners.append(detector.on_speech_event)
+    call_start.on_answered(detector.arm)
+    return detector
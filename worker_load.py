@@ -0,0 +1,179 @@
+"""
+Worker load reporting and admission control.
+
+The default load calculation only looks at CPU, so under campaign bursts one
+worker keeps accepting calls while VAD/STT fall behind. `WorkerLoad` reports
+the worst of three signals, each scaled so 1.0 means "full":
+  - active sessions / WORKER_MAX_SESSIONS
+  - event-loop lag / WORKER_MAX_LOOP_LAG_MS
+  - CPU utilisation
+and rejects job requests once that load reaches WORKER_LOAD_THRESHOLD, so the
+dispatcher sends the call to an idle worker instead.
+
+Every call runs in its own job process, and that is where VAD/STT stall, so
+loop lag is measured there: `report_loop_lag()` in the entrypoint writes the
+job's lag to a per-worker directory (a tiny file per job, passed to the job
+processes through the environment), and the worker's load report takes the
+worst fresh value. The worker's own loop only routes jobs.
+"""
+
+import asyncio
+import atexit
+import contextlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import psutil
+
+from livekit.agents import JobContext, JobRequest
+
+logger = logging.getLogger("worker-load")
+
+# set by the worker, inherited by its job processes
+LAG_DIR_ENV = "WORKER_LOAD_LAG_DIR"
+
+
+class WorkerLoad:
+    def __init__(
+        self,
+        max_sessions: int = 25,
+        max_loop_lag: float = 0.2,
+        threshold: float = 0.75,
+        lag_stale_after: float = 5.0,
+        reservation_ttl: float = 10.0,
+    ) -> None:
+        self.max_sessions = max_sessions
+        self.max_loop_lag = max_loop_lag
+        self.threshold = threshold
+        self._lag_stale_after = lag_stale_after
+        self._reservation_ttl = reservation_ttl
+        self._lag = 0.0
+        self._cpu = 0.0
+        self._jobs = 0
+        # job id -> time accepted, for jobs that don't show up in worker.active_jobs yet
+        self._reservations: dict[str, float] = {}
+        self._reservations_lock = threading.Lock()
+        self._lag_dir = tempfile.mkdtemp(prefix="worker-load-")
+        os.environ[LAG_DIR_ENV] = self._lag_dir
+        atexit.register(shutil.rmtree, self._lag_dir, True)
+        psutil.cpu_percent()  # prime the counter, the first reading is always 0
+
+    @classmethod
+    def from_env(cls) -> "WorkerLoad":
+        return cls(
+            max_sessions=int(os.getenv("WORKER_MAX_SESSIONS", "25")),
+            max_loop_lag=float(os.getenv("WORKER_MAX_LOOP_LAG_MS", "200")) / 1000,
+            threshold=float(os.getenv("WORKER_LOAD_THRESHOLD", "0.75")),
+        )
+
+    def _read_job_lag(self) -> float:
+        """Worst loop lag reported by a live job process (blocking)"""
+        worst = 0.0
+        now = time.time()
+        try:
+            entries = list(os.scandir(self._lag_dir))
+        except FileNotFoundError:
+            return 0.0
+        for entry in entries:
+            if entry.name.endswith(".tmp"):
+                continue
+            try:
+                if now - entry.stat().st_mtime > self._lag_stale_after:
+                    # the job ended or died without cleaning up
+                    os.unlink(entry.path)
+                    continue
+                with open(entry.path) as f:
+                    worst = max(worst, float(f.read() or 0))
+            except (OSError, ValueError):
+                continue
+        return worst
+
+    @property
+    def _active(self) -> int:
+        cutoff = time.monotonic() - self._reservation_ttl
+        with self._reservations_lock:
+            for job_id in [j for j, at in self._reservations.items() if at < cutoff]:
+                del self._reservations[job_id]
+            return self._jobs + len(self._reservations)
+
+    def load_fnc(self, worker=None) -> float:
+        """`WorkerOptions.load_fnc`: 0.0 idle .. 1.0 full (runs in an executor thread)"""
+        if worker is not None:
+            active = list(worker.active_jobs)
+            with self._reservations_lock:
+                # a job that shows up as active is counted there, not twice
+                for info in active:
+                    self._reservations.pop(info.job.id, None)
+                self._jobs = len(active)
+        self._lag = self._read_job_lag()
+        self._cpu = psutil.cpu_percent() / 100
+        return self._current_load()
+
+    def _current_load(self) -> float:
+        load = max(
+            self._active / self.max_sessions,
+            self._lag / self.max_loop_lag,
+            self._cpu,
+        )
+        return min(load, 1.0)
+
+    async def request_fnc(self, req: JobRequest) -> None:
+        """`WorkerOptions.request_fnc`: turn jobs away above the threshold"""
+        # lag and CPU are sampled by the periodic load report, re-sampling here would read noise
+        load = self._current_load()
+        if load >= self.threshold:
+            logger.warning(
+                "rejecting job for room %s: load %.2f (sessions %d, loop lag %.0f ms, cpu %.0f%%)",
+                req.room.name,
+                load,
+                self._active,
+                self._lag * 1000,
+                self._cpu * 100,
+            )
+            await req.reject()
+            return
+
+        # count it straight away, the next load report may be a few seconds out; the
+        # reservation ends when the job shows up as active, or expires if it never does
+        with self._reservations_lock:
+            self._reservations[req.id] = time.monotonic()
+        await req.accept()
+
+
+async def _watch_loop_lag(path: str, interval: float, report_every: float) -> None:
+    lag = 0.0
+    reported_at = 0.0
+    tmp = f"{path}.tmp"
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        now = time.perf_counter()
+        # decay slowly so one stall keeps the worker marked busy for a few reports
+        lag = max(now - started - interval, lag * 0.8)
+        if now - reported_at >= report_every:
+            reported_at = now
+            with open(tmp, "w") as f:
+                f.write(f"{lag:.4f}")
+            os.replace(tmp, path)
+
+
+def report_loop_lag(ctx: JobContext, interval: float = 0.1, report_every: float = 1.0) -> None:
+    """Report this job process's event-loop lag to the worker's load calculation"""
+    lag_dir = os.getenv(LAG_DIR_ENV)
+    if not lag_dir or not os.path.isdir(lag_dir):
+        return
+    path = os.path.join(lag_dir, str(os.getpid()))
+    task = asyncio.create_task(_watch_loop_lag(path, interval, report_every))
+
+    async def stop():
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(path)
+
+    ctx.add_shutdown_callback(stop)
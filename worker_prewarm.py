@@ -0,0 +1,208 @@
+"""
+Shared process prewarm for every worker entry point.
+
+`make_prewarm()` returns a `prewarm_fnc` that, once per worker process, loads
+the Silero VAD, builds the STT/LLM/TTS plugin clients (both OpenAI plugins
+share one pooled HTTP client) and starts filling the TTS cache in the
+background, so a cold cache never runs past the process initialize timeout.
+The entrypoint then picks the ready-made plugins up with `get_plugins()` and
+calls `start_connection_warmup()`, which opens the TLS connections to OpenAI
+and Deepgram while the callee's phone is still ringing.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import httpx
+from openai import AsyncClient as OpenAIClient
+
+from livekit.agents import JobProcess, utils
+from livekit.plugins import deepgram, openai, silero
+
+from prompt_template import lead_defaults
+from response_cache import Intent, IntentMatcher
+from speech_chunker import PhoneChunkTokenizer
+from telephony_audio import TELEPHONY_SAMPLE_RATE, NarrowbandSTT, NarrowbandTTS
+from tts_cache import AudioCache, CachedTTS, warm_cache_in_background
+
+logger = logging.getLogger("worker-prewarm")
+
+DEEPGRAM_URL = "https://api.deepgram.com/v1/listen"
+
+
+@dataclass
+class PluginConfig:
+    stt_model: str = "nova-2"
+    stt_language: str = "en"
+    llm_model: str = "gpt-4o-mini"
+    tts_voice: str = "alloy"
+    # fixed lines to pre-synthesize into the TTS cache, empty to disable it
+    cached_lines: list[str] = field(default_factory=list)
+    # LLM-to-TTS chunking: words before the first chunk may be sent, and the
+    # minimum size of later chunks; 0 keeps the default sentence splitting
+    first_chunk_words: int = 4
+    min_chunk_chars: int = 60
+    # run VAD, STT and TTS at the 8 kHz rate of the phone line
+    telephony: bool = False
+    # questions answered from the script without the LLM; their replies are cached too
+    common_questions: list[Intent] = field(default_factory=list)
+    # more TTS voices for agents that hand off to each other, built once per process
+    extra_voices: list[str] = field(default_factory=list)
+
+
+@dataclass
+class Plugins:
+    vad: silero.VAD
+    stt: "deepgram.STT | NarrowbandSTT"
+    llm: openai.LLM
+    tts: "openai.TTS | CachedTTS | NarrowbandTTS"
+    openai_client: OpenAIClient
+    tts_cache: Optional[AudioCache] = None
+    chunker: Optional[PhoneChunkTokenizer] = None
+    intents: Optional[IntentMatcher] = None
+    voices: dict[str, "openai.TTS | NarrowbandTTS"] = field(default_factory=dict)
+
+    def voice(self, name: str) -> "openai.TTS | NarrowbandTTS":
+        """The prewarmed TTS client for an extra voice"""
+        try:
+            return self.voices[name]
+        except KeyError:
+            raise KeyError(f"voice {name!r} was not prewarmed, add it to PluginConfig.extra_voices") from None
+
+
+def _openai_client() -> OpenAIClient:
+    # one keep-alive pool for both the LLM and the TTS plugin
+    return OpenAIClient(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        http_client=httpx.AsyncClient(
+            timeout=httpx.Timeout(connect=15.0, read=30.0, write=5.0, pool=5.0),
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=50, keepalive_expiry=120),
+        ),
+    )
+
+
+def build_plugins(config: PluginConfig, vad: Optional[silero.VAD] = None) -> Plugins:
+    client = _openai_client()
+    tts = openai.TTS(voice=config.tts_voice, client=client)
+
+    chunker = None
+    if config.first_chunk_words and config.min_chunk_chars:
+        chunker = PhoneChunkTokenizer(
+            first_chunk_words=config.first_chunk_words, min_chunk_chars=config.min_chunk_chars
+        )
+
+    intents = None
+    if config.common_questions:
+        intents = IntentMatcher(config.common_questions, defaults=lead_defaults())
+
+    cache = None
+    cached_lines = config.cached_lines + (intents.warm_lines() if intents else [])
+    if cached_lines:
+        cache = AudioCache()
+        warm_cache_in_background(lambda: openai.TTS(voice=config.tts_voice), cache, cached_lines, chunker)
+        tts = CachedTTS(tts, cache)
+
+    if config.telephony:
+        stt = NarrowbandSTT(
+            deepgram.STT(model=config.stt_model, language=config.stt_language, sample_rate=TELEPHONY_SAMPLE_RATE)
+        )
+        tts = NarrowbandTTS(tts)
+    else:
+        stt = deepgram.STT(model=config.stt_model, language=config.stt_language)
+
+    # every voice shares the pooled OpenAI client, so a handoff opens no new connection
+    voices = {}
+    for voice in config.extra_voices:
+        voice_tts = openai.TTS(voice=voice, client=client)
+        voices[voice] = NarrowbandTTS(voice_tts) if config.telephony else voice_tts
+
+    return Plugins(
+        vad=vad or load_vad(config),
+        stt=stt,
+        llm=openai.LLM(model=config.llm_model, client=client),
+        tts=tts,
+        openai_client=client,
+        tts_cache=cache,
+        chunker=chunker,
+        intents=intents,
+        voices=voices,
+    )
+
+
+def load_vad(config: PluginConfig) -> silero.VAD:
+    if config.telephony:
+        # Silero has a native 8 kHz model, half the samples per inference
+        return silero.VAD.load(sample_rate=TELEPHONY_SAMPLE_RATE)
+    return silero.VAD.load()
+
+
+def make_prewarm(config: PluginConfig) -> Callable[[JobProcess], None]:
+    """Build the `prewarm_fnc` for a worker using the given plugin settings"""
+
+    def prewarm(proc: JobProcess) -> None:
+        started = time.perf_counter()
+        proc.userdata["vad"] = load_vad(config)
+        vad_ms = (time.perf_counter() - started) * 1000
+
+        proc.userdata["plugins"] = build_plugins(config, vad=proc.userdata["vad"])
+        total_ms = (time.perf_counter() - started) * 1000
+
+        proc.userdata["prewarm_ms"] = total_ms
+        logger.info(
+            "process %s prewarmed in %.0f ms (vad %.0f ms, plugins %.0f ms)",
+            os.getpid(),
+            total_ms,
+            vad_ms,
+            total_ms - vad_ms,
+        )
+
+    return prewarm
+
+
+def get_plugins(proc: JobProcess, config: PluginConfig) -> Plugins:
+    """Return the prewarmed plugins, building them inline if prewarm didn't run"""
+    plugins = proc.userdata.get("plugins")
+    if plugins is None:
+        logger.warning("process %s was not prewarmed, loading plugins on the call path", os.getpid())
+        plugins = proc.userdata["plugins"] = build_plugins(config)
+    return plugins
+
+
+async def _warm_openai(client: OpenAIClient) -> None:
+    await client.models.list()
+
+
+async def _warm_deepgram() -> None:
+    # any response is fine, we only want the TLS session in the pool
+    async with utils.http_context.http_session().head(DEEPGRAM_URL):
+        pass
+
+
+async def _warm_connections(plugins: Plugins) -> None:
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        _warm_openai(plugins.openai_client), _warm_deepgram(), return_exceptions=True
+    )
+    for name, result in zip(("openai", "deepgram"), results):
+        if isinstance(result, Exception):
+            logger.warning("failed to warm %s connection: %s", name, result)
+    logger.info("connections warmed in %.0f ms", (time.perf_counter() - started) * 1000)
+
+
+def start_connection_warmup(proc: JobProcess) -> "asyncio.Task[None]":
+    """Open the provider connections in the background, once per process.
+
+    Must be called from inside the job (the pools belong to the job's event
+    loop); the job starts while the phone rings, so this is off the call path.
+    """
+    task = proc.userdata.get("warmup_task")
+    if task is None:
+        task = proc.userdata["warmup_task"] = asyncio.create_task(
+            _warm_connections(proc.userdata["plugins"])
+        )
+    return task